@@ -1,12 +1,31 @@
 import os
-from flask import Flask, request, jsonify, send_file
+import json
+import gzip
+import zlib
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context, g
 from werkzeug.utils import secure_filename
 import time
-from transcription import process_video_transcription
-from summarization import summarize_transcript, extract_key_concepts
-from quiz_generator import generate_quiz, save_quiz
+import uuid
+import threading
+import fcntl
+from transcription import process_video_transcription, get_transcript_cache
+from cache import copy_and_hash, hash_file, get_llm_cache
+from summarization import summarize_transcript, extract_key_concepts, stream_summary
+from quiz_generator import generate_quiz, stream_quiz
+from pipeline import run_pipeline
+from jobs import JobManager
+from batch import BatchManager
+from uploads import UploadManager, UploadError
+from artifact_store import get_artifact_store, transcript_hash, KINDS
+from segment_index import get_segment_index, SegmentLayout
+from question_bank import get_question_bank, DIFFICULTIES, QUESTION_TYPES
+from retention import get_retention_manager
+from config import Config
+import metrics
+import singleflight
 
 app = Flask(__name__)
+app.json.compact = True  # no pretty-printing, even in debug mode: transcripts are large
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
@@ -20,14 +39,88 @@ os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 
+upload_manager = UploadManager(UPLOAD_FOLDER)
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def save_upload(file):
+    """Stream an uploaded file to disk, hashing it on the way. Returns (filepath, video_hash)."""
+    # Unique per request, as in UploadManager.finalize: same-named uploads in the same second must not share a file
+    filename = f"{int(time.time())}_{uuid.uuid4().hex[:8]}_{secure_filename(file.filename)}"
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+
+    video_hash, _ = copy_and_hash(file.stream, filepath)
+    get_retention_manager().register(filepath)
+    return filepath, video_hash
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+    g.coalesced = singleflight.track()
+
+@app.after_request
+def mark_coalesced(response):
+    """Name the in-flight computations this response shared with other requests, if any."""
+    if g.get('coalesced'):
+        response.headers['X-Coalesced'] = ",".join(sorted(g.coalesced))
+    return response
+
+@app.after_request
+def record_request(response):
+    """Record request latency by route template (not raw path, to keep label cardinality bounded)."""
+    started = g.pop('request_started', None)
+    if started is not None:
+        metrics.HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            endpoint=request.url_rule.rule if request.url_rule else "unmatched",
+            method=request.method,
+            status=response.status_code
+        )
+    return response
+
+def accepts_gzip():
+    return 'gzip' in request.headers.get('Accept-Encoding', '').lower()
+
+@app.after_request
+def compress_response(response):
+    """Gzip complete (non-streamed) responses above GZIP_MIN_BYTES for clients that accept it."""
+    if (response.direct_passthrough or response.is_streamed or not accepts_gzip()
+            or 'Content-Encoding' in response.headers or not 200 <= response.status_code < 300):
+        return response
+    data = response.get_data()
+    if len(data) < Config.GZIP_MIN_BYTES:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=Config.GZIP_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint."""
     return jsonify({"status": "healthy", "timestamp": time.time()})
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus metrics, summed over every gunicorn worker (see metrics.enable_multiprocess)."""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Transcript and LLM response cache counters, and how many callers shared in-flight work."""
+    return jsonify({
+        "pid": os.getpid(),  # counters are per server process
+        "transcripts": get_transcript_cache().stats(),
+        "llm": get_llm_cache().stats(),
+        "coalescing": singleflight.stats()
+    })
+
+@app.route('/retention', methods=['GET'])
+def retention_stats():
+    """Managed directories with their size, quota and age limit, and pinned file counts."""
+    return jsonify(get_retention_manager().stats())
+
 @app.route('/upload', methods=['POST'])
 def upload_video():
     """Upload video file."""
@@ -43,46 +136,121 @@ def upload_video():
         if not allowed_file(file.filename):
             return jsonify({"error": f"File type not allowed. Allowed types: {ALLOWED_EXTENSIONS}"}), 400
 
-        filename = secure_filename(file.filename)
-        timestamp = str(int(time.time()))
-        filename = f"{timestamp}_{filename}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-
-        file.save(filepath)
+        filepath, video_hash = save_upload(file)
 
         return jsonify({
             "message": "Video uploaded successfully",
-            "filename": filename,
-            "filepath": filepath
+            "filename": os.path.basename(filepath),
+            "filepath": filepath,
+            "video_hash": video_hash
         }), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.errorhandler(UploadError)
+def handle_upload_error(e):
+    body = {"error": str(e)}
+    if e.offset is not None:
+        body["offset"] = e.offset
+    return jsonify(body), e.status
+
+@app.route('/uploads', methods=['POST'])
+def init_upload():
+    """Start a resumable upload. Body: {"filename": ..., "size": total bytes}."""
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename', '')
+
+    if not allowed_file(filename):
+        return jsonify({"error": f"File type not allowed. Allowed types: {ALLOWED_EXTENSIONS}"}), 400
+
+    session = upload_manager.init(filename, data.get('size', 0))
+    return jsonify({**session, "chunk_size": Config.UPLOAD_CHUNK_SIZE}), 201
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Offset to resume an upload from."""
+    return jsonify(upload_manager.status(upload_id))
+
+@app.route('/uploads/<upload_id>', methods=['PATCH', 'PUT'])
+def append_upload(upload_id):
+    """Append the raw request body at the offset given by the Upload-Offset header (or ?offset=)."""
+    offset = request.headers.get('Upload-Offset', request.args.get('offset'))
+    if offset is None:
+        return jsonify({"error": "Upload-Offset header required"}), 400
+
+    new_offset = upload_manager.append(upload_id, offset, request.stream)
+    return jsonify({"upload_id": upload_id, "offset": new_offset})
+
+@app.route('/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    """Discard an unfinished upload."""
+    upload_manager.abort(upload_id)
+    return jsonify({"message": "Upload aborted"})
+
+@app.route('/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_upload(upload_id):
+    """Complete an upload. With async=true the pipeline is queued on the finished file."""
+    data = request.get_json(silent=True) or {}
+    filepath, video_hash = upload_manager.finalize(upload_id)
+    get_retention_manager().register(filepath)
+
+    response = {
+        "message": "Video uploaded successfully",
+        "filename": os.path.basename(filepath),
+        "filepath": filepath,
+        "video_hash": video_hash
+    }
+    if wants_async(data):
+        job = get_job_manager().submit(filepath, video_hash, get_pipeline_params(data))
+        response["job"] = job_response(job)
+        return jsonify(response), 202
+    return jsonify(response), 200
+
 @app.route('/transcribe', methods=['POST'])
 def transcribe():
-    """Transcribe video to text."""
+    """Transcribe video to text.
+
+    segments_format selects how segments are returned: "columns" (default,
+    parallel start/end/offset arrays over one text), "full" (a list of
+    segment objects) or "none" (fetch pages later from segments_url).
+    """
     try:
         data = request.get_json()
         filepath = data.get('filepath')
+        segments_format = data.get('segments_format', 'columns')
+        if segments_format not in ('columns', 'full', 'none'):
+            return jsonify({"error": "segments_format must be columns, full or none"}), 400
 
         if not filepath or not os.path.exists(filepath):
             return jsonify({"error": "Video file not found"}), 404
 
+        # Hashing is cheap next to transcription and lets repeat uploads hit the cache
+        video_hash = hash_file(filepath)
+
         # Process transcription
-        transcript_text, segments = process_video_transcription(filepath)
+        with get_retention_manager().pinned(filepath):
+            transcript_text, segments = process_video_transcription(filepath, video_hash=video_hash)
 
         # Save transcript
-        transcript_filename = os.path.join(OUTPUT_FOLDER, f"transcript_{int(time.time())}.txt")
-        with open(transcript_filename, 'w', encoding='utf-8') as f:
-            f.write(transcript_text)
+        artifacts = get_artifact_store().save_results(video_hash, {
+            "transcript": transcript_text,
+            "segments": segments
+        }, {})
 
-        return jsonify({
+        response = {
             "message": "Transcription completed",
             "transcript": transcript_text,
-            "transcript_file": transcript_filename,
-            "segments": segments
-        }), 200
+            "artifacts": artifacts,
+            "video_hash": video_hash,
+            "segment_count": len(segments),
+            "segments_url": f"/transcripts/{video_hash}/segments"
+        }
+        if segments_format == 'columns':
+            response["segments"] = SegmentLayout.from_segments(video_hash, segments).columns()
+        elif segments_format == 'full':
+            response["segments"] = segments
+        return jsonify(response), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -94,20 +262,30 @@ def summarize():
         data = request.get_json()
         transcript = data.get('transcript')
         length = data.get('length', 'medium')  # short, medium, long
+        segments = data.get('segments')  # optional, aligns long-transcript chunks to segments
+        force_refresh = bool(data.get('force_refresh', False))
 
         if not transcript:
             return jsonify({"error": "No transcript provided"}), 400
 
         # Generate summary
-        summary = summarize_transcript(transcript, length)
+        summary = summarize_transcript(transcript, length, segments=segments, force_refresh=force_refresh)
 
         # Extract key concepts
-        key_concepts = extract_key_concepts(transcript)
+        key_concepts = extract_key_concepts(transcript, segments=segments, force_refresh=force_refresh)
+
+        source_hash = transcript_hash(transcript)
+        artifacts = get_artifact_store().save_results(source_hash, {
+            "summary": summary,
+            "key_concepts": key_concepts
+        }, {"summary_length": length})
 
         return jsonify({
             "message": "Summary generated successfully",
             "summary": summary,
-            "key_concepts": key_concepts
+            "key_concepts": key_concepts,
+            "source_hash": source_hash,
+            "artifacts": artifacts
         }), 200
 
     except Exception as e:
@@ -122,29 +300,265 @@ def create_quiz():
         num_questions = data.get('num_questions', 5)
         difficulty = data.get('difficulty', 'medium')  # easy, medium, hard
         question_type = data.get('question_type', 'mcq')  # mcq, true_false, mixed
+        segments = data.get('segments')  # optional, aligns chunks to segments
+        force_refresh = bool(data.get('force_refresh', False))
 
         if not transcript:
             return jsonify({"error": "No transcript provided"}), 400
+        error = num_questions_error(num_questions)
+        if error:
+            return jsonify({"error": error}), 400
+
+        if data.get('bank'):
+            # Question bank mode: sample from the transcript's pool, building it on first use
+            error = bank_quiz_error(num_questions, difficulty, question_type)
+            if error:
+                return jsonify({"error": error}), 400
+            source_hash = transcript_hash(transcript)
+            bank = get_question_bank()
+            bank.build(source_hash, transcript, segments)
+            quiz_data = bank.sample(source_hash, num_questions, difficulty, question_type, data.get('learner_id'))
+            return jsonify({
+                "message": "Quiz sampled from question bank",
+                "quiz": quiz_data,
+                "source_hash": source_hash
+            }), 200
 
         # Generate quiz
-        quiz_data = generate_quiz(transcript, num_questions, difficulty, question_type)
+        quiz_data = generate_quiz(transcript, num_questions, difficulty, question_type,
+                                  segments=segments, force_refresh=force_refresh)
 
         # Save quiz
-        quiz_filename = os.path.join(OUTPUT_FOLDER, f"quiz_{int(time.time())}.json")
-        save_quiz(quiz_data, quiz_filename)
+        source_hash = transcript_hash(transcript)
+        artifacts = get_artifact_store().save_results(source_hash, {"quiz": quiz_data}, {
+            "num_questions": num_questions,
+            "difficulty": difficulty,
+            "question_type": question_type
+        })
 
         return jsonify({
             "message": "Quiz generated successfully",
             "quiz": quiz_data,
-            "quiz_file": quiz_filename
+            "source_hash": source_hash,
+            "artifacts": artifacts
         }), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def num_questions_error(num_questions):
+    """Why a requested question count is invalid, or None if it is valid."""
+    if isinstance(num_questions, bool) or not str(num_questions).isdigit() or not 1 <= int(num_questions) <= 50:
+        return "num_questions must be an integer between 1 and 50"
+    return None
+
+def bank_quiz_error(num_questions, difficulty, question_type):
+    """Why a question-bank quiz request is invalid, or None if it is valid."""
+    error = num_questions_error(num_questions)
+    if error:
+        return error
+    if difficulty not in DIFFICULTIES:
+        return f"difficulty must be one of {', '.join(DIFFICULTIES)}"
+    if question_type not in QUESTION_TYPES:
+        return f"question_type must be one of {', '.join(QUESTION_TYPES)}"
+    return None
+
+@app.route('/question-bank', methods=['POST'])
+def build_question_bank():
+    """Generate the question pool of a processed video (video_hash) or of transcript text.
+
+    Returns the pool's counts by difficulty and question type; an existing
+    pool is returned as is unless force is true.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        video_hash = data.get('video_hash')
+        if video_hash:
+            stored = get_artifact_store().find_results(video_hash, {})
+            transcript = stored.get('transcript')
+            segments = stored.get('segments')
+            if transcript is None:
+                return jsonify({"error": "No transcript stored for this video"}), 404
+            bank_key = video_hash
+        else:
+            transcript = data.get('transcript')
+            segments = data.get('segments')
+            if not transcript:
+                return jsonify({"error": "No transcript or video_hash provided"}), 400
+            bank_key = transcript_hash(transcript)
+
+        stats = get_question_bank().build(bank_key, transcript, segments, force=bool(data.get('force', False)))
+        return jsonify({"message": "Question bank ready", **stats}), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/question-bank/<bank_key>', methods=['GET'])
+def question_bank_stats(bank_key):
+    """Question counts of a bank by difficulty and question type."""
+    stats = get_question_bank().stats(bank_key)
+    if stats is None:
+        return jsonify({"error": "Question bank not found"}), 404
+    return jsonify(stats)
+
+@app.route('/question-bank/<bank_key>/quiz', methods=['POST'])
+def sample_question_bank(bank_key):
+    """Sample a quiz from a bank, normally without an LLM call.
+
+    Body: num_questions, difficulty, question_type ("mixed" for any) and an
+    optional learner_id; questions already served to that learner are skipped.
+    Types or counts the pool cannot serve are generated first; "shortfall" in
+    the quiz reports any remaining gap.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        num_questions = data.get('num_questions', 5)
+        difficulty = data.get('difficulty', 'medium')
+        question_type = data.get('question_type', 'mcq')
+        error = bank_quiz_error(num_questions, difficulty, question_type)
+        if error:
+            return jsonify({"error": error}), 400
+
+        quiz_data = get_question_bank().sample(bank_key, num_questions, difficulty, question_type,
+                                               data.get('learner_id'))
+        if quiz_data is None:
+            return jsonify({"error": "Question bank not found"}), 404
+        if not quiz_data["questions"]:
+            return jsonify({"error": "No unseen questions left for these settings", "quiz": quiz_data}), 409
+        return jsonify({"message": "Quiz sampled from question bank", "quiz": quiz_data}), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def sse_event(event, data):
+    """Format one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def sse_response(events):
+    """Stream (event, data) pairs as text/event-stream, turning failures into an error event."""
+    def generate():
+        try:
+            for event, data in events:
+                yield sse_event(event, data)
+        except Exception as e:
+            yield sse_event("error", {"error": str(e)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route('/summarize/stream', methods=['POST'])
+def summarize_stream():
+    """Stream a summary as server-sent events: token events, then key concepts and done."""
+    data = request.get_json(silent=True) or {}
+    transcript = data.get('transcript')
+    length = data.get('length', 'medium')
+    segments = data.get('segments')
+    force_refresh = bool(data.get('force_refresh', False))
+
+    if not transcript:
+        return jsonify({"error": "No transcript provided"}), 400
+
+    def events():
+        parts = []
+        for delta in stream_summary(transcript, length, segments, force_refresh=force_refresh):
+            parts.append(delta)
+            yield "token", {"text": delta}
+        key_concepts = extract_key_concepts(transcript, segments=segments, force_refresh=force_refresh)
+        yield "key_concepts", {"key_concepts": key_concepts}
+
+        summary = "".join(parts)
+        source_hash = transcript_hash(transcript)
+        artifacts = get_artifact_store().save_results(source_hash, {
+            "summary": summary,
+            "key_concepts": key_concepts
+        }, {"summary_length": length})
+        yield "done", {"summary": summary, "source_hash": source_hash, "artifacts": artifacts}
+
+    return sse_response(events())
+
+@app.route('/generate-quiz/stream', methods=['POST'])
+def create_quiz_stream():
+    """Stream a quiz as server-sent events: title, one event per question, then done."""
+    data = request.get_json(silent=True) or {}
+    transcript = data.get('transcript')
+    num_questions = data.get('num_questions', 5)
+    difficulty = data.get('difficulty', 'medium')
+    question_type = data.get('question_type', 'mcq')
+    segments = data.get('segments')
+    force_refresh = bool(data.get('force_refresh', False))
+
+    if not transcript:
+        return jsonify({"error": "No transcript provided"}), 400
+    error = num_questions_error(num_questions)
+    if error:
+        return jsonify({"error": error}), 400
+
+    def events():
+        for event in stream_quiz(transcript, num_questions, difficulty, question_type, segments,
+                                 force_refresh=force_refresh):
+            if event["type"] == "title":
+                yield "title", {"quiz_title": event["quiz_title"]}
+            elif event["type"] == "question":
+                yield "question", event["question"]
+            else:
+                source_hash = transcript_hash(transcript)
+                artifacts = get_artifact_store().save_results(source_hash, {"quiz": event["quiz"]}, {
+                    "num_questions": num_questions,
+                    "difficulty": difficulty,
+                    "question_type": question_type
+                })
+                yield "done", {"quiz": event["quiz"], "source_hash": source_hash, "artifacts": artifacts}
+
+    return sse_response(events())
+
+def get_pipeline_params(form):
+    """Read pipeline parameters from a form or JSON body."""
+    force_refresh = str(form.get('force_refresh', 'false')).lower() in ('1', 'true', 'yes')
+    return {
+        "num_questions": int(form.get('num_questions', 5)),
+        "difficulty": form.get('difficulty', 'medium'),
+        "summary_length": form.get('summary_length', 'medium'),
+        "force_refresh": force_refresh
+    }
+
+def wants_async(form):
+    return str(form.get('async', 'false')).lower() in ('1', 'true', 'yes')
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+def get_job_manager():
+    """Create the job manager on first use. Unfinished jobs are resumed by start_background_services."""
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            _job_manager = JobManager()
+        return _job_manager
+
+def job_response(job):
+    """Public view of a job: status and per-stage progress, without the result body."""
+    stages = job["stages"]
+    done = sum(1 for status in stages.values() if status == "completed")
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "stages": stages,
+        "progress": done / len(stages) if stages else 0.0,
+        "video_hash": job.get("video_hash"),
+        "error": job.get("error"),
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"]
+    }
+
 @app.route('/process-all', methods=['POST'])
 def process_all():
-    """Complete pipeline: upload -> transcribe -> summarize -> generate quiz."""
+    """Complete pipeline: upload -> transcribe -> summarize -> generate quiz.
+
+    With async=true the video is queued as a job and a job id is returned immediately.
+    """
     try:
         # Check if video file is provided
         if 'video' not in request.files:
@@ -156,52 +570,280 @@ def process_all():
             return jsonify({"error": "Invalid file type"}), 400
 
         # Get parameters
-        num_questions = int(request.form.get('num_questions', 5))
-        difficulty = request.form.get('difficulty', 'medium')
-        summary_length = request.form.get('summary_length', 'medium')
+        params = get_pipeline_params(request.form)
 
         # Save uploaded file
-        filename = secure_filename(file.filename)
-        timestamp = str(int(time.time()))
-        filename = f"{timestamp}_{filename}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        filepath, video_hash = save_upload(file)
 
-        # Step 1: Transcribe
-        transcript_text, segments = process_video_transcription(filepath)
+        if wants_async(request.form):
+            job = get_job_manager().submit(filepath, video_hash, params)
+            return jsonify({"message": "Job submitted", **job_response(job)}), 202
 
-        # Step 2: Summarize
-        summary = summarize_transcript(transcript_text, summary_length)
-        key_concepts = extract_key_concepts(transcript_text)
-
-        # Step 3: Generate quiz
-        quiz_data = generate_quiz(transcript_text, num_questions, difficulty)
-
-        # Save outputs
-        transcript_file = os.path.join(OUTPUT_FOLDER, f"transcript_{timestamp}.txt")
-        with open(transcript_file, 'w', encoding='utf-8') as f:
-            f.write(transcript_text)
-
-        quiz_file = os.path.join(OUTPUT_FOLDER, f"quiz_{timestamp}.json")
-        save_quiz(quiz_data, quiz_file)
+        with get_retention_manager().pinned(filepath):
+            result = run_pipeline(filepath, video_hash=video_hash, **params)
 
         return jsonify({
             "message": "Processing completed successfully",
-            "transcript": transcript_text,
-            "summary": summary,
-            "key_concepts": key_concepts,
-            "quiz": quiz_data,
-            "files": {
-                "transcript": transcript_file,
-                "quiz": quiz_file
-            }
+            **result,
+            "segments_url": f"/transcripts/{video_hash}/segments"
         }), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue a pipeline job for an uploaded video (multipart) or a previously uploaded filepath (JSON)."""
+    try:
+        if 'video' in request.files:
+            file = request.files['video']
+            if not allowed_file(file.filename):
+                return jsonify({"error": "Invalid file type"}), 400
+            params = get_pipeline_params(request.form)
+            filepath, video_hash = save_upload(file)
+        else:
+            data = request.get_json(silent=True) or {}
+            filepath = data.get('filepath')
+            if not filepath or not os.path.exists(filepath):
+                return jsonify({"error": "Video file not found"}), 404
+            params = get_pipeline_params(data)
+            video_hash = hash_file(filepath)
+
+        job = get_job_manager().submit(filepath, video_hash, params)
+        return jsonify({"message": "Job submitted", **job_response(job)}), 202
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    """List recent jobs."""
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify({"jobs": [job_response(job) for job in get_job_manager().list(limit)]})
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Job status and per-stage progress."""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job_response(job))
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """Pipeline output of a finished job."""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job["status"] == "failed":
+        return jsonify({"error": job["error"], **job_response(job)}), 500
+    if job["status"] != "completed":
+        # Stages finished so far, so clients can render each output as soon as it exists
+        return jsonify({"message": "Job not finished", "partial": job.get("partial", {}),
+                        **job_response(job)}), 202
+    return jsonify({"message": "Processing completed successfully", **job["result"]}), 200
+
+@app.route('/results/<video_hash>', methods=['GET'])
+def get_results(video_hash):
+    """Stored pipeline output for a video and settings, so clients can skip re-uploading it.
+
+    Takes num_questions, difficulty and summary_length as query parameters.
+    complete is true when every stage's output exists for these settings.
+    """
+    params = get_pipeline_params(request.args)
+    results = get_artifact_store().find_results(video_hash, params)
+    if "transcript" not in results:
+        return jsonify({"error": "No results for this video"}), 404
+    results.pop("segments", None)
+    return jsonify({
+        "video_hash": video_hash,
+        **results,
+        "complete": all(kind in results for kind in ("summary", "key_concepts", "quiz"))
+    })
+
+@app.route('/artifacts', methods=['GET'])
+def list_artifacts():
+    """List stored artifacts (metadata only), newest first.
+
+    Filter with video_hash and kind; page with before=<id of the last artifact seen>.
+    """
+    kind = request.args.get('kind')
+    if kind and kind not in KINDS:
+        return jsonify({"error": f"Unknown kind. Expected one of: {', '.join(KINDS)}"}), 400
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    artifacts = get_artifact_store().list(
+        video_hash=request.args.get('video_hash'),
+        kind=kind,
+        limit=limit,
+        before_id=request.args.get('before', type=int)
+    )
+    next_before = artifacts[-1]["id"] if len(artifacts) == limit else None
+    return jsonify({"artifacts": artifacts, "next_before": next_before})
+
+@app.route('/artifacts/<int:artifact_id>', methods=['GET'])
+def get_artifact(artifact_id):
+    """One stored artifact with its content."""
+    artifact = get_artifact_store().get(artifact_id)
+    if artifact is None:
+        return jsonify({"error": "Artifact not found"}), 404
+    return jsonify(artifact)
+
+@app.route('/search', methods=['GET'])
+def search_transcripts():
+    """Which videos, and at which timestamps, mention every word of q."""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "No query provided"}), 400
+    started = time.perf_counter()
+    results = get_segment_index().search(
+        query,
+        limit=min(request.args.get('limit', 20, type=int), 200),
+        hits_per_video=min(request.args.get('hits', 5, type=int), 100)
+    )
+    return jsonify({
+        "query": query,
+        "results": results,
+        "took_ms": round((time.perf_counter() - started) * 1000, 2)
+    })
+
+@app.route('/transcripts/<video_hash>/range', methods=['GET'])
+def transcript_range(video_hash):
+    """Transcript text and segments between start and end seconds."""
+    start = request.args.get('start', 0.0, type=float)
+    end = request.args.get('end', float('inf'), type=float)
+    if end < start:
+        return jsonify({"error": "end must not be before start"}), 400
+    index = get_segment_index()
+    result = index.text_range(video_hash, start, end) if index.ensure(video_hash) else None
+    if result is None:
+        return jsonify({"error": "Transcript not indexed"}), 404
+    if result["end"] == float('inf'):
+        result["end"] = None  # JSON has no infinity
+    return jsonify(result)
+
+@app.route('/transcripts/<video_hash>/segments', methods=['GET'])
+def transcript_segments(video_hash):
+    """Page through a video's segments, optionally only those overlapping start..end seconds.
+
+    format=columns (default) returns parallel start/end/offsets arrays over one
+    text string, with next_cursor for the following page. format=ndjson streams
+    one segment object per line (gzip-compressed when accepted).
+    """
+    start = request.args.get('start', type=float)
+    end = request.args.get('end', type=float)
+    cursor = max(request.args.get('cursor', 0, type=int), 0)
+    output_format = request.args.get('format', 'columns')
+    if output_format not in ('columns', 'ndjson'):
+        return jsonify({"error": "format must be columns or ndjson"}), 400
+    if start is not None and end is not None and end < start:
+        return jsonify({"error": "end must not be before start"}), 400
+
+    index = get_segment_index()
+    if not index.ensure(video_hash):
+        return jsonify({"error": "Transcript not found"}), 404
+
+    if output_format == 'columns':
+        limit = min(max(request.args.get('limit', Config.SEGMENT_PAGE_SIZE, type=int), 1), Config.SEGMENT_PAGE_MAX)
+        return jsonify(index.segments_page(video_hash, cursor, limit, start, end))
+
+    limit = request.args.get('limit', type=int)
+    segments = index.iter_segments(video_hash, cursor, limit, start, end)
+    compress = accepts_gzip()
+
+    def lines():
+        compressor = zlib.compressobj(Config.GZIP_LEVEL, zlib.DEFLATED, 31) if compress else None  # 31: gzip
+        batch = []
+        for segment in segments:
+            batch.append(json.dumps(segment, ensure_ascii=False) + "\n")
+            if len(batch) >= 500:
+                data = "".join(batch).encode("utf-8")
+                batch = []
+                yield compressor.compress(data) if compressor else data
+        data = "".join(batch).encode("utf-8")
+        yield compressor.compress(data) + compressor.flush() if compressor else data
+
+    headers = {"Vary": "Accept-Encoding"}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return Response(lines(), content_type="application/x-ndjson", headers=headers)
+
+_batch_manager = None
+
+def get_batch_manager():
+    global _batch_manager
+    with _job_manager_lock:
+        if _batch_manager is None:
+            _batch_manager = BatchManager()
+        return _batch_manager
+
+@app.route('/batch', methods=['POST'])
+def submit_batch():
+    """Start a batch over a server-side directory or manifest of videos."""
+    try:
+        data = request.get_json(silent=True) or {}
+        source = data.get('directory') or data.get('manifest')
+        if not source or not os.path.exists(source):
+            return jsonify({"error": "Batch directory or manifest not found"}), 404
+
+        batch_id = get_batch_manager().submit(
+            source,
+            defaults=get_pipeline_params(data),
+            extract_workers=data.get('extract_workers'),
+            llm_workers=data.get('llm_workers')
+        )
+        return jsonify({"message": "Batch submitted", **get_batch_manager().status(batch_id)}), 202
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/batch/<batch_id>', methods=['GET'])
+def get_batch(batch_id):
+    """Batch progress: per-video status and result files."""
+    index = get_batch_manager().status(batch_id)
+    if index is None:
+        return jsonify({"error": "Batch not found"}), 404
+    return jsonify(index)
+
+def start_background_services():
+    """Resume unfinished jobs and run the retention sweeper, in one server process only.
+
+    Called by the dev server below and by each gunicorn worker after fork
+    (see gunicorn.conf.py), never in the gunicorn master, whose threads would
+    not survive the fork. The workers contend for an exclusive lock on
+    jobs/leader.lock and only the holder does the work; if it dies, the lock
+    is released and another worker takes over. The leader repeats job
+    recovery every JOB_RECOVERY_INTERVAL, picking up jobs of dead workers;
+    only its first pass reads every job file.
+    """
+    def run():
+        os.makedirs(Config.JOBS_FOLDER, exist_ok=True)
+        with open(os.path.join(Config.JOBS_FOLDER, "leader.lock"), "a") as lock_file:
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except OSError:
+                    time.sleep(Config.JOB_RECOVERY_INTERVAL)
+            print(f"Process {os.getpid()} runs job recovery and the retention sweeper")
+            if Config.RETENTION_ENABLED:
+                get_retention_manager().start()
+            full = True
+            while True:
+                try:
+                    get_job_manager().recover(full=full)
+                    full = False
+                except Exception as e:
+                    metrics.ERRORS.inc(component="jobs")
+                    print(f"Job recovery failed: {str(e)}")
+                time.sleep(Config.JOB_RECOVERY_INTERVAL)
+
+    threading.Thread(target=run, name="background-services", daemon=True).start()
+
 if __name__ == '__main__':
+    # Development server; in production run `gunicorn app:app` (settings in gunicorn.conf.py)
     print("Starting Flask API server...")
     print(f"Upload folder: {UPLOAD_FOLDER}")
-    print(f"Output folder: {OUTPUT_FOLDER}")
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    print(f"Artifact store: {Config.ARTIFACT_DB}")
+    if not Config.DEBUG or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_services()  # with the reloader, only in the child that serves requests
+    app.run(debug=Config.DEBUG, host=Config.API_HOST, port=Config.API_PORT, threaded=True)
@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from config import Config
+from cache import hash_key, normalize_text
+import metrics
+
+KINDS = ("transcript", "segments", "summary", "key_concepts", "quiz")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    video_hash TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    params_key TEXT NOT NULL,
+    params TEXT NOT NULL,
+    content TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_artifacts_identity ON artifacts (video_hash, kind, params_key);
+CREATE INDEX IF NOT EXISTS idx_artifacts_kind ON artifacts (kind, id);
+"""
+
+class ThreadConnections:
+    """Per-thread (and per-process) SQLite connections in WAL mode, reopened after a fork."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=Config.ARTIFACT_DB_BUSY_TIMEOUT, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+def transcript_hash(transcript):
+    """Stand-in video hash for artifacts produced from transcript text alone."""
+    return hash_key("transcript", normalize_text(transcript))
+
+def result_params(params, language=None):
+    """Identity parameters of each artifact kind for a pipeline run with these settings."""
+    transcript_params = {"language": language or "auto", "model": Config.WHISPER_MODEL}
+    return {
+        "transcript": transcript_params,
+        "segments": transcript_params,
+        "summary": {"length": params.get("summary_length", "medium")},
+        "key_concepts": {"num_concepts": 5},
+        "quiz": {
+            "num_questions": int(params.get("num_questions", 5)),
+            "difficulty": params.get("difficulty", "medium"),
+            "question_type": params.get("question_type", "mcq")
+        }
+    }
+
+def _params_json(params):
+    return json.dumps(params or {}, sort_keys=True, default=str)
+
+class ArtifactStore:
+    """Transcripts, segments, summaries, key concepts and quizzes in one SQLite database.
+
+    Each artifact is identified by (video_hash, kind, params); saving the same
+    identity again replaces its content, so re-running a request updates
+    rather than duplicates. The database runs in WAL mode with a busy
+    timeout, so several threads and worker processes can write at once
+    while readers never block. Connections are per thread and per process.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or Config.ARTIFACT_DB
+        self._connections = ThreadConnections(self.path)
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self):
+        return self._connections.get()
+
+    def save_many(self, video_hash, artifacts):
+        """Upsert several artifacts in one transaction.
+
+        artifacts is a list of (kind, content, params) tuples. Returns {kind: id}.
+        """
+        conn = self._connect()
+        ids = {}
+        with metrics.ARTIFACT_WRITE_SECONDS.time():
+            now = time.time()
+            # IMMEDIATE takes the write lock up front, so concurrent writers queue on busy_timeout
+            # instead of failing when a read transaction tries to upgrade
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for kind, content, params in artifacts:
+                    params_json = _params_json(params)
+                    content_json = json.dumps(content, ensure_ascii=False)
+                    row = conn.execute(
+                        """INSERT INTO artifacts
+                               (video_hash, kind, params_key, params, content, size, created_at, updated_at)
+                           VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                           ON CONFLICT (video_hash, kind, params_key) DO UPDATE SET
+                               content = excluded.content, size = excluded.size, updated_at = excluded.updated_at
+                           RETURNING id""",
+                        (video_hash, kind, hash_key(params_json), params_json, content_json,
+                         len(content_json.encode("utf-8")), now, now)
+                    ).fetchone()
+                    ids[kind] = row["id"]
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return ids
+
+    def save(self, video_hash, kind, content, params=None):
+        """Upsert one artifact. Returns its id."""
+        return self.save_many(video_hash, [(kind, content, params)])[kind]
+
+    def save_results(self, video_hash, output, params, language=None):
+        """Store every available artifact of a pipeline run. Returns {kind: id}."""
+        artifact_params = result_params(params, language)
+        return self.save_many(video_hash, [
+            (kind, output[kind], artifact_params[kind])
+            for kind in KINDS if output.get(kind) is not None
+        ])
+
+    def find_results(self, video_hash, params, language=None):
+        """Stored pipeline artifacts for a video and generation settings, as {kind: content}."""
+        artifact_params = result_params(params, language)
+        results = {}
+        for kind in KINDS:
+            artifact = self.find(video_hash, kind, artifact_params[kind])
+            if artifact is not None:
+                results[kind] = artifact["content"]
+        return results
+
+    def _row(self, row, with_content=True):
+        artifact = {
+            "id": row["id"],
+            "video_hash": row["video_hash"],
+            "kind": row["kind"],
+            "params": json.loads(row["params"]),
+            "size": row["size"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"]
+        }
+        if with_content:
+            artifact["content"] = json.loads(row["content"])
+        return artifact
+
+    def get(self, artifact_id):
+        """One artifact with its content, or None."""
+        row = self._connect().execute("SELECT * FROM artifacts WHERE id = ?", (artifact_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def find(self, video_hash, kind, params=None):
+        """The artifact with exactly this identity, or None."""
+        row = self._connect().execute(
+            "SELECT * FROM artifacts WHERE video_hash = ? AND kind = ? AND params_key = ?",
+            (video_hash, kind, hash_key(_params_json(params)))
+        ).fetchone()
+        return self._row(row) if row else None
+
+    def list(self, video_hash=None, kind=None, limit=50, before_id=None):
+        """Artifact metadata (no content), newest first, with optional filters and id-cursor paging."""
+        clauses = []
+        args = []
+        if video_hash:
+            clauses.append("video_hash = ?")
+            args.append(video_hash)
+        if kind:
+            clauses.append("kind = ?")
+            args.append(kind)
+        if before_id:
+            clauses.append("id < ?")
+            args.append(before_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connect().execute(
+            f"""SELECT id, video_hash, kind, params, size, created_at, updated_at
+                FROM artifacts {where} ORDER BY id DESC LIMIT ?""",
+            args + [limit]
+        ).fetchall()
+        return [self._row(row, with_content=False) for row in rows]
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_artifact_store():
+    """Return the process-wide artifact store, opened on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ArtifactStore()
+        return _store
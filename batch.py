@@ -0,0 +1,252 @@
+import os
+import csv
+import json
+import time
+import uuid
+import argparse
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from cache import hash_file
+from transcription import process_video_transcription
+from pipeline import build_stages, collect_results, run_stages
+from artifact_store import get_artifact_store
+
+VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv', 'webm'}
+
+def discover_videos(directory):
+    """List video files under a directory (recursively), sorted by path."""
+    videos = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if '.' in name and name.rsplit('.', 1)[1].lower() in VIDEO_EXTENSIONS:
+                videos.append({"path": os.path.join(root, name)})
+    return sorted(videos, key=lambda video: video["path"])
+
+def load_manifest(manifest_path):
+    """Read a manifest of videos.
+
+    Accepts a JSON list (of paths or {"path": ..., <pipeline params>} objects),
+    a CSV with a "path" column plus optional parameter columns, or a text file
+    with one path per line. Relative paths resolve against the manifest's folder.
+    """
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        if manifest_path.endswith(".json"):
+            entries = json.load(f)
+        elif manifest_path.endswith(".csv"):
+            entries = [{k: v for k, v in row.items() if v} for row in csv.DictReader(f)]
+        else:
+            entries = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+    videos = []
+    for entry in entries:
+        video = {"path": entry} if isinstance(entry, str) else dict(entry)
+        video["path"] = os.path.join(base, video["path"])
+        videos.append(video)
+    return videos
+
+def load_videos(source):
+    """Videos from a directory or a manifest file."""
+    if os.path.isdir(source):
+        return discover_videos(source)
+    if os.path.isfile(source):
+        return load_manifest(source)
+    raise Exception(f"Batch source not found: {source}")
+
+class BatchRunner:
+    """Runs the full pipeline over many videos with separate local and remote concurrency limits.
+
+    Transcription (ffmpeg extraction + Whisper) runs on one pool and the
+    summary/key-concept/quiz stages on another, so slow LLM work never idles
+    the extraction slots and vice versa. Every finished video is written to
+    results/<video_hash>.json and recorded in checkpoint.json; re-running the
+    same output folder skips completed videos and retries failed ones. The
+    consolidated index.json lists every video with its status and result file.
+    """
+
+    def __init__(self, output_dir, extract_workers=None, llm_workers=None, defaults=None):
+        self.output_dir = output_dir
+        self.results_dir = os.path.join(output_dir, "results")
+        self.checkpoint_path = os.path.join(output_dir, "checkpoint.json")
+        self.index_path = os.path.join(output_dir, "index.json")
+        self.extract_workers = extract_workers or Config.BATCH_EXTRACT_WORKERS
+        self.llm_workers = llm_workers or Config.BATCH_LLM_WORKERS
+        self.defaults = {
+            "num_questions": Config.DEFAULT_NUM_QUESTIONS,
+            "difficulty": Config.DEFAULT_DIFFICULTY,
+            "summary_length": Config.DEFAULT_SUMMARY_LENGTH,
+            **(defaults or {})
+        }
+        self._lock = threading.Lock()
+        os.makedirs(self.results_dir, exist_ok=True)
+        self.checkpoint = self._load_checkpoint()
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"videos": {}}
+
+    def _write_json(self, path, data):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _record(self, path, entry):
+        """Update one video's checkpoint entry and persist the checkpoint."""
+        with self._lock:
+            self.checkpoint["videos"][path] = {**self.checkpoint["videos"].get(path, {}), **entry,
+                                               "updated_at": time.time()}
+            self._write_json(self.checkpoint_path, self.checkpoint)
+
+    def _params(self, video):
+        params = {key: video.get(key, default) for key, default in self.defaults.items()}
+        params["num_questions"] = int(params["num_questions"])
+        return params
+
+    def _finish(self, video, video_hash, results, errors, started_at):
+        """Write a video's result file and mark it done (or failed) in the checkpoint."""
+        try:
+            output = collect_results(results, errors, video_hash)
+        except Exception as e:
+            self._record(video["path"], {"status": "failed", "error": str(e)})
+            return
+
+        output["artifacts"] = get_artifact_store().save_results(video_hash, output, self._params(video))
+        output["source_path"] = video["path"]
+        result_file = os.path.join(self.results_dir, f"{video_hash}.json")
+        self._write_json(result_file, output)
+        self._record(video["path"], {
+            "status": "partial" if errors else "completed",
+            "video_hash": video_hash,
+            "result_file": os.path.relpath(result_file, self.output_dir),
+            "errors": errors,
+            "seconds": time.time() - started_at
+        })
+
+    def run(self, videos, progress=None):
+        """Process every video not already completed. Returns the consolidated index."""
+        todo = [video for video in videos
+                if self.checkpoint["videos"].get(video["path"], {}).get("status") != "completed"]
+        print(f"Batch: {len(videos)} videos, {len(videos) - len(todo)} already done, {len(todo)} to process")
+
+        llm_pool = ThreadPoolExecutor(max_workers=self.llm_workers, thread_name_prefix="batch-llm")
+        llm_futures = []
+
+        def llm_phase(video, video_hash, transcription, started_at):
+            try:
+                params = self._params(video)
+                stages = build_stages(lambda: transcription, **params)
+                results, errors = run_stages(stages)
+                self._finish(video, video_hash, results, errors, started_at)
+            except Exception as e:
+                traceback.print_exc()
+                self._record(video["path"], {"status": "failed", "error": str(e)})
+            if progress:
+                progress(video["path"], self.checkpoint["videos"][video["path"]]["status"])
+
+        def transcription_phase(video):
+            started_at = time.time()
+            try:
+                self._record(video["path"], {"status": "transcribing", "error": None})
+                video_hash = hash_file(video["path"])
+                transcription = process_video_transcription(video["path"], video_hash=video_hash)
+                self._record(video["path"], {"status": "generating", "video_hash": video_hash})
+                with self._lock:
+                    llm_futures.append(llm_pool.submit(llm_phase, video, video_hash, transcription, started_at))
+            except Exception as e:
+                traceback.print_exc()
+                self._record(video["path"], {"status": "failed", "error": str(e)})
+                if progress:
+                    progress(video["path"], "failed")
+
+        with ThreadPoolExecutor(max_workers=self.extract_workers, thread_name_prefix="batch-extract") as pool:
+            list(pool.map(transcription_phase, todo))
+
+        for future in list(llm_futures):
+            future.result()
+        llm_pool.shutdown()
+
+        return self.write_index(videos)
+
+    def write_index(self, videos):
+        """Write index.json: one entry per video plus status counts."""
+        entries = []
+        counts = {}
+        for video in videos:
+            entry = {"path": video["path"], "status": "pending",
+                     **self.checkpoint["videos"].get(video["path"], {})}
+            counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+            entries.append(entry)
+
+        index = {"generated_at": time.time(), "total": len(videos), "counts": counts, "videos": entries}
+        self._write_json(self.index_path, index)
+        return index
+
+class BatchManager:
+    """Runs batches submitted over the API in background threads, one folder per batch."""
+
+    def __init__(self, batch_folder=None):
+        self.batch_folder = batch_folder or Config.BATCH_FOLDER
+        os.makedirs(self.batch_folder, exist_ok=True)
+
+    def submit(self, source, defaults=None, extract_workers=None, llm_workers=None):
+        """Validate the source and start the batch. Returns the batch id."""
+        videos = load_videos(source)
+        batch_id = uuid.uuid4().hex
+        runner = BatchRunner(os.path.join(self.batch_folder, batch_id), extract_workers, llm_workers, defaults)
+        runner.write_index(videos)
+        threading.Thread(target=runner.run, args=(videos,), daemon=True, name=f"batch-{batch_id[:8]}").start()
+        return batch_id
+
+    def status(self, batch_id):
+        """Current index of a batch, or None if unknown."""
+        if not batch_id or not all(c.isalnum() for c in batch_id):
+            return None
+        batch_dir = os.path.join(self.batch_folder, batch_id)
+        try:
+            with open(os.path.join(batch_dir, "checkpoint.json"), "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+            with open(os.path.join(batch_dir, "index.json"), "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        # The index is rewritten at the end; overlay live checkpoint progress meanwhile
+        counts = {}
+        for entry in index["videos"]:
+            entry.update(checkpoint["videos"].get(entry["path"], {}))
+            counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+        index["counts"] = counts
+        index["batch_id"] = batch_id
+        return index
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcribe, summarize and build quizzes for many videos.")
+    parser.add_argument("source", help="Directory of videos, or a manifest (.json, .csv or one path per line)")
+    parser.add_argument("--output", default=None, help="Output folder (re-use it to resume a batch)")
+    parser.add_argument("--extract-workers", type=int, default=Config.BATCH_EXTRACT_WORKERS)
+    parser.add_argument("--llm-workers", type=int, default=Config.BATCH_LLM_WORKERS)
+    parser.add_argument("--num-questions", type=int, default=Config.DEFAULT_NUM_QUESTIONS)
+    parser.add_argument("--difficulty", default=Config.DEFAULT_DIFFICULTY, choices=["easy", "medium", "hard"])
+    parser.add_argument("--summary-length", default=Config.DEFAULT_SUMMARY_LENGTH, choices=["short", "medium", "long"])
+    args = parser.parse_args()
+
+    output = args.output or os.path.join(Config.BATCH_FOLDER, time.strftime("%Y%m%d-%H%M%S"))
+    runner = BatchRunner(output, args.extract_workers, args.llm_workers, {
+        "num_questions": args.num_questions,
+        "difficulty": args.difficulty,
+        "summary_length": args.summary_length
+    })
+    index = runner.run(load_videos(args.source), progress=lambda path, status: print(f"[{status}] {path}"))
+
+    print(f"\nResults index: {runner.index_path}")
+    for status, count in sorted(index["counts"].items()):
+        print(f"  {status}: {count}")
+
+if __name__ == "__main__":
+    main()
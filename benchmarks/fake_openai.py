@@ -0,0 +1,267 @@
+"""Local stand-in for the OpenAI chat-completions and Whisper endpoints.
+
+Serves /v1/chat/completions (plain and streamed) and /v1/audio/transcriptions
+with configurable latency, error rates and response sizes, so the pipeline
+can be benchmarked without paying for API calls. Point the app at it with
+OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+Run standalone:
+    python benchmarks/fake_openai.py --port 8089 --latency 0.5 --error-rate 0.02
+"""
+import re
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "model data learning network gradient layer training feature vector signal "
+    "energy system process function value error input output memory pattern "
+    "theory example method result structure analysis concept lecture student"
+).split()
+
+class FakeSettings:
+    """Behaviour of the fake server; attributes can be changed while it runs."""
+
+    def __init__(self, latency=0.3, transcription_latency=1.0, jitter=0.2, error_rate=0.0,
+                 rate_limit_rate=0.0, retry_after=0.1, completion_words=150, segments=60,
+                 segment_words=20, stream_chunks=20, seed=None):
+        self.latency = latency
+        self.transcription_latency = transcription_latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.completion_words = completion_words
+        self.segments = segments
+        self.segment_words = segment_words
+        self.stream_chunks = stream_chunks
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def delay(self, base):
+        with self.lock:
+            return max(0.0, base * (1 + self.random.uniform(-self.jitter, self.jitter)))
+
+    def roll(self):
+        """Pick the outcome of one request: None, 429 or 500."""
+        with self.lock:
+            value = self.random.random()
+        if value < self.rate_limit_rate:
+            return 429
+        if value < self.rate_limit_rate + self.error_rate:
+            return 500
+        return None
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+def fake_quiz(rng, num_questions):
+    """A well-formed quiz body with distinct question texts (so deduplication keeps them)."""
+    questions = []
+    for number in range(1, num_questions + 1):
+        questions.append({
+            "question_number": number,
+            "question_text": f"Question {uuid.uuid4().hex[:8]}: {sentence(rng, 10)[:-1]}?",
+            "question_type": "mcq",
+            "options": {letter: sentence(rng, 5) for letter in "ABCD"},
+            "correct_answer": rng.choice("ABCD"),
+            "explanation": sentence(rng, 15)
+        })
+    return json.dumps({"quiz_title": "Benchmark Quiz", "questions": questions}, indent=2)
+
+def fake_completion_text(settings, messages):
+    """Quiz JSON for quiz prompts, plain prose otherwise."""
+    with settings.lock:
+        rng = random.Random(settings.random.random())
+    system = " ".join(m.get("content") or "" for m in messages if m.get("role") == "system")
+    prompt = " ".join(m.get("content") or "" for m in messages if m.get("role") == "user")
+    if "valid JSON" in system:
+        match = re.search(r"create (\d+) ", prompt)
+        return fake_quiz(rng, int(match.group(1)) if match else 5)
+    words = settings.completion_words
+    return " ".join(sentence(rng, 15) for _ in range(max(1, words // 15)))
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def settings(self):
+        return self.server.settings
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _maybe_fail(self, endpoint):
+        status = self.settings.roll()
+        if status is None:
+            return False
+        self.settings.count(f"{endpoint}_{status}")
+        if status == 429:
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                            {"Retry-After": str(self.settings.retry_after)})
+        else:
+            self._send_json(500, {"error": {"message": "Internal server error", "type": "server_error"}})
+        return True
+
+    def do_POST(self):
+        body = self._read_body()
+        if self.path.endswith("/chat/completions"):
+            self._chat(json.loads(body or b"{}"))
+        elif self.path.endswith("/audio/transcriptions"):
+            self._transcription(len(body))
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def _chat(self, request):
+        settings = self.settings
+        time.sleep(settings.delay(settings.latency))
+        if self._maybe_fail("chat"):
+            return
+        settings.count("chat")
+
+        text = fake_completion_text(settings, request.get("messages", []))
+        created = int(time.time())
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = request.get("model", "gpt-4")
+
+        if not request.get("stream"):
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(text) // 4, "total_tokens": len(text) // 4}
+            })
+            return
+
+        # Streamed: the base latency is time-to-first-token, then the text arrives in even pieces
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        pieces = max(1, settings.stream_chunks)
+        step = max(1, len(text) // pieces + 1)
+        for offset in range(0, len(text), step):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": text[offset:offset + step]}, "finish_reason": None}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(settings.delay(settings.latency) / pieces)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+    def _transcription(self, upload_bytes):
+        settings = self.settings
+        time.sleep(settings.delay(settings.transcription_latency))
+        if self._maybe_fail("transcription"):
+            return
+        settings.count("transcription")
+
+        with settings.lock:
+            rng = random.Random(settings.random.random())
+        segments = []
+        for index in range(settings.segments):
+            segments.append({
+                "id": index,
+                "seek": 0,
+                "start": index * 5.0,
+                "end": index * 5.0 + 5.0,
+                "text": " " + sentence(rng, settings.segment_words),
+                "tokens": [],
+                "temperature": 0.0,
+                "avg_logprob": -0.2,
+                "compression_ratio": 1.5,
+                "no_speech_prob": 0.01
+            })
+        self._send_json(200, {
+            "task": "transcribe",
+            "language": "english",
+            "duration": settings.segments * 5.0,
+            "text": "".join(segment["text"] for segment in segments).strip(),
+            "segments": segments
+        })
+
+def start_server(settings=None, host="127.0.0.1", port=0):
+    """Start the fake server in a daemon thread. Returns (server, base_url)."""
+    server = ThreadingHTTPServer((host, port), FakeOpenAIHandler)
+    server.daemon_threads = True
+    server.settings = settings or FakeSettings()
+    threading.Thread(target=server.serve_forever, daemon=True, name="fake-openai").start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+def add_settings_arguments(parser):
+    """Command-line options shared by the fake server and the benchmark runner."""
+    parser.add_argument("--latency", type=float, default=0.3, help="Chat completion latency in seconds")
+    parser.add_argument("--transcription-latency", type=float, default=1.0, help="Whisper latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Relative latency jitter (0.2 = +/-20%%)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--completion-words", type=int, default=150, help="Words per prose completion")
+    parser.add_argument("--segments", type=int, default=60, help="Segments per transcription response")
+    parser.add_argument("--segment-words", type=int, default=20, help="Words per transcription segment")
+    parser.add_argument("--seed", type=int, default=None)
+
+def settings_from_args(args):
+    return FakeSettings(
+        latency=args.latency,
+        transcription_latency=args.transcription_latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        completion_words=args.completion_words,
+        segments=args.segments,
+        segment_words=args.segment_words,
+        seed=args.seed
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI API server for benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    add_settings_arguments(parser)
+    args = parser.parse_args()
+
+    server, base_url = start_server(settings_from_args(args), args.host, args.port)
+    print(f"Fake OpenAI server listening on {base_url}")
+    print(f"Use: OPENAI_BASE_URL={base_url} OPENAI_API_KEY=fake")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,100 @@
+"""Cold-start import benchmark: time and memory to import each module in a fresh interpreter.
+
+Each module is imported in its own subprocess, so nothing is shared between
+measurements. Reports wall time, peak RSS growth and which heavy libraries
+the import pulled in. With --check, exits non-zero when a module exceeds
+--max-ms or loads a library that should only be imported on first use.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --modules app,pipeline --repeat 5 --check --max-ms 1500
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ["config", "metrics", "cache", "context_packer", "openai_client", "artifact_store", "segment_index",
+           "transcription", "summarization", "quiz_generator", "pipeline", "jobs", "batch", "question_bank",
+           "app"]
+
+# Libraries that must not be loaded by importing the application
+HEAVY = ["numpy", "moviepy", "imageio", "openai", "httpx", "langchain", "tiktoken"]
+
+PROBE = """
+import sys, time, json, resource
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+started = time.perf_counter()
+error = None
+try:
+    __import__({module!r})
+except Exception as e:
+    error = f"{{type(e).__name__}}: {{e}}"
+elapsed = time.perf_counter() - started
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "seconds": elapsed,
+    "rss_kb": after - before,
+    "modules": len(sys.modules),
+    "heavy": sorted(name for name in {heavy!r} if name in sys.modules),
+    "error": error
+}}))
+"""
+
+def measure_import(module, repeat=3):
+    """Best-of-repeat import time of module in fresh interpreters, with memory and heavy-library info."""
+    runs = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY)],
+            cwd=ROOT, capture_output=True, text=True
+        )
+        if result.returncode != 0 or not result.stdout.strip():
+            lines = result.stderr.strip().splitlines()
+            return {"module": module, "error": lines[-1] if lines else "probe failed"}
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    best = min(runs, key=lambda run: run["seconds"])
+    return {"module": module, "ms": best["seconds"] * 1000, **{k: v for k, v in best.items() if k != "seconds"}}
+
+def print_table(results):
+    print(f"{'module':<16} {'ms':>9} {'rss MB':>8} {'modules':>8}  heavy / error")
+    for row in results:
+        detail = row.get("error") or ", ".join(row.get("heavy", [])) or "-"
+        ms = f"{row['ms']:.1f}" if "ms" in row else "-"
+        rss = f"{row['rss_kb'] / 1024:.1f}" if "rss_kb" in row else "-"
+        print(f"{row['module']:<16} {ms:>9} {rss:>8} {row.get('modules', '-'):>8}  {detail}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start import time and memory per module.")
+    parser.add_argument("--modules", default=",".join(MODULES), help="Comma-separated modules to import")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per module (best is kept)")
+    parser.add_argument("--json", help="Also write results to this JSON file")
+    parser.add_argument("--check", action="store_true",
+                        help="Fail if a module loads a heavy library, errors, or exceeds --max-ms")
+    parser.add_argument("--max-ms", type=float, default=None, help="Import time budget per module for --check")
+    args = parser.parse_args()
+
+    results = [measure_import(module.strip(), args.repeat) for module in args.modules.split(",") if module.strip()]
+    print_table(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.check:
+        failures = []
+        for row in results:
+            if row.get("error"):
+                failures.append(f"{row['module']}: {row['error']}")
+            elif row["heavy"]:
+                failures.append(f"{row['module']}: imports {', '.join(row['heavy'])} at load time")
+            elif args.max_ms is not None and row["ms"] > args.max_ms:
+                failures.append(f"{row['module']}: {row['ms']:.0f}ms > {args.max_ms:.0f}ms budget")
+        for failure in failures:
+            print(f"FAIL {failure}")
+        sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""HTTP load test of the API server against the local fake OpenAI server.
+
+Starts the fake server and the API in a subprocess -- gunicorn with
+gunicorn.conf.py, or the Flask development server for comparison -- then
+keeps a fixed number of concurrent clients posting to one endpoint for a
+fixed time and reports requests/second and p50/p95/p99 latency per level.
+Caches are bypassed, so every request makes real (fake) OpenAI calls.
+
+    python benchmarks/load_test.py --server gunicorn --workers 2 --threads 16 --concurrency 1,8,32
+    python benchmarks/load_test.py --server dev --endpoint generate-quiz --latency 1.0
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_openai import start_server, add_settings_arguments, settings_from_args, sentence
+from run_benchmarks import percentile, format_seconds
+
+ENDPOINTS = ["summarize", "generate-quiz", "health"]
+
+def start_api(server, port, workdir, env, workers, threads):
+    """Start the API server with workdir as its working directory. Output goes to workdir/server.log."""
+    if server == "gunicorn":
+        command = [sys.executable, "-m", "gunicorn", "app:app", "-c", os.path.join(ROOT, "gunicorn.conf.py"),
+                   "--bind", f"127.0.0.1:{port}", "--workers", str(workers), "--threads", str(threads),
+                   "--access-logfile", "/dev/null"]
+    else:
+        command = [sys.executable, os.path.join(ROOT, "app.py")]
+    with open(os.path.join(workdir, "server.log"), "w") as log:
+        return subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+def server_log(workdir, lines=20):
+    try:
+        with open(os.path.join(workdir, "server.log"), "r", encoding="utf-8", errors="replace") as f:
+            return "".join(f.readlines()[-lines:])
+    except OSError:
+        return ""
+
+def wait_until_ready(base_url, process, workdir, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise Exception(f"API server exited with code {process.returncode}:\n{server_log(workdir)}")
+        try:
+            with urllib.request.urlopen(f"{base_url}/health", timeout=2) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise Exception(f"API server not ready after {timeout}s")
+
+def make_request(base_url, endpoint, rng, transcript_words):
+    """One request; each carries a fresh transcript so no cache or coalescing answers it."""
+    if endpoint == "health":
+        request = urllib.request.Request(f"{base_url}/health")
+    else:
+        body = {"transcript": " ".join(sentence(rng, 20) for _ in range(max(1, transcript_words // 20))),
+                "force_refresh": True}
+        request = urllib.request.Request(f"{base_url}/{endpoint}", data=json.dumps(body).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=300) as response:
+        response.read()
+
+def run_level(base_url, endpoint, concurrency, duration, transcript_words):
+    """Keep concurrency clients busy for duration seconds. Returns throughput and latency stats."""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(index):
+        rng = random.Random(index)
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                make_request(base_url, endpoint, rng, transcript_words)
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+            except OSError as e:  # includes HTTP error statuses
+                with lock:
+                    errors.append(str(e))
+
+    started = time.perf_counter()
+    clients = [threading.Thread(target=client, args=(index,)) for index in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "ok": len(latencies),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "wall_seconds": wall,
+        "throughput": len(latencies) / wall if wall else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the API server against a local fake OpenAI server.")
+    parser.add_argument("--server", choices=["gunicorn", "dev"], default="gunicorn")
+    parser.add_argument("--endpoint", choices=ENDPOINTS, default="summarize")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=16, help="gunicorn threads per worker")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated numbers of concurrent clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per concurrency level")
+    parser.add_argument("--transcript-words", type=int, default=300, help="Words per request transcript")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--output", default=None, help="Also write the report as JSON to this file")
+    add_settings_arguments(parser)
+    args = parser.parse_args()
+
+    settings = settings_from_args(args)
+    fake_server, fake_url = start_server(settings)
+    workdir = tempfile.mkdtemp(prefix="load_")
+
+    # Rate budgets are opened up so the server, not the client-side limiter, is what gets measured
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")])),
+        "OPENAI_BASE_URL": fake_url,
+        "OPENAI_API_KEY": "fake-benchmark-key",
+        "API_HOST": "127.0.0.1",
+        "API_PORT": str(args.port),
+        "DEBUG": "false",
+        "RETENTION_ENABLED": "false",
+        "CACHE_FOLDER": os.path.join(workdir, "cache"),
+        "TEMP_FOLDER": os.path.join(workdir, "tmp"),
+        "OPENAI_REQUESTS_PER_MINUTE": "1000000",
+        "OPENAI_TOKENS_PER_MINUTE": "1000000000",
+        "OPENAI_BACKOFF_BASE": "0.1"
+    })
+    os.makedirs(env["TEMP_FOLDER"], exist_ok=True)
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    process = start_api(args.server, args.port, workdir, env, args.workers, args.threads)
+    try:
+        wait_until_ready(base_url, process, workdir)
+        levels = [int(level) for level in args.concurrency.split(",") if level]
+        report = {"settings": vars(args), "levels": []}
+        for level in levels:
+            print(f"Running {args.endpoint} on {args.server} at concurrency {level} for {args.duration:.0f}s...")
+            report["levels"].append(run_level(base_url, args.endpoint, level, args.duration,
+                                              args.transcript_words))
+        report["server_counts"] = dict(settings.counts)
+
+        label = f"{args.server}" + (f" {args.workers}x{args.threads}" if args.server == "gunicorn" else "")
+        print(f"\n{'server':<16} {'conc':>4} {'ok':>6} {'err':>4} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+        for row in report["levels"]:
+            print(f"{label:<16} {row['concurrency']:>4} {row['ok']:>6} {row['errors']:>4} "
+                  f"{row['throughput']:>8.2f} {format_seconds(row['p50']):>9} "
+                  f"{format_seconds(row['p95']):>9} {format_seconds(row['p99']):>9}")
+            if row["first_error"]:
+                print(f"{'':<16} first error: {row['first_error'][:120]}")
+        print(f"\nFake server requests: {report['server_counts']}")
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            print(f"Report written to {args.output}")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        fake_server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""Offline pipeline benchmarks against the local fake OpenAI server.
+
+Measures each stage -- audio extraction, transcription, summary, key
+concepts, quiz, and the Flask endpoints -- at several concurrency levels and
+reports throughput and p50/p95/p99 latency. No real API calls are made.
+
+    python benchmarks/run_benchmarks.py --concurrency 1,4,8 --iterations 8
+    python benchmarks/run_benchmarks.py --stages summary,quiz --latency 1.5 --rate-limit-rate 0.05
+"""
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import shutil
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_openai import start_server, add_settings_arguments, settings_from_args, sentence
+
+STAGES = ["extract", "transcription", "summary", "key_concepts", "quiz",
+          "api_summarize", "api_generate_quiz", "api_process_all"]
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+def measure(func, concurrency, requests):
+    """Run func requests times on concurrency threads. Returns latency and throughput stats."""
+    latencies = []
+    errors = []
+
+    def timed(_):
+        started = time.perf_counter()
+        try:
+            func()
+            latencies.append(time.perf_counter() - started)
+        except Exception as e:
+            errors.append(str(e))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed, range(requests)))
+    wall = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "ok": len(latencies),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "wall_seconds": wall,
+        "throughput": len(latencies) / wall if wall else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99)
+    }
+
+def make_sample_video(path, seconds):
+    """Render a test video (color bars + tone) with ffmpeg."""
+    from transcription import get_ffmpeg_binary
+    subprocess.run(
+        [get_ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-y",
+         "-f", "lavfi", "-i", "testsrc=size=320x240:rate=15",
+         "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=44100",
+         "-t", str(seconds), "-c:v", "libx264", "-preset", "ultrafast", "-c:a", "aac", path],
+        check=True, capture_output=True
+    )
+    return path
+
+def build_stage_functions(video_path, transcript, segments):
+    """Zero-argument callables for each benchmark stage. Caches are bypassed on every call."""
+    from config import Config
+    from cache import hash_file, hash_key
+    import transcription
+    from summarization import summarize_transcript, extract_key_concepts
+    from quiz_generator import generate_quiz
+    from app import app
+
+    client = app.test_client()
+    video_hash = hash_file(video_path) if video_path else None
+
+    def extract():
+        audio_path = transcription.extract_audio(video_path)
+        os.remove(audio_path)
+
+    def transcribe():
+        # A fresh hash each call so the transcript cache never answers
+        transcription.process_video_transcription(video_path, video_hash=uuid.uuid4().hex)
+
+    def post_json(path, body):
+        response = client.post(path, json=body)
+        if response.status_code != 200:
+            raise Exception(f"{path} returned {response.status_code}: {response.get_json()}")
+
+    def api_process_all():
+        # The endpoint hashes the upload itself, so drop that transcript from the cache first
+        transcription.get_transcript_cache().delete(hash_key(video_hash, "auto", Config.WHISPER_MODEL))
+        with open(video_path, "rb") as f:
+            response = client.post("/process-all", data={
+                "video": (f, "benchmark.mp4"),
+                "force_refresh": "true"
+            }, content_type="multipart/form-data")
+        if response.status_code != 200:
+            raise Exception(f"/process-all returned {response.status_code}: {response.get_json()}")
+
+    return {
+        "extract": extract if video_path else None,
+        "transcription": transcribe if video_path else None,
+        "summary": lambda: summarize_transcript(transcript, "medium", segments=segments, force_refresh=True),
+        "key_concepts": lambda: extract_key_concepts(transcript, segments=segments, force_refresh=True),
+        "quiz": lambda: generate_quiz(transcript, 5, "medium", segments=segments, force_refresh=True),
+        "api_summarize": lambda: post_json("/summarize", {
+            "transcript": transcript, "segments": segments, "force_refresh": True}),
+        "api_generate_quiz": lambda: post_json("/generate-quiz", {
+            "transcript": transcript, "segments": segments, "force_refresh": True}),
+        "api_process_all": api_process_all if video_path else None
+    }
+
+def format_seconds(value):
+    return "-" if value is None else f"{value * 1000:.0f}ms"
+
+def print_report(report):
+    print(f"\n{'stage':<18} {'conc':>4} {'ok':>5} {'err':>4} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for stage, rows in report["stages"].items():
+        for row in rows:
+            print(f"{stage:<18} {row['concurrency']:>4} {row['ok']:>5} {row['errors']:>4} "
+                  f"{row['throughput']:>8.2f} {format_seconds(row['p50']):>9} "
+                  f"{format_seconds(row['p95']):>9} {format_seconds(row['p99']):>9}")
+            if row["first_error"]:
+                print(f"{'':<18} first error: {row['first_error'][:120]}")
+    print(f"\nFake server requests: {report['server_counts']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline against a local fake OpenAI server.")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated subset of {','.join(STAGES)}")
+    parser.add_argument("--concurrency", default="1,4,8", help="Comma-separated concurrency levels")
+    parser.add_argument("--iterations", type=int, default=8, help="Requests per concurrency level (at least the level)")
+    parser.add_argument("--video", default=None, help="Video to use (default: a generated test video)")
+    parser.add_argument("--video-seconds", type=int, default=60, help="Length of the generated test video")
+    parser.add_argument("--transcript-words", type=int, default=3000, help="Words in the synthetic transcript")
+    parser.add_argument("--output", default=None, help="Also write the report as JSON to this file")
+    add_settings_arguments(parser)
+    args = parser.parse_args()
+
+    settings = settings_from_args(args)
+    server, base_url = start_server(settings)
+    workdir = tempfile.mkdtemp(prefix="bench_")
+
+    # Must be set before config is imported; rate budgets are opened up so the
+    # fake server's latency, not the client-side limiter, is what gets measured
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "fake-benchmark-key"
+    os.environ["CACHE_FOLDER"] = os.path.join(workdir, "cache")
+    os.environ["TEMP_FOLDER"] = os.path.join(workdir, "tmp")
+    os.environ["JOBS_FOLDER"] = os.path.join(workdir, "jobs")
+    os.environ["BATCH_FOLDER"] = os.path.join(workdir, "batches")
+    os.environ["ARTIFACT_DB"] = os.path.join(workdir, "outputs", "artifacts.db")
+    os.environ["SEGMENT_INDEX_DB"] = os.path.join(workdir, "outputs", "segment_index.db")
+    os.environ["QUESTION_BANK_DB"] = os.path.join(workdir, "outputs", "question_bank.db")
+    os.environ.setdefault("OPENAI_REQUESTS_PER_MINUTE", "1000000")
+    os.environ.setdefault("OPENAI_TOKENS_PER_MINUTE", "1000000000")
+    os.environ.setdefault("OPENAI_BACKOFF_BASE", "0.1")
+    os.makedirs(os.environ["TEMP_FOLDER"], exist_ok=True)
+    os.makedirs(os.path.join(workdir, "outputs"), exist_ok=True)
+    # uploads/ and outputs/ are relative to the working directory, so run from the workdir
+    video = os.path.abspath(args.video) if args.video else None
+    output = os.path.abspath(args.output) if args.output else None
+    cwd = os.getcwd()
+    os.chdir(workdir)
+
+    rng = random.Random(args.seed)
+    segments = []
+    words = 0
+    while words < args.transcript_words:
+        text = sentence(rng, 20)
+        segments.append({"id": len(segments), "start": len(segments) * 6.0,
+                         "end": len(segments) * 6.0 + 6.0, "text": text})
+        words += 20
+    transcript = " ".join(segment["text"] for segment in segments)
+
+    video_path = video
+    try:
+        if video_path is None:
+            try:
+                video_path = make_sample_video(os.path.join(workdir, "sample.mp4"), args.video_seconds)
+            except Exception as e:
+                print(f"Could not generate a test video ({e}); skipping video stages")
+
+        functions = build_stage_functions(video_path, transcript, segments)
+        levels = [int(level) for level in args.concurrency.split(",") if level]
+        report = {"settings": vars(args), "stages": {}}
+
+        for stage in [s.strip() for s in args.stages.split(",") if s.strip()]:
+            func = functions.get(stage)
+            if func is None:
+                print(f"Skipping {stage}: no video available" if stage in functions else f"Unknown stage {stage}")
+                continue
+            report["stages"][stage] = []
+            for level in levels:
+                print(f"Running {stage} at concurrency {level}...")
+                report["stages"][stage].append(measure(func, level, max(args.iterations, level)))
+
+        report["server_counts"] = dict(settings.counts)
+        print_report(report)
+        if output:
+            with open(output, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            print(f"Report written to {output}")
+    finally:
+        os.chdir(cwd)
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
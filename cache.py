@@ -0,0 +1,310 @@
+import os
+import copy
+import json
+import time
+import hashlib
+import inspect
+import functools
+import threading
+from collections import OrderedDict
+import metrics
+from singleflight import SingleFlight
+
+HASH_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+def hash_key(*parts):
+    """Build a filesystem-safe cache key from arbitrary string parts."""
+    return hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+def hash_file(filepath, chunk_size=HASH_CHUNK_SIZE):
+    """Return the SHA-256 content hash of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def copy_and_hash(stream, filepath, chunk_size=HASH_CHUNK_SIZE):
+    """Stream data to disk while hashing it. Returns (sha256 hex digest, bytes written)."""
+    digest = hashlib.sha256()
+    total = 0
+    with open(filepath, "wb") as f:
+        for chunk in iter(lambda: stream.read(chunk_size), b""):
+            digest.update(chunk)
+            f.write(chunk)
+            total += len(chunk)
+    return digest.hexdigest(), total
+
+class DiskCache:
+    """Persistent JSON cache with a byte cap and least-recently-used eviction.
+
+    Each entry is a file named after its key. Recency is tracked in memory and
+    mirrored to file mtimes so the LRU order survives restarts.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size, oldest first
+        self._total_bytes = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _load_index(self):
+        """Rebuild the in-memory LRU order from the files on disk."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            entries.append((stat.st_mtime, name[:-5], stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss."""
+        path = self._path(key)
+        with self._lock:
+            if key not in self._entries:
+                # Another server process may have written it since this index was built
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    self.misses += 1
+                    return None
+                self._entries[key] = size
+                self._total_bytes += size
+            self._entries.move_to_end(key)
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path, None)
+        except (OSError, ValueError):
+            with self._lock:
+                self._forget(key)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """Store a JSON-serializable value, evicting old entries to stay under the cap."""
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._forget(key)
+            self._entries[key] = size
+            self._total_bytes += size
+            self._evict()
+
+    def delete(self, key):
+        """Remove an entry if present."""
+        with self._lock:
+            if key in self._entries:
+                self._forget(key)
+                self._remove_file(key)
+
+    def _forget(self, key):
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self._total_bytes -= size
+
+    def _remove_file(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self._remove_file(key)
+            self.evictions += 1
+
+    def stats(self):
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0
+            }
+
+class MemoryCache:
+    """Thread-safe in-process LRU cache with per-entry TTL."""
+
+    def __init__(self, max_entries, ttl_seconds=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires_at = time.time() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+class TieredCache:
+    """Two-tier cache: in-process LRU in front of a persistent DiskCache."""
+
+    def __init__(self, memory, disk, ttl_seconds=None):
+        self.memory = memory
+        self.disk = disk
+        self.ttl_seconds = ttl_seconds
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            with self._lock:
+                self.memory_hits += 1
+            return value
+
+        entry = self.disk.get(key)
+        if entry is not None and (not self.ttl_seconds or entry["created_at"] + self.ttl_seconds >= time.time()):
+            self.memory.set(key, entry["value"])
+            with self._lock:
+                self.disk_hits += 1
+            return entry["value"]
+
+        if entry is not None:
+            self.disk.delete(key)  # expired
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        self.disk.set(key, {"created_at": time.time(), "value": value})
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": ((self.memory_hits + self.disk_hits) / lookups) if lookups else 0.0,
+                "disk": self.disk.stats()
+            }
+
+def normalize_text(text):
+    """Collapse whitespace so cosmetic differences don't defeat the cache."""
+    return " ".join(str(text).split())
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+def get_llm_cache():
+    """Return the shared response cache for LLM calls, creating it on first use."""
+    global _llm_cache
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            from config import Config
+            _llm_cache = TieredCache(
+                MemoryCache(Config.LLM_CACHE_MEMORY_ENTRIES, Config.LLM_CACHE_TTL_SECONDS),
+                DiskCache(os.path.join(Config.CACHE_FOLDER, "llm"), Config.LLM_CACHE_MAX_BYTES),
+                Config.LLM_CACHE_TTL_SECONDS
+            )
+        return _llm_cache
+
+def memoize_llm(namespace, version):
+    """Cache an LLM-backed function on a normalized hash of its arguments.
+
+    The first positional argument is treated as transcript-like text and is
+    whitespace-normalized before hashing. Bump version whenever the prompt
+    template changes. Callers pass force_refresh=True to bypass the lookup
+    and overwrite the stored response; it is forwarded to the function when
+    the function accepts it, so nested cached calls are refreshed too.
+
+    Concurrent misses for the same key are coalesced: one caller runs the
+    function and the others wait for its result instead of repeating the call.
+    force_refresh calls are never coalesced.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        accepts_refresh = "force_refresh" in signature.parameters
+        flight = SingleFlight(namespace)
+
+        def cache_key(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            params = dict(bound.arguments)
+            params.pop("force_refresh", None)
+            text_name = next(iter(params))
+            params[text_name] = normalize_text(params[text_name])
+            return hash_key(namespace, version, json.dumps(params, sort_keys=True, default=str))
+
+        @functools.wraps(func)
+        def wrapper(*args, force_refresh=False, **kwargs):
+            key = cache_key(*args, **kwargs)
+            cache = get_llm_cache()
+            if not force_refresh:
+                cached = cache.get(key)
+                if cached is not None:
+                    metrics.CACHE_REQUESTS.inc(cache=namespace, result="hit")
+                    return copy.deepcopy(cached)
+            metrics.CACHE_REQUESTS.inc(cache=namespace, result="refresh" if force_refresh else "miss")
+
+            if accepts_refresh:
+                kwargs["force_refresh"] = force_refresh
+
+            def compute():
+                result = func(*args, **kwargs)
+                cache.set(key, result)
+                return copy.deepcopy(result)  # the memory tier keeps the original
+
+            if force_refresh:
+                return compute()  # asked for a fresh response, not someone else's in-flight one
+            return flight.do(key, compute)
+
+        # Lets streaming variants read and fill the same cache entries
+        wrapper.cache_key = cache_key
+        return wrapper
+    return decorator
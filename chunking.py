@@ -0,0 +1,62 @@
+from context_packer import count_tokens, split_sentences, split_words
+
+def format_timestamp(seconds):
+    """Format seconds as M:SS or H:MM:SS."""
+    seconds = int(seconds or 0)
+    hours, remainder = divmod(seconds, 3600)
+    minutes, secs = divmod(remainder, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes}:{secs:02d}"
+
+def _units_from_text(transcript):
+    """Pseudo-segments without timestamps, for transcripts passed as plain text."""
+    return [{"text": sentence, "start": None, "end": None} for sentence in split_sentences(transcript)]
+
+def chunk_transcript(transcript, segments=None, max_tokens=2000):
+    """Split a transcript into chunks of at most max_tokens, never cutting through a segment.
+
+    Uses Whisper segments when available so each chunk carries its start/end
+    time; falls back to sentence boundaries for plain text. Returns a list of
+    {"index", "text", "start", "end", "tokens"} dicts in timeline order.
+    """
+    units = [
+        {"text": (seg.get("text") or "").strip(), "start": seg.get("start"), "end": seg.get("end")}
+        for seg in (segments or [])
+    ]
+    units = [unit for unit in units if unit["text"]] or _units_from_text(transcript)
+
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    def flush():
+        if current:
+            chunks.append({
+                "index": len(chunks),
+                "text": " ".join(unit["text"] for unit in current),
+                "start": current[0]["start"],
+                "end": current[-1]["end"],
+                "tokens": current_tokens
+            })
+
+    for unit in units:
+        # Oversized units (e.g. a transcript with no punctuation) are split into word windows
+        for piece in split_words(unit["text"]):
+            piece_tokens = count_tokens(piece)
+            if current and current_tokens + piece_tokens > max_tokens:
+                flush()
+                current = []
+                current_tokens = 0
+            current.append(dict(unit, text=piece))
+            current_tokens += piece_tokens
+
+    flush()
+    return chunks
+
+def chunk_label(chunk, total):
+    """Human-readable position of a chunk, e.g. 'Part 2 of 5 (10:00-20:00)'."""
+    label = f"Part {chunk['index'] + 1} of {total}"
+    if chunk.get("start") is not None and chunk.get("end") is not None:
+        label += f" ({format_timestamp(chunk['start'])}-{format_timestamp(chunk['end'])})"
+    return label
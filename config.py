@@ -9,24 +9,119 @@ class Config:
 
     # API Keys
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+    OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL')  # None uses the public API
 
     # File paths
     UPLOAD_FOLDER = 'uploads'
     OUTPUT_FOLDER = 'outputs'
+    TEMP_FOLDER = os.getenv('TEMP_FOLDER', 'tmp')
+    CACHE_FOLDER = os.getenv('CACHE_FOLDER', 'cache')
+    JOBS_FOLDER = os.getenv('JOBS_FOLDER', 'jobs')
+    BATCH_FOLDER = os.getenv('BATCH_FOLDER', 'batches')
+    ARTIFACT_DB = os.getenv('ARTIFACT_DB', os.path.join('outputs', 'artifacts.db'))
+    SEGMENT_INDEX_DB = os.getenv('SEGMENT_INDEX_DB', os.path.join('outputs', 'segment_index.db'))
+    QUESTION_BANK_DB = os.getenv('QUESTION_BANK_DB', os.path.join('outputs', 'question_bank.db'))
+    ARTIFACT_DB_BUSY_TIMEOUT = float(os.getenv('ARTIFACT_DB_BUSY_TIMEOUT', 30))  # seconds to wait for the write lock
 
     # File limits
-    MAX_FILE_SIZE = 100 * 1024 * 1024  # 100MB
+    MAX_FILE_SIZE = 100 * 1024 * 1024  # 100MB per request
+    MAX_UPLOAD_SIZE = int(os.getenv('MAX_UPLOAD_SIZE', 2 * 1024 * 1024 * 1024))  # 2GB via chunked uploads
+    UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # suggested chunk size for resumable uploads
     ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv', 'webm'}
 
     # API settings
-    API_HOST = '0.0.0.0'
-    API_PORT = 5000
-    DEBUG = True
+    API_HOST = os.getenv('API_HOST', '0.0.0.0')
+    API_PORT = int(os.getenv('API_PORT', 5000))
+    DEBUG = os.getenv('DEBUG', 'false').lower() in ('1', 'true', 'yes')  # dev server only: reloader + debugger
+
+    # Production server settings (gunicorn.conf.py)
+    WEB_WORKERS = int(os.getenv('WEB_WORKERS', 4))  # processes
+    WEB_THREADS = int(os.getenv('WEB_THREADS', 16))  # requests in flight per process
+    WEB_TIMEOUT = int(os.getenv('WEB_TIMEOUT', 120))  # seconds without a heartbeat before a worker is restarted
+    WEB_GRACEFUL_TIMEOUT = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 60))  # seconds for in-flight requests on shutdown
+    WEB_KEEPALIVE = int(os.getenv('WEB_KEEPALIVE', 5))
+    SERVER_PROCESSES = 1  # set by gunicorn.conf.py to the number of workers
+    METRICS_FOLDER = os.getenv('METRICS_FOLDER', 'metrics')  # per-worker metric snapshots, summed by /metrics
+    METRICS_SNAPSHOT_INTERVAL = int(os.getenv('METRICS_SNAPSHOT_INTERVAL', 5))  # seconds
+
+    # Response settings
+    GZIP_MIN_BYTES = int(os.getenv('GZIP_MIN_BYTES', 1024))  # smaller responses are sent uncompressed
+    GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', 5))
+    SEGMENT_PAGE_SIZE = 200  # default segments per page
+    SEGMENT_PAGE_MAX = 2000
+
+    # Retention settings (0 disables a limit)
+    RETENTION_ENABLED = os.getenv('RETENTION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    UPLOAD_QUOTA_BYTES = int(os.getenv('UPLOAD_QUOTA_BYTES', 20 * 1024 * 1024 * 1024))  # 20GB
+    UPLOAD_MAX_AGE = int(os.getenv('UPLOAD_MAX_AGE', 7 * 24 * 3600))  # seconds since last use
+    PARTIAL_UPLOAD_MAX_AGE = int(os.getenv('PARTIAL_UPLOAD_MAX_AGE', 24 * 3600))  # idle resumable uploads
+    JOB_MAX_AGE = int(os.getenv('JOB_MAX_AGE', 7 * 24 * 3600))  # finished jobs, since their last update
+    RETENTION_MIN_AGE = int(os.getenv('RETENTION_MIN_AGE', 600))  # never evict files used more recently
+    RETENTION_SWEEP_INTERVAL = int(os.getenv('RETENTION_SWEEP_INTERVAL', 60))  # seconds
+    RETENTION_RESCAN_INTERVAL = int(os.getenv('RETENTION_RESCAN_INTERVAL', 300))  # picks up other workers' files
 
     # Model settings
     WHISPER_MODEL = 'whisper-1'
     GPT_MODEL = 'gpt-4'
 
+    # Audio extraction settings
+    AUDIO_EXTRACTION_ENGINE = os.getenv('AUDIO_EXTRACTION_ENGINE', 'ffmpeg')  # ffmpeg, moviepy
+    AUDIO_SAMPLE_RATE = 16000  # Whisper resamples to 16kHz mono anyway
+    AUDIO_BITRATE = '32k'
+    EXTRACTION_CONCURRENCY = int(os.getenv('EXTRACTION_CONCURRENCY', 2))  # parallel ffmpeg processes
+
+    # Transcription settings
+    WHISPER_MAX_FILE_SIZE = 25 * 1024 * 1024  # 25MB Whisper upload limit
+    TRANSCRIPTION_CHUNK_SECONDS = int(os.getenv('TRANSCRIPTION_CHUNK_SECONDS', 600))
+    TRANSCRIPTION_MAX_WORKERS = int(os.getenv('TRANSCRIPTION_MAX_WORKERS', 4))
+    SILENCE_THRESHOLD_DB = -35
+    SILENCE_MIN_DURATION = 0.5
+
+    # Silence trimming before upload (VAD)
+    VAD_ENABLED = os.getenv('VAD_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    VAD_THRESHOLD_DB = float(os.getenv('VAD_THRESHOLD_DB', -40))  # frames quieter than this count as silence
+    VAD_MIN_SILENCE = float(os.getenv('VAD_MIN_SILENCE', 2.0))  # seconds; shorter pauses are left alone
+    VAD_KEEP_SILENCE = float(os.getenv('VAD_KEEP_SILENCE', 0.5))  # seconds of each long silence kept as a pause
+    VAD_FRAME_SECONDS = 0.03
+    VAD_MIN_SAVING = float(os.getenv('VAD_MIN_SAVING', 5.0))  # seconds; below this the audio is not re-encoded
+
+    # Cache settings
+    TRANSCRIPT_CACHE_MAX_BYTES = int(os.getenv('TRANSCRIPT_CACHE_MAX_BYTES', 500 * 1024 * 1024))  # 500MB
+    LLM_CACHE_MAX_BYTES = int(os.getenv('LLM_CACHE_MAX_BYTES', 100 * 1024 * 1024))  # 100MB
+    LLM_CACHE_MEMORY_ENTRIES = int(os.getenv('LLM_CACHE_MEMORY_ENTRIES', 512))
+    LLM_CACHE_TTL_SECONDS = int(os.getenv('LLM_CACHE_TTL_SECONDS', 7 * 24 * 3600))  # 1 week
+
+    # Job settings
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+    JOB_RECOVERY_INTERVAL = int(os.getenv('JOB_RECOVERY_INTERVAL', 60))  # seconds between recovery passes
+    STAGE_TIMEOUTS = {  # seconds
+        'transcription': int(os.getenv('TRANSCRIPTION_TIMEOUT', 1800)),
+        'summary': int(os.getenv('LLM_STAGE_TIMEOUT', 240)),
+        'key_concepts': int(os.getenv('LLM_STAGE_TIMEOUT', 240)),
+        'quiz': int(os.getenv('LLM_STAGE_TIMEOUT', 240))
+    }
+
+    # Question bank settings
+    QUESTION_BANK_TYPES = tuple(os.getenv('QUESTION_BANK_TYPES', 'mcq,true_false').split(','))
+    QUESTION_BANK_BATCH_SIZE = int(os.getenv('QUESTION_BANK_BATCH_SIZE', 5))  # per chunk, difficulty and type
+    QUESTION_BANK_LOW_WATER = int(os.getenv('QUESTION_BANK_LOW_WATER', 10))  # unseen questions before a top-up
+
+    # Batch settings
+    BATCH_EXTRACT_WORKERS = int(os.getenv('BATCH_EXTRACT_WORKERS', 2))  # videos extracting/transcribing at once
+    BATCH_LLM_WORKERS = int(os.getenv('BATCH_LLM_WORKERS', 4))  # videos in summary/quiz generation at once
+
+    # LLM settings
+    LLM_MAX_WORKERS = int(os.getenv('LLM_MAX_WORKERS', 4))  # parallel chunk calls per request
+
+    # OpenAI client settings (rate budgets are for the whole server, split evenly across its processes)
+    OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', 20))
+    OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', 120))
+    OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', 5))
+    OPENAI_BACKOFF_BASE = float(os.getenv('OPENAI_BACKOFF_BASE', 1.0))  # seconds
+    OPENAI_BACKOFF_MAX = 60.0  # seconds
+    OPENAI_REQUESTS_PER_MINUTE = int(os.getenv('OPENAI_REQUESTS_PER_MINUTE', 500))
+    OPENAI_TOKENS_PER_MINUTE = int(os.getenv('OPENAI_TOKENS_PER_MINUTE', 40000))
+
     # Default values
     DEFAULT_NUM_QUESTIONS = 5
     DEFAULT_DIFFICULTY = 'medium'
@@ -0,0 +1,123 @@
+import re
+from functools import lru_cache
+
+# Common English function words carry no topical signal
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers herself him himself his how i if in into is it its itself just let me more
+most my myself no nor not now of off on once only or other our ours ourselves out over own same she
+should so some such than that the their theirs them themselves then there these they this those
+through to too under until up very was we were what when where which while who whom why will with
+would you your yours yourself yourselves okay ok yeah um uh like really actually going gonna know
+right so well also get got thing things
+""".split())
+
+@lru_cache(maxsize=1)
+def _get_encoder():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+def count_tokens(text):
+    """Count GPT-4 tokens in text (tiktoken if installed, else a ~4 chars/token estimate)."""
+    encoder = _get_encoder()
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4) if text else 0
+
+def split_sentences(text):
+    """Split text into sentences, keeping the terminal punctuation."""
+    return [s for s in re.split(r"(?<=[.!?])\s+", text.strip()) if s]
+
+def split_words(text, max_words=200):
+    """Break an unpunctuated run of text into windows of at most max_words words."""
+    words = text.split()
+    return [" ".join(words[i:i + max_words]) for i in range(0, len(words), max_words)] or [text]
+
+def _tokenize(text):
+    return [w for w in re.findall(r"[a-z0-9']+", text.lower()) if len(w) > 2 and w not in STOPWORDS]
+
+def score_units(texts):
+    """Score text units by TF-IDF centrality: cosine similarity to the document centroid.
+
+    Builds a sparse term matrix as flat (row, term, weight) arrays and reduces
+    it with bincount, so cost is linear in the number of words and memory
+    never holds a dense units x vocabulary matrix.
+    """
+    import numpy as np  # deferred: only long transcripts need scoring
+
+    n_units = len(texts)
+    if n_units == 0:
+        return np.zeros(0)
+
+    vocabulary = {}
+    rows = []
+    cols = []
+    for row, text in enumerate(texts):
+        for word in _tokenize(text):
+            rows.append(row)
+            cols.append(vocabulary.setdefault(word, len(vocabulary)))
+
+    if not vocabulary:
+        return np.zeros(n_units)
+
+    n_terms = len(vocabulary)
+    pairs, counts = np.unique(np.asarray(rows, dtype=np.int64) * n_terms + np.asarray(cols, dtype=np.int64),
+                              return_counts=True)
+    rows = pairs // n_terms
+    cols = pairs % n_terms
+
+    document_frequency = np.bincount(cols, minlength=n_terms)
+    idf = np.log((1 + n_units) / (1 + document_frequency)) + 1.0
+    weights = (1.0 + np.log(counts)) * idf[cols]
+
+    norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=n_units))
+    weights = weights / norms[rows]
+
+    centroid = np.bincount(cols, weights=weights, minlength=n_terms) / n_units
+    return np.bincount(rows, weights=weights * centroid[cols], minlength=n_units)
+
+def pack_context(transcript, segments=None, token_budget=3000, gap_marker=" [...] "):
+    """Fit a transcript into token_budget by keeping its most salient segments.
+
+    Returns the transcript unchanged when it already fits. Otherwise segments
+    (or sentences, without Whisper segments) are ranked by TF-IDF centrality,
+    the best ones are kept until the budget is spent, and the survivors are
+    joined back in timeline order with gap_marker where material was dropped.
+    """
+    if count_tokens(transcript) <= token_budget:
+        return transcript
+
+    import numpy as np
+
+    texts = [(seg.get("text") or "").strip() for seg in (segments or [])]
+    texts = [text for text in texts if text] or split_sentences(transcript)
+    texts = [window for text in texts for window in split_words(text)]
+
+    scores = score_units(texts)
+    gap_tokens = count_tokens(gap_marker)
+    costs = np.array([count_tokens(text) + gap_tokens for text in texts])
+
+    selected = np.zeros(len(texts), dtype=bool)
+    remaining = token_budget
+    for idx in np.argsort(-scores, kind="stable"):
+        if costs[idx] <= remaining:
+            selected[idx] = True
+            remaining -= costs[idx]
+
+    # Consecutive kept units form runs; dropped material between runs becomes a gap marker
+    runs = []
+    current = []
+    for idx, text in enumerate(texts):
+        if selected[idx]:
+            current.append(text)
+        elif current:
+            runs.append(" ".join(current))
+            current = []
+    if current:
+        runs.append(" ".join(current))
+
+    return gap_marker.join(runs)
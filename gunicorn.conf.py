@@ -0,0 +1,51 @@
+"""Production server settings, read by gunicorn from the working directory:
+
+    gunicorn app:app
+
+Each worker process serves WEB_THREADS requests at once on a thread pool;
+the LLM endpoints spend nearly all their time waiting on OpenAI with the
+GIL released, so a worker holds that many in-flight calls. The app is
+imported once in the master and forked, so workers share its code and
+libraries instead of each importing them. Per-process state (OpenAI
+client, SQLite connections, job executor) is created lazily, after the
+fork, in every worker; job recovery and the retention sweeper run in one
+lock-elected worker. Each worker writes its metrics to METRICS_FOLDER so
+that /metrics, served by any one of them, reports the whole server.
+"""
+import importlib
+from config import Config
+import metrics
+
+bind = f"{Config.API_HOST}:{Config.API_PORT}"
+workers = Config.WEB_WORKERS
+worker_class = "gthread"
+threads = Config.WEB_THREADS
+timeout = Config.WEB_TIMEOUT
+graceful_timeout = Config.WEB_GRACEFUL_TIMEOUT
+keepalive = Config.WEB_KEEPALIVE
+preload_app = True
+accesslog = "-"
+
+# Imported lazily by the app for a fast cold start; loaded in the master here
+# so that every worker shares one copy instead of importing it on first use
+PRELOAD_MODULES = ["numpy", "httpx", "openai"]
+
+def on_starting(server):
+    # Runs in the master before fork, with the final worker count (command line included);
+    # each worker's rate limiter then takes its share of the OpenAI budgets
+    Config.SERVER_PROCESSES = server.cfg.workers
+    metrics.enable_multiprocess(Config.METRICS_FOLDER)
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            server.log.warning(f"Could not preload {name}: {str(e)}")
+
+def post_worker_init(worker):
+    from app import start_background_services
+    metrics.start_snapshots(Config.METRICS_SNAPSHOT_INTERVAL)
+    start_background_services()
+
+def worker_exit(server, worker):
+    # Counted work of this worker stays in /metrics after it is gone
+    metrics.write_snapshot()
@@ -0,0 +1,209 @@
+import os
+import json
+import time
+import uuid
+import fcntl
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from pipeline import STAGES, run_pipeline
+from retention import get_retention_manager
+
+class JobManager:
+    """Runs pipeline jobs on a bounded worker pool and persists their state.
+
+    Every job is a JSON file in the jobs folder, rewritten atomically on each
+    state change, so any API worker can answer status queries and jobs left
+    queued or running by a dead process are picked up again on startup.
+    A job is owned by the process holding an flock on its lock file in
+    jobs/active/ for as long as it runs; the kernel drops the lock when that
+    process dies, so a lock that can be taken belongs to nobody, whatever
+    the pid reuse. Lock files exist only for queued and running jobs, so
+    that folder is the index of active jobs. Finished job files are removed
+    by the retention sweeper JOB_MAX_AGE after their last update.
+    """
+
+    def __init__(self, jobs_folder=None, max_workers=None):
+        self.jobs_folder = jobs_folder or Config.JOBS_FOLDER
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or Config.JOB_WORKERS,
+            thread_name_prefix="job"
+        )
+        self._lock = threading.Lock()
+        self._lock_files = {}  # job id -> open, flocked lock file descriptor
+        os.makedirs(active_folder(self.jobs_folder), exist_ok=True)
+
+    def _path(self, job_id):
+        return os.path.join(self.jobs_folder, f"{job_id}.json")
+
+    def _lock_path(self, job_id):
+        return os.path.join(active_folder(self.jobs_folder), f"{job_id}.lock")
+
+    def _write(self, job):
+        job["updated_at"] = time.time()
+        path = self._path(job["id"])
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def get(self, job_id):
+        """Load a job by id, or return None if it does not exist."""
+        if not job_id or not all(c.isalnum() for c in job_id):
+            return None
+        try:
+            with open(self._path(job_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def list(self, limit=50):
+        """Return the most recently updated jobs without their results."""
+        jobs = []
+        for name in os.listdir(self.jobs_folder):
+            if name.endswith(".json"):
+                job = self.get(name[:-5])
+                if job:
+                    job.pop("result", None)
+                    job.pop("partial", None)
+                    jobs.append(job)
+        jobs.sort(key=lambda job: job["updated_at"], reverse=True)
+        return jobs[:limit]
+
+    def submit(self, filepath, video_hash=None, params=None):
+        """Create a job for a saved video and queue it. Returns the job dict."""
+        now = time.time()
+        job = {
+            "id": uuid.uuid4().hex,
+            "status": "queued",
+            "filepath": filepath,
+            "video_hash": video_hash,
+            "params": params or {},
+            "stages": {stage: "pending" for stage in STAGES},
+            "partial": {},
+            "error": None,
+            "result": None,
+            "attempts": 0,
+            "created_at": now,
+            "updated_at": now
+        }
+        self._claim(job["id"])  # before the job file exists, so no recovery pass can take it
+        self._write(job)
+        get_retention_manager().pin(filepath)  # until the job finishes
+        self.executor.submit(self._run, job["id"])
+        return job
+
+    def _claim(self, job_id):
+        """Take ownership of a job, or return False if a live process holds it."""
+        lock_path = self._lock_path(job_id)
+        fd = os.open(lock_path, os.O_CREAT | os.O_WRONLY, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # The owner may have finished and removed the file after it was opened
+            if os.fstat(fd).st_ino != os.stat(lock_path).st_ino:
+                raise BlockingIOError
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode("ascii"))  # for whoever is debugging; the flock is what counts
+        with self._lock:
+            self._lock_files[job_id] = fd
+        return True
+
+    def _release(self, job_id):
+        with self._lock:
+            fd = self._lock_files.pop(job_id, None)
+        if fd is None:
+            return
+        try:
+            os.remove(self._lock_path(job_id))  # while still locked, so no claimer takes a finished job
+        except OSError:
+            pass
+        os.close(fd)
+
+    def _update_stage(self, job, stage, status, result=None):
+        """Record a stage transition; completed stages also publish their output for polling clients."""
+        with self._lock:
+            job["stages"][stage] = status
+            if status == "completed" and result is not None:
+                partial = job.setdefault("partial", {})
+                if stage == "transcription":
+                    partial["transcript"] = result[0]  # segments stay out of the job file
+                else:
+                    partial[stage] = result
+            self._write(job)
+
+    def _run(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            self._release(job_id)
+            return
+
+        try:
+            with self._lock:
+                job["status"] = "running"
+                job["attempts"] += 1
+                job["started_at"] = time.time()
+                self._write(job)
+
+            result = run_pipeline(
+                job["filepath"],
+                video_hash=job.get("video_hash"),
+                progress=lambda stage, status, result: self._update_stage(job, stage, status, result),
+                **job["params"]
+            )
+
+            with self._lock:
+                job["status"] = "completed"
+                job["result"] = result
+                job["partial"] = {}
+                job["finished_at"] = time.time()
+                self._write(job)
+        except Exception as e:
+            traceback.print_exc()
+            with self._lock:
+                job["status"] = "failed"
+                job["error"] = str(e)
+                job["finished_at"] = time.time()
+                self._write(job)
+        finally:
+            get_retention_manager().unpin(job["filepath"])
+            self._release(job_id)
+
+    def recover(self, full=False):
+        """Re-queue jobs that were queued or running when their worker died.
+
+        Looks only at jobs with a lock file; with full, at every job file, which
+        also finds jobs queued by a version that kept its locks elsewhere.
+        """
+        if full:
+            job_ids = [name[:-5] for name in os.listdir(self.jobs_folder) if name.endswith(".json")]
+        else:
+            job_ids = [name[:-5] for name in os.listdir(active_folder(self.jobs_folder)) if name.endswith(".lock")]
+        recovered = 0
+        for job_id in job_ids:
+            job = self.get(job_id)
+            if job and job["status"] not in ("queued", "running"):
+                continue
+            if not self._claim(job_id):
+                continue
+            job = self.get(job_id)  # it may have finished just before the claim
+            if not job or job["status"] not in ("queued", "running"):
+                self._release(job_id)  # a lock left behind by a dead process
+                continue
+            job["status"] = "queued"
+            job["stages"] = {stage: "pending" for stage in STAGES}
+            job["partial"] = {}
+            self._write(job)
+            get_retention_manager().pin(job["filepath"])
+            self.executor.submit(self._run, job["id"])
+            recovered += 1
+        if recovered:
+            print(f"Recovered {recovered} unfinished jobs")
+        return recovered
+
+def active_folder(jobs_folder=None):
+    """Folder of the lock files of queued and running jobs."""
+    return os.path.join(jobs_folder or Config.JOBS_FOLDER, "active")
@@ -0,0 +1,309 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+# Latency buckets (seconds) spanning fast local work to multi-minute Whisper uploads
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+FAST_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1)
+BYTES_BUCKETS = (64e3, 256e3, 1e6, 4e6, 16e6, 25e6, 64e6, 256e6)
+AUDIO_SECONDS_BUCKETS = (30, 60, 300, 600, 1200, 1800, 3600, 7200)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+class Metric:
+    """Base for labelled metrics: one child value per combination of label values."""
+
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self):
+        """This process's values as JSON-serializable [label values, value] pairs."""
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def merge(self, snapshots):
+        """Combine the snapshots of several processes into {label values: value}."""
+        merged = {}
+        for snapshot in snapshots:
+            for key, value in snapshot:
+                key = tuple(key)
+                merged[key] = self._combine(merged[key], value) if key in merged else value
+        return merged
+
+    def render(self, snapshots=None):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        if snapshots is None:
+            with self._lock:
+                items = sorted(self._values.items())
+        else:
+            items = sorted(self.merge(snapshots).items())
+        lines.extend(self._render_samples(items))
+        return lines
+
+class Counter(Metric):
+    """Monotonically increasing count."""
+
+    type_name = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _combine(self, a, b):
+        return a + b
+
+    def _render_samples(self, items):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in items]
+
+class Gauge(Metric):
+    """Value that can go up and down. Across processes, the most recently set value wins."""
+
+    type_name = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = (value, time.time())
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = (self._values.get(key, (0, 0))[0] + amount, time.time())
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def _combine(self, a, b):
+        return a if a[1] >= b[1] else b
+
+    def _render_samples(self, items):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, (value, _) in items]
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets, with sum and count."""
+
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def _combine(self, a, b):
+        return [x + y for x, y in zip(a[0], b[0])], a[1] + b[1]
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a with-block, whether or not it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_samples(self, items):
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class Registry:
+    """Holds metrics and renders them in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def render(self, snapshots=None):
+        """This process's metrics, or the sum of the given registry snapshots of several processes."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        if snapshots is None:
+            lines = [line for metric in metrics for line in metric.render()]
+        else:
+            lines = [line for metric in metrics
+                     for line in metric.render([snapshot.get(metric.name, []) for snapshot in snapshots])]
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Set in the gunicorn master before fork: every worker then writes its snapshot here
+_shared_folder = None
+
+def enable_multiprocess(folder):
+    """Aggregate the metrics of every server process through snapshot files in folder.
+
+    Call once before forking the workers; snapshots of an earlier run are
+    removed, so counters restart from zero like a single process would.
+    Snapshots of workers that have exited are kept, so counters never go
+    backwards when a worker is replaced.
+    """
+    global _shared_folder
+    os.makedirs(folder, exist_ok=True)
+    for name in os.listdir(folder):
+        if name.endswith((".json", ".tmp")):
+            os.remove(os.path.join(folder, name))
+    _shared_folder = os.path.abspath(folder)
+
+def write_snapshot():
+    """Write this process's metrics for the others to read; a no-op unless multiprocess mode is on."""
+    if _shared_folder is None:
+        return
+    path = os.path.join(_shared_folder, f"{os.getpid()}.json")
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(REGISTRY.snapshot(), f)
+    os.replace(tmp_path, path)
+
+def start_snapshots(interval):
+    """Write this process's snapshot every interval seconds, from a daemon thread."""
+    if _shared_folder is None:
+        return
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                write_snapshot()
+            except Exception as e:
+                print(f"Could not write metrics snapshot: {str(e)}")
+
+    threading.Thread(target=run, name="metrics-snapshots", daemon=True).start()
+
+def _read_snapshots():
+    snapshots = []
+    for name in os.listdir(_shared_folder):
+        if name.endswith(".json"):
+            try:
+                with open(os.path.join(_shared_folder, name), "r", encoding="utf-8") as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    return snapshots
+
+def counter(name, documentation, labelnames=()):
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+def gauge(name, documentation, labelnames=()):
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+def render():
+    """All metrics in Prometheus text format: of every server process in multiprocess mode, else of this one.
+
+    Other processes' values are as of their last snapshot.
+    """
+    if _shared_folder is None:
+        return REGISTRY.render()
+    write_snapshot()
+    return REGISTRY.render(_read_snapshots())
+
+# HTTP
+HTTP_REQUEST_SECONDS = histogram("http_request_duration_seconds", "Flask request latency",
+                                 ["endpoint", "method", "status"])
+
+# Pipeline
+STAGE_SECONDS = histogram("pipeline_stage_duration_seconds", "Pipeline stage latency", ["stage", "status"])
+
+# Audio extraction
+EXTRACTION_SECONDS = histogram("audio_extraction_duration_seconds", "Audio extraction latency",
+                               ["engine", "status"])
+AUDIO_DURATION_SECONDS = histogram("audio_duration_seconds", "Duration of extracted audio",
+                                   buckets=AUDIO_SECONDS_BUCKETS)
+AUDIO_BYTES = histogram("audio_extracted_bytes", "Size of extracted audio files", buckets=BYTES_BUCKETS)
+
+VAD_SECONDS_SAVED = counter("vad_trimmed_seconds_total", "Seconds of silence removed before transcription")
+VAD_BYTES_SAVED = counter("vad_saved_bytes_total", "Audio bytes saved by silence trimming")
+
+# OpenAI API
+OPENAI_REQUEST_SECONDS = histogram("openai_request_duration_seconds",
+                                   "OpenAI API call latency per attempt (streams: time to first response)",
+                                   ["endpoint", "status"])
+OPENAI_ERRORS = counter("openai_errors_total", "Failed OpenAI API attempts", ["endpoint", "error"])
+OPENAI_RETRIES = counter("openai_retries_total", "Retried OpenAI API attempts", ["endpoint"])
+OPENAI_TOKENS = counter("openai_tokens_total", "Tokens reported by the API", ["model", "kind"])
+WHISPER_UPLOAD_BYTES = counter("whisper_upload_bytes_total", "Audio bytes sent to Whisper")
+RATE_LIMIT_WAIT_SECONDS = counter("openai_rate_limit_wait_seconds_total",
+                                  "Time spent waiting on the client-side rate limiter")
+
+# Parsing, files and caches
+JSON_PARSE_SECONDS = histogram("quiz_json_parse_duration_seconds", "Quiz JSON parse latency", ["status"],
+                               buckets=FAST_BUCKETS)
+ARTIFACT_WRITE_SECONDS = histogram("artifact_store_write_duration_seconds",
+                                   "Artifact store transaction latency (including lock waits)")
+QUESTION_BANK_GENERATED = counter("question_bank_generated_total", "Questions added to question banks",
+                                  ["reason"])
+QUESTION_BANK_SAMPLE_SECONDS = histogram("question_bank_sample_duration_seconds", "Question bank quiz sampling latency",
+                                         buckets=FAST_BUCKETS)
+COALESCED_CALLS = counter("singleflight_coalesced_total",
+                          "Callers that waited on an identical in-flight computation instead of running it",
+                          ["name"])
+RETENTION_BYTES = gauge("retention_directory_bytes", "Bytes of evictable files per managed directory",
+                        ["directory"])
+RETENTION_EVICTED_FILES = counter("retention_evicted_files_total", "Files removed by the retention sweeper",
+                                  ["directory", "reason"])
+RETENTION_RECLAIMED_BYTES = counter("retention_reclaimed_bytes_total", "Disk space reclaimed by the retention sweeper",
+                                    ["directory", "reason"])
+RETENTION_SWEEP_SECONDS = histogram("retention_sweep_duration_seconds", "Retention sweep latency",
+                                    buckets=FAST_BUCKETS)
+CACHE_REQUESTS = counter("cache_requests_total", "Cache lookups", ["cache", "result"])
+ERRORS = counter("errors_total", "Errors by component", ["component"])
@@ -0,0 +1,177 @@
+import time
+import random
+import threading
+from config import Config
+import metrics
+from context_packer import count_tokens
+
+class TokenBucket:
+    """Thread-safe token bucket: capacity units, refilled continuously over one minute."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until amount units are available (0 if they are now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)  # oversized requests wait for a full bucket
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute budgets shared by every OpenAI call in the process.
+
+    A 429 from the API pauses all callers until its Retry-After has passed,
+    so concurrent jobs back off together instead of hammering the limit.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=0):
+        """Block until one request and the given number of tokens fit in the budgets."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                delay = max(
+                    self._paused_until - now,
+                    self.requests.wait_time(1, now),
+                    self.tokens.wait_time(tokens, now) if tokens else 0.0
+                )
+                if delay <= 0:
+                    self.requests.take(1)
+                    if tokens:
+                        self.tokens.take(tokens)
+                    return
+            time.sleep(delay)
+
+    def pause(self, seconds):
+        """Hold back every caller for the given number of seconds."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+_client = None
+_limiter = None
+_init_lock = threading.Lock()
+
+def get_client():
+    """Return the process-wide OpenAI client, built on first use with a pooled HTTP connection.
+
+    openai and httpx are imported here rather than at module load, so
+    importing the app stays fast until the first API call.
+    """
+    global _client
+    with _init_lock:
+        if _client is None:
+            import httpx
+            from openai import OpenAI
+
+            http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=Config.OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=Config.OPENAI_MAX_CONNECTIONS
+                ),
+                timeout=httpx.Timeout(Config.OPENAI_TIMEOUT, connect=10.0)
+            )
+            _client = OpenAI(
+                api_key=Config.OPENAI_API_KEY,
+                base_url=Config.OPENAI_BASE_URL,
+                max_retries=0,  # retries are handled by call_with_retries
+                http_client=http_client
+            )
+        return _client
+
+def get_rate_limiter():
+    """Return the process-wide rate limiter, holding this process's share of the server's budgets."""
+    global _limiter
+    with _init_lock:
+        if _limiter is None:
+            processes = max(1, Config.SERVER_PROCESSES)
+            _limiter = RateLimiter(Config.OPENAI_REQUESTS_PER_MINUTE / processes,
+                                   Config.OPENAI_TOKENS_PER_MINUTE / processes)
+        return _limiter
+
+def _retry_after(error):
+    """Seconds requested by the server's Retry-After header, if any."""
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+def _is_retryable(error):
+    import openai  # already loaded by get_client
+
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+def call_with_retries(func, *args, estimated_tokens=0, endpoint="other", **kwargs):
+    """Call an OpenAI API method under the shared rate limiter, retrying transient failures.
+
+    Backoff is exponential with full jitter; a 429 also pauses every other
+    caller for the server's Retry-After (or the computed backoff). Each
+    attempt is recorded in the OpenAI metrics under endpoint.
+    """
+    limiter = get_rate_limiter()
+    for attempt in range(Config.OPENAI_MAX_RETRIES + 1):
+        wait_start = time.perf_counter()
+        limiter.acquire(estimated_tokens)
+        started = time.perf_counter()
+        metrics.RATE_LIMIT_WAIT_SECONDS.inc(started - wait_start)
+        try:
+            result = func(*args, **kwargs)
+            metrics.OPENAI_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint, status="ok")
+            return result
+        except Exception as e:
+            metrics.OPENAI_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint, status="error")
+            metrics.OPENAI_ERRORS.inc(endpoint=endpoint, error=type(e).__name__)
+            if attempt >= Config.OPENAI_MAX_RETRIES or not _is_retryable(e):
+                raise
+            metrics.OPENAI_RETRIES.inc(endpoint=endpoint)
+            delay = random.uniform(0, min(Config.OPENAI_BACKOFF_MAX, Config.OPENAI_BACKOFF_BASE * 2 ** attempt))
+            if getattr(e, "status_code", None) == 429:
+                delay = _retry_after(e) or delay
+                limiter.pause(delay)
+            print(f"OpenAI call failed ({type(e).__name__}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+def chat_completion(**kwargs):
+    """Rate-limited, retried chat.completions.create. Token cost is estimated from messages + max_tokens."""
+    estimated = sum(count_tokens(message.get("content") or "") for message in kwargs.get("messages", []))
+    estimated += kwargs.get("max_tokens") or 0
+    kwargs.setdefault("model", Config.GPT_MODEL)
+    endpoint = "chat_stream" if kwargs.get("stream") else "chat"
+    response = call_with_retries(get_client().chat.completions.create, estimated_tokens=estimated,
+                                 endpoint=endpoint, **kwargs)
+
+    usage = getattr(response, "usage", None)  # absent on streams
+    if usage is not None:
+        metrics.OPENAI_TOKENS.inc(usage.prompt_tokens or 0, model=kwargs["model"], kind="prompt")
+        metrics.OPENAI_TOKENS.inc(usage.completion_tokens or 0, model=kwargs["model"], kind="completion")
+    return response
+
+def create_transcription(**kwargs):
+    """Rate-limited, retried audio.transcriptions.create."""
+    kwargs.setdefault("model", Config.WHISPER_MODEL)
+    audio_file = kwargs.get("file")
+
+    def create(**call_kwargs):
+        # Rewind so a retried upload sends the whole file again
+        if hasattr(audio_file, "seek"):
+            audio_file.seek(0)
+        return get_client().audio.transcriptions.create(**call_kwargs)
+
+    return call_with_retries(create, endpoint="transcription", **kwargs)
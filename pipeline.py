@@ -0,0 +1,159 @@
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from config import Config
+from transcription import process_video_transcription
+from summarization import summarize_transcript, extract_key_concepts
+from quiz_generator import generate_quiz
+from cache import hash_file
+from artifact_store import get_artifact_store
+import metrics
+
+STAGES = ["transcription", "summary", "key_concepts", "quiz"]
+
+class Stage:
+    """A named pipeline step. func receives the results of its dependencies as keyword arguments."""
+
+    def __init__(self, name, func, depends_on=(), timeout=None):
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+        self.timeout = timeout
+
+def run_stages(stages, max_workers=None, progress=None):
+    """Execute a DAG of stages, running every stage whose dependencies are met concurrently.
+
+    Each stage is isolated: an exception or timeout marks that stage failed and
+    skips only the stages that depend on it. Returns (results, errors), both
+    keyed by stage name. progress, if given, is called as
+    progress(stage, status, result), with the stage's result once completed.
+    """
+    def report(stage, status, result=None):
+        if progress:
+            progress(stage, status, result)
+
+    pending = {stage.name: stage for stage in stages}
+    results = {}
+    errors = {}
+    running = {}  # future -> (stage, deadline)
+    started = {}  # stage name -> monotonic start time
+    executor = ThreadPoolExecutor(max_workers=max_workers or len(pending), thread_name_prefix="stage")
+
+    try:
+        while pending or running:
+            # Skip stages whose dependencies failed, start those that are ready
+            for name, stage in list(pending.items()):
+                failed = [dep for dep in stage.depends_on if dep in errors]
+                if failed:
+                    del pending[name]
+                    errors[name] = f"Skipped: dependency '{failed[0]}' failed"
+                    report(name, "skipped")
+                elif all(dep in results for dep in stage.depends_on):
+                    del pending[name]
+                    kwargs = {dep: results[dep] for dep in stage.depends_on}
+                    started[name] = time.monotonic()
+                    deadline = started[name] + stage.timeout if stage.timeout else None
+                    # In a copy of the caller's context, so e.g. coalesced calls are reported to its request
+                    running[executor.submit(contextvars.copy_context().run, stage.func, **kwargs)] = (stage, deadline)
+                    report(name, "running")
+
+            if not running:
+                if pending:
+                    raise Exception(f"Unresolvable stage dependencies: {sorted(pending)}")
+                break
+
+            deadlines = [deadline for _, deadline in running.values() if deadline is not None]
+            wait_timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            done, _ = wait(list(running), timeout=wait_timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                stage, _ = running.pop(future)
+                elapsed = time.monotonic() - started[stage.name]
+                try:
+                    results[stage.name] = future.result()
+                    metrics.STAGE_SECONDS.observe(elapsed, stage=stage.name, status="completed")
+                    report(stage.name, "completed", results[stage.name])
+                except Exception as e:
+                    errors[stage.name] = str(e)
+                    metrics.STAGE_SECONDS.observe(elapsed, stage=stage.name, status="failed")
+                    report(stage.name, "failed")
+
+            # A timed-out stage keeps its thread until the call returns, but nothing waits on it
+            now = time.monotonic()
+            for future, (stage, deadline) in list(running.items()):
+                if deadline is not None and deadline <= now:
+                    del running[future]
+                    errors[stage.name] = f"Stage '{stage.name}' timed out after {stage.timeout}s"
+                    metrics.STAGE_SECONDS.observe(now - started[stage.name], stage=stage.name, status="timeout")
+                    report(stage.name, "failed")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return results, errors
+
+def build_stages(transcribe, num_questions=5, difficulty="medium", summary_length="medium",
+                 force_refresh=False):
+    """The standard stage DAG: transcription, then summary, key concepts and quiz in parallel.
+
+    transcribe is a zero-argument callable returning (transcript_text, segments).
+    """
+    timeouts = Config.STAGE_TIMEOUTS
+    return [
+        Stage("transcription", transcribe, timeout=timeouts["transcription"]),
+        Stage("summary",
+              lambda transcription: summarize_transcript(transcription[0], summary_length,
+                                                         segments=transcription[1],
+                                                         force_refresh=force_refresh),
+              depends_on=["transcription"], timeout=timeouts["summary"]),
+        Stage("key_concepts",
+              lambda transcription: extract_key_concepts(transcription[0], segments=transcription[1],
+                                                         force_refresh=force_refresh),
+              depends_on=["transcription"], timeout=timeouts["key_concepts"]),
+        Stage("quiz",
+              lambda transcription: generate_quiz(transcription[0], num_questions, difficulty,
+                                                  segments=transcription[1],
+                                                  force_refresh=force_refresh),
+              depends_on=["transcription"], timeout=timeouts["quiz"])
+    ]
+
+def collect_results(results, errors, video_hash=None):
+    """Shape stage results into the pipeline response body. Raises if transcription failed."""
+    if "transcription" in errors:
+        raise Exception(errors["transcription"])
+
+    transcript_text, segments = results["transcription"]
+    return {
+        "video_hash": video_hash,
+        "transcript": transcript_text,
+        "segments": segments,
+        "summary": results.get("summary"),
+        "key_concepts": results.get("key_concepts"),
+        "quiz": results.get("quiz"),
+        "errors": errors
+    }
+
+def run_pipeline(filepath, video_hash=None, num_questions=5, difficulty="medium",
+                 summary_length="medium", force_refresh=False, progress=None):
+    """Run transcription, then summary, key concepts and quiz concurrently, for one video.
+
+    progress, if given, is called as progress(stage, status, result) where status
+    is "running", "completed", "failed" or "skipped". A failed LLM stage does not
+    discard the others; its message is returned under "errors". A failed
+    transcription raises, since nothing else can run without it.
+    """
+    video_hash = video_hash or hash_file(filepath)
+    stages = build_stages(
+        lambda: process_video_transcription(filepath, video_hash=video_hash),
+        num_questions, difficulty, summary_length, force_refresh
+    )
+    results, errors = run_stages(stages, progress=progress)
+    output = collect_results(results, errors, video_hash)
+
+    # Save outputs
+    output["artifacts"] = get_artifact_store().save_results(video_hash, output, {
+        "num_questions": num_questions,
+        "difficulty": difficulty,
+        "summary_length": summary_length
+    })
+    output.pop("segments")  # stored, but not part of the pipeline response body
+    return output
@@ -0,0 +1,343 @@
+import json
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from chunking import chunk_transcript, chunk_label
+from quiz_generator import generate_quiz_batch, is_duplicate_question, QUIZ_CHUNK_MAX_TOKENS
+from artifact_store import ThreadConnections
+import metrics
+
+DIFFICULTIES = ("easy", "medium", "hard")
+QUESTION_TYPES = ("mcq", "true_false", "short_answer", "mixed")  # "mixed" samples every type in the bank
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS banks (
+    bank_key TEXT PRIMARY KEY,
+    transcript TEXT NOT NULL,
+    segments TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    bank_key TEXT NOT NULL,
+    difficulty TEXT NOT NULL,
+    question_type TEXT NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    segment_start REAL,
+    segment_end REAL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_questions_pool ON questions (bank_key, difficulty, question_type);
+CREATE TABLE IF NOT EXISTS served (
+    learner_id TEXT NOT NULL,
+    question_id INTEGER NOT NULL,
+    served_at REAL NOT NULL,
+    PRIMARY KEY (learner_id, question_id)
+) WITHOUT ROWID;
+"""
+
+class QuestionBank:
+    """Per-video pools of pre-generated quiz questions, sampled without an LLM call.
+
+    One generation pass asks for QUESTION_BANK_BATCH_SIZE questions per
+    transcript chunk, difficulty and question type. Each stored question is
+    tagged with its difficulty, type and source chunk (with start/end
+    seconds when segments are known). A quiz is then a stratified sample:
+    questions are drawn round-robin across chunks, so every part of the
+    video is covered, and questions already served to a learner are skipped.
+    When a learner's unseen pool for a difficulty/type runs low, another
+    batch is generated in the background; when it cannot fill a quiz (or the
+    type was not generated at build time), a batch is generated first.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or Config.QUESTION_BANK_DB
+        self._connections = ThreadConnections(self.path)
+        self._connect().executescript(SCHEMA)
+        self._build_locks = {}
+        self._topups = set()  # (bank_key, difficulty, question_type) queued or being topped up
+        self._filling = {}  # (bank_key, difficulty, question_type) -> done event of the running fill
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="question-bank")
+
+    def _connect(self):
+        return self._connections.get()
+
+    def _build_lock(self, bank_key):
+        with self._lock:
+            return self._build_locks.setdefault(bank_key, threading.Lock())
+
+    def has(self, bank_key):
+        row = self._connect().execute("SELECT 1 FROM banks WHERE bank_key = ?", (bank_key,)).fetchone()
+        return row is not None
+
+    def _generate(self, transcript, segments, difficulties, question_types):
+        """Ask for one batch per chunk, difficulty and type. Returns [((chunk, difficulty, type), questions)]."""
+        chunks = chunk_transcript(transcript, segments, QUIZ_CHUNK_MAX_TOKENS)
+        jobs = [(chunk, difficulty, question_type)
+                for chunk in chunks for difficulty in difficulties for question_type in question_types]
+
+        def generate(job):
+            chunk, difficulty, question_type = job
+            label = chunk_label(chunk, len(chunks)) if len(chunks) > 1 else None
+            return generate_quiz_batch(chunk["text"], Config.QUESTION_BANK_BATCH_SIZE, difficulty,
+                                       question_type, label).get("questions", [])
+
+        with ThreadPoolExecutor(max_workers=Config.LLM_MAX_WORKERS) as executor:
+            return list(zip(jobs, executor.map(generate, jobs)))
+
+    def _store(self, bank_key, batches, transcript=None, segments=None, create=False):
+        """Store the new questions of generated batches. Returns the count added.
+
+        Runs under the bank's build lock, so deduplication sees every stored
+        question. With create, the bank row is written in the same
+        transaction, so a failed build leaves no empty bank behind.
+        """
+        # Near-duplicates come from the same stretch of transcript, so only compare within a chunk
+        conn = self._connect()
+        existing = {}
+        for row in conn.execute("SELECT chunk_index, content FROM questions WHERE bank_key = ?", (bank_key,)):
+            existing.setdefault(row["chunk_index"], []).append(json.loads(row["content"]))
+        rows = []
+        now = time.time()
+        for (chunk, difficulty, question_type), questions in batches:
+            others = existing.setdefault(chunk["index"], [])
+            for question in questions:
+                if not question.get("question_text") or any(is_duplicate_question(question, other)
+                                                            for other in others):
+                    continue
+                others.append(question)
+                question.pop("question_number", None)
+                # The model's own label may not match the pool it was asked for ("short answer", "mcq", ...)
+                stored_type = question_type if question_type != "mixed" else question.get("question_type") or "mcq"
+                rows.append((bank_key, difficulty, stored_type,
+                             chunk["index"], chunk.get("start"), chunk.get("end"),
+                             json.dumps(question, ensure_ascii=False), now))
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if create:
+                conn.execute(
+                    """INSERT INTO banks (bank_key, transcript, segments, created_at, updated_at)
+                       VALUES (?, ?, ?, ?, ?)
+                       ON CONFLICT (bank_key) DO UPDATE SET
+                           transcript = excluded.transcript, segments = excluded.segments""",
+                    (bank_key, transcript, json.dumps(segments) if segments else None, now, now)
+                )
+            conn.executemany(
+                """INSERT INTO questions
+                       (bank_key, difficulty, question_type, chunk_index, segment_start, segment_end, content, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                rows
+            )
+            conn.execute("UPDATE banks SET updated_at = ? WHERE bank_key = ?", (now, bank_key))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(rows)
+
+    def build(self, bank_key, transcript, segments=None, force=False):
+        """Generate the question pool of a video, unless it already exists. Returns its stats."""
+        with self._build_lock(bank_key):
+            if self.has(bank_key) and not force:
+                return self.stats(bank_key)
+            try:
+                print(f"Building question bank for {bank_key[:12]}...")
+                batches = self._generate(transcript, segments, DIFFICULTIES, Config.QUESTION_BANK_TYPES)
+                added = self._store(bank_key, batches, transcript, segments, create=True)
+                metrics.QUESTION_BANK_GENERATED.inc(added, reason="build")
+            except Exception as e:
+                metrics.ERRORS.inc(component="question_bank")
+                raise Exception(f"Error building question bank: {str(e)}")
+        return self.stats(bank_key)
+
+    def sample(self, bank_key, num_questions=5, difficulty="medium", question_type="mcq", learner_id=None):
+        """A quiz drawn from the pool, or None if the video has no bank.
+
+        question_type "mixed" draws from every type. With a learner_id, the
+        questions served are recorded and never served to that learner again.
+        If the unseen pool is smaller than num_questions, one batch is generated
+        before sampling, unless a background top-up of that pool is already
+        running; should the quiz still fall short, "shortfall" says by how
+        many questions.
+        """
+        started = time.perf_counter()
+        if not self.has(bank_key):
+            return None
+
+        num_questions = int(num_questions)
+        rows = self._unseen(bank_key, difficulty, question_type, learner_id)
+        if len(rows) < num_questions:
+            enough = lambda: len(self._unseen(bank_key, difficulty, question_type, learner_id)) >= num_questions
+            if self._fill(bank_key, difficulty, question_type, "on_demand", enough) is not None:
+                rows = self._unseen(bank_key, difficulty, question_type, learner_id)
+
+        # Stratify by source chunk: shuffle within each chunk, then deal round-robin across chunks
+        strata = {}
+        for row in rows:
+            strata.setdefault(row["chunk_index"], []).append(row)
+        for stratum in strata.values():
+            random.shuffle(stratum)
+        order = sorted(strata)
+        if order:
+            shift = random.randrange(len(order))
+            order = order[shift:] + order[:shift]
+        picked = []
+        while len(picked) < num_questions and any(strata[chunk] for chunk in order):
+            for chunk in order:
+                if strata[chunk] and len(picked) < num_questions:
+                    picked.append(strata[chunk].pop())
+        picked.sort(key=lambda row: (row["chunk_index"], row["id"]))
+
+        questions = []
+        for idx, row in enumerate(picked):
+            question = json.loads(row["content"])
+            question["question_number"] = idx + 1
+            question["source"] = {"chunk": row["chunk_index"], "start": row["segment_start"],
+                                  "end": row["segment_end"]}
+            questions.append(question)
+
+        if learner_id and picked:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO served (learner_id, question_id, served_at) VALUES (?, ?, ?)",
+                    [(learner_id, row["id"], time.time()) for row in picked]
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        remaining = len(rows) - len(picked)
+        if remaining < max(Config.QUESTION_BANK_LOW_WATER, num_questions):
+            self.top_up(bank_key, difficulty, question_type)
+
+        metrics.QUESTION_BANK_SAMPLE_SECONDS.observe(time.perf_counter() - started)
+        return {
+            "quiz_title": "Quiz",
+            "questions": questions,
+            "bank_key": bank_key,
+            "remaining": remaining,
+            "shortfall": num_questions - len(questions)
+        }
+
+    def _unseen(self, bank_key, difficulty, question_type, learner_id=None):
+        query = """SELECT id, chunk_index, segment_start, segment_end, content FROM questions
+                   WHERE bank_key = ? AND difficulty = ?"""
+        args = [bank_key, difficulty]
+        if question_type != "mixed":
+            query += " AND question_type = ?"
+            args.append(question_type)
+        if learner_id:
+            query += " AND id NOT IN (SELECT question_id FROM served WHERE learner_id = ?)"
+            args.append(learner_id)
+        return self._connect().execute(query, args).fetchall()
+
+    def _fill(self, bank_key, difficulty, question_type, reason, enough=None):
+        """Generate one more batch per chunk for a difficulty/type (every bank type for "mixed").
+
+        Only one fill per pool runs at a time. An on-demand fill waits for
+        another on-demand fill of the same pool, then generates only if
+        enough() is still false; it never waits for a background top-up, and
+        a top-up is dropped while another fill runs. Returns the count added,
+        or None if another fill made this one unnecessary.
+        """
+        key = (bank_key, difficulty, question_type)
+        while True:
+            with self._lock:
+                if reason != "top_up" and key in self._topups:
+                    return None
+                running = self._filling.get(key)
+                if running is None:
+                    done = threading.Event()
+                    self._filling[key] = done
+                    break
+            if reason == "top_up":
+                return None
+            running.wait()
+            if enough is not None and enough():
+                return 0
+
+        try:
+            if enough is not None and enough():  # a fill may have finished since the caller counted
+                return 0
+            row = self._connect().execute(
+                "SELECT transcript, segments FROM banks WHERE bank_key = ?", (bank_key,)
+            ).fetchone()
+            segments = json.loads(row["segments"]) if row["segments"] else None
+            types = Config.QUESTION_BANK_TYPES if question_type == "mixed" else (question_type,)
+            try:
+                batches = self._generate(row["transcript"], segments, (difficulty,), types)
+                with self._build_lock(bank_key):
+                    added = self._store(bank_key, batches)
+            except Exception as e:
+                metrics.ERRORS.inc(component="question_bank")
+                raise Exception(f"Error generating questions: {str(e)}")
+        finally:
+            with self._lock:
+                del self._filling[key]
+            done.set()
+        metrics.QUESTION_BANK_GENERATED.inc(added, reason=reason)
+        return added
+
+    def top_up(self, bank_key, difficulty, question_type):
+        """Generate more questions for one difficulty/type in the background. Returns False if already running."""
+        key = (bank_key, difficulty, question_type)
+        with self._lock:
+            if key in self._topups:
+                return False
+            self._topups.add(key)
+
+        def run():
+            try:
+                added = self._fill(bank_key, difficulty, question_type, "top_up")
+                if added is None:
+                    return
+                print(f"Question bank {bank_key[:12]}: added {added} {difficulty} {question_type} questions")
+            except Exception as e:
+                print(f"Error topping up question bank {bank_key[:12]}: {str(e)}")
+            finally:
+                with self._lock:
+                    self._topups.discard(key)
+
+        self._executor.submit(run)
+        return True
+
+    def stats(self, bank_key):
+        """Question counts of a bank by difficulty and type, or None if it does not exist."""
+        if not self.has(bank_key):
+            return None
+        rows = self._connect().execute(
+            """SELECT difficulty, question_type, COUNT(*) AS n FROM questions
+               WHERE bank_key = ? GROUP BY difficulty, question_type""",
+            (bank_key,)
+        ).fetchall()
+        pool = {}
+        for row in rows:
+            pool.setdefault(row["difficulty"], {})[row["question_type"]] = row["n"]
+        with self._lock:
+            topping_up = sorted(f"{d}/{t}" for k, d, t in self._topups if k == bank_key)
+        return {
+            "bank_key": bank_key,
+            "total": sum(row["n"] for row in rows),
+            "pool": pool,
+            "topping_up": topping_up
+        }
+
+_bank = None
+_bank_lock = threading.Lock()
+
+def get_question_bank():
+    """Return the process-wide question bank, opened on first use."""
+    global _bank
+    with _bank_lock:
+        if _bank is None:
+            _bank = QuestionBank()
+        return _bank
@@ -1,12 +1,30 @@
-import os
+import re
 import json
-from openai import OpenAI
+import math
+import time
+import queue
+import threading
+from difflib import SequenceMatcher
+from concurrent.futures import ThreadPoolExecutor
+from cache import memoize_llm, get_llm_cache
+from chunking import chunk_transcript, chunk_label
+from config import Config
+from openai_client import chat_completion
+import metrics
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Bump when the quiz prompt template changes so cached quizzes are regenerated
+QUIZ_PROMPT_VERSION = 3
 
-def create_quiz_prompt(transcript, num_questions=5, difficulty="medium", question_type="mcq"):
-    """Create a prompt for quiz generation."""
+# Transcript tokens for one question batch (leaves room for the prompt and answer in 8k)
+QUIZ_CHUNK_MAX_TOKENS = 2000
+# Completion budget per question, plus fixed overhead for the JSON wrapper
+TOKENS_PER_QUESTION = 250
+MAX_COMPLETION_TOKENS = 2000
+# Questions at least this similar are treated as duplicates
+DUPLICATE_THRESHOLD = 0.8
 
+def create_quiz_prompt(transcript, num_questions=5, difficulty="medium", question_type="mcq", label=None):
+    """Create a prompt for quiz generation from a transcript chunk of at most QUIZ_CHUNK_MAX_TOKENS."""
     question_type_instructions = {
         "mcq": "multiple-choice questions with 4 options each (A, B, C, D). Mark the correct answer.",
         "true_false": "true/false questions with explanations.",
@@ -20,13 +38,15 @@ def create_quiz_prompt(transcript, num_questions=5, difficulty="medium", questio
         "hard": "synthesis and evaluation"
     }
 
+    source_description = f"part of a longer video transcript ({label})" if label else "transcript"
+
     prompt = f"""You are an expert teacher creating educational assessments.
 
-Based on the following transcript, create {num_questions} {question_type_instructions.get(question_type, question_type_instructions['mcq'])} 
+Based on the following {source_description}, create {num_questions} {question_type_instructions.get(question_type, question_type_instructions['mcq'])} 
 at a {difficulty} difficulty level focusing on {difficulty_instructions.get(difficulty, difficulty_instructions['medium'])}.
 
 Transcript:
-"""{transcript}"""
+\"\"\"{transcript}\"\"\"
 
 Format your response as valid JSON with the following structure:
 {{
@@ -58,55 +78,336 @@ Return ONLY the JSON object, no additional text."""
 
     return prompt
 
-def generate_quiz(transcript, num_questions=5, difficulty="medium", question_type="mcq"):
-    """Generate quiz questions from transcript using GPT-4."""
+def parse_quiz_json(quiz_json_str):
+    """Parse a quiz completion, tolerating markdown code fences."""
+    quiz_json_str = quiz_json_str.strip()
+
+    # Remove markdown code blocks if present
+    if quiz_json_str.startswith("```json"):
+        quiz_json_str = quiz_json_str[7:]
+    if quiz_json_str.startswith("```"):
+        quiz_json_str = quiz_json_str[3:]
+    if quiz_json_str.endswith("```"):
+        quiz_json_str = quiz_json_str[:-3]
+
+    started = time.perf_counter()
     try:
-        prompt = create_quiz_prompt(transcript, num_questions, difficulty, question_type)
-
-        # Truncate transcript if too long
-        max_chars = 10000
-        if len(prompt) > max_chars:
-            transcript_truncated = transcript[:max_chars-2000]
-            prompt = create_quiz_prompt(transcript_truncated, num_questions, difficulty, question_type)
-            print(f"Warning: Transcript truncated to fit context window")
-
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are an expert educator creating high-quality assessment questions. Always respond with valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=2000
-        )
+        quiz = json.loads(quiz_json_str.strip())
+    except json.JSONDecodeError as e:
+        metrics.JSON_PARSE_SECONDS.observe(time.perf_counter() - started, status="error")
+        metrics.ERRORS.inc(component="quiz_json")
+        raise Exception(f"Error parsing quiz JSON: {str(e)}. Response: {quiz_json_str}")
+    metrics.JSON_PARSE_SECONDS.observe(time.perf_counter() - started, status="ok")
+    return quiz
 
-        quiz_json_str = response.choices[0].message.content.strip()
+def generate_quiz_batch(transcript, num_questions, difficulty="medium", question_type="mcq", label=None):
+    """Generate one batch of questions from a transcript (or transcript chunk) in a single call."""
+    prompt = create_quiz_prompt(transcript, num_questions, difficulty, question_type, label)
 
-        # Remove markdown code blocks if present
-        if quiz_json_str.startswith("```json"):
-            quiz_json_str = quiz_json_str[7:]
-        if quiz_json_str.startswith("```"):
-            quiz_json_str = quiz_json_str[3:]
-        if quiz_json_str.endswith("```"):
-            quiz_json_str = quiz_json_str[:-3]
+    response = chat_completion(
+        messages=[
+            {"role": "system", "content": "You are an expert educator creating high-quality assessment questions. Always respond with valid JSON."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.7,
+        max_tokens=min(MAX_COMPLETION_TOKENS, 200 + TOKENS_PER_QUESTION * num_questions)
+    )
 
-        quiz_data = json.loads(quiz_json_str.strip())
-        return quiz_data
+    return parse_quiz_json(response.choices[0].message.content)
 
-    except json.JSONDecodeError as e:
-        raise Exception(f"Error parsing quiz JSON: {str(e)}. Response: {quiz_json_str}")
-    except Exception as e:
-        raise Exception(f"Error generating quiz: {str(e)}")
+def allocate_questions(chunks, num_questions):
+    """Spread num_questions over chunks in proportion to their token count.
+
+    Uses cumulative rounding, so allocations stay proportional and, when there
+    are more chunks than questions, the questions are spaced evenly along the
+    timeline instead of clustering.
+    """
+    sizes = [chunk.get("tokens") or len(chunk["text"]) for chunk in chunks]
+    total = sum(sizes) or 1
+
+    counts = []
+    cumulative = 0
+    for size in sizes:
+        start = math.floor(num_questions * cumulative / total + 0.5)
+        cumulative += size
+        end = math.floor(num_questions * cumulative / total + 0.5)
+        counts.append(end - start)
+    return counts
+
+def _question_tokens(question):
+    return set(re.findall(r"\w+", question.get("question_text", "").lower()))
 
-def save_quiz(quiz_data, filename="quiz_output.json"):
-    """Save quiz to JSON file."""
+def is_duplicate_question(question, other):
+    """Cheap local near-duplicate check on question text (token overlap, then edit similarity)."""
+    tokens, other_tokens = _question_tokens(question), _question_tokens(other)
+    if tokens and other_tokens:
+        overlap = len(tokens & other_tokens) / len(tokens | other_tokens)
+        if overlap >= DUPLICATE_THRESHOLD:
+            return True
+    ratio = SequenceMatcher(
+        None,
+        question.get("question_text", "").lower(),
+        other.get("question_text", "").lower()
+    ).ratio()
+    return ratio >= DUPLICATE_THRESHOLD
+
+def merge_question_batches(batches, counts, num_questions):
+    """Merge per-chunk batches in timeline order, dropping near-duplicates.
+
+    Each chunk contributes up to its allocated count; spare questions from
+    other chunks fill any gap left by removed duplicates.
+    """
+    kept = []
+    spares = []
+    for batch, count in zip(batches, counts):
+        taken = 0
+        for question in batch:
+            if any(is_duplicate_question(question, existing) for existing in kept):
+                continue
+            if taken < count:
+                kept.append(question)
+                taken += 1
+            else:
+                spares.append(question)
+
+    for question in spares:
+        if len(kept) >= num_questions:
+            break
+        if not any(is_duplicate_question(question, existing) for existing in kept):
+            kept.append(question)
+
+    kept = kept[:num_questions]
+    for idx, question in enumerate(kept):
+        question["question_number"] = idx + 1
+    return kept
+
+def generate_quiz(transcript, num_questions=5, difficulty="medium", question_type="mcq", segments=None,
+                  force_refresh=False):
+    """Generate quiz questions from transcript using GPT-4.
+
+    Questions are spread across segment-aligned transcript chunks in
+    proportion to their length and generated concurrently per chunk, so long
+    videos are covered end to end. Near-duplicates are removed locally.
+    """
+    # Normalized before the cache key is taken, so "5" and 5 share an entry
+    return _generate_quiz(transcript, int(num_questions), difficulty, question_type, segments,
+                          force_refresh=force_refresh)
+
+@memoize_llm("quiz", QUIZ_PROMPT_VERSION)
+def _generate_quiz(transcript, num_questions, difficulty, question_type, segments):
     try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(quiz_data, f, indent=2, ensure_ascii=False)
-        print(f"Quiz saved to {filename}")
-        return filename
+        chunks = chunk_transcript(transcript, segments, QUIZ_CHUNK_MAX_TOKENS)
+        if len(chunks) <= 1:
+            return generate_quiz_batch(transcript, num_questions, difficulty, question_type)
+
+        counts = allocate_questions(chunks, num_questions)
+        jobs = [(chunk, count) for chunk, count in zip(chunks, counts) if count > 0]
+        print(f"Generating {num_questions} questions across {len(jobs)} transcript chunks...")
+
+        def generate(job):
+            chunk, count = job
+            # Ask for one extra question per batch so deduplication does not leave gaps
+            return generate_quiz_batch(chunk["text"], count + 1, difficulty, question_type,
+                                       chunk_label(chunk, len(chunks)))
+
+        with ThreadPoolExecutor(max_workers=Config.LLM_MAX_WORKERS) as executor:
+            batches = list(executor.map(generate, jobs))
+
+        questions = merge_question_batches(
+            [batch.get("questions", []) for batch in batches],
+            [count for _, count in jobs],
+            num_questions
+        )
+        return {
+            "quiz_title": batches[0].get("quiz_title", "Quiz"),
+            "questions": questions
+        }
+
     except Exception as e:
-        raise Exception(f"Error saving quiz: {str(e)}")
+        metrics.ERRORS.inc(component="quiz")
+        raise Exception(f"Error generating quiz: {str(e)}")
+
+class QuizStreamParser:
+    """Incremental parser for a streamed quiz JSON document.
+
+    Tracks string/escape state and bracket depth over the text received so
+    far, and returns each object of the "questions" array as soon as its
+    closing brace arrives, without waiting for the rest of the document.
+    """
+
+    TITLE_PATTERN = re.compile(r'"quiz_title"\s*:\s*("(?:[^"\\]|\\.)*")')
+    QUESTIONS_KEY_PATTERN = re.compile(r'"questions"\s*:\s*$')
+
+    def __init__(self):
+        self.buffer = ""
+        self.title = None
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._questions_depth = None
+        self._object_start = None
+
+    def feed(self, text):
+        """Consume more text. Returns the list of question dicts completed by it."""
+        self.buffer += text
+        completed = []
+
+        if self.title is None:
+            match = self.TITLE_PATTERN.search(self.buffer)
+            if match:
+                self.title = json.loads(match.group(1))
+
+        for i in range(self._pos, len(self.buffer)):
+            char = self.buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char == "[":
+                self._depth += 1
+                if self._questions_depth is None and self.QUESTIONS_KEY_PATTERN.search(self.buffer[:i]):
+                    self._questions_depth = self._depth
+            elif char == "{":
+                if self._depth == self._questions_depth:
+                    self._object_start = i
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == self._questions_depth and self._object_start is not None:
+                    try:
+                        completed.append(json.loads(self.buffer[self._object_start:i + 1]))
+                    except json.JSONDecodeError:
+                        pass  # malformed question: skip it, the rest can still be used
+                    self._object_start = None
+            elif char == "]":
+                if self._depth == self._questions_depth:
+                    self._questions_depth = -1  # array closed; never match again
+                self._depth -= 1
+
+        self._pos = len(self.buffer)
+        return completed
+
+def stream_quiz_batch(transcript, num_questions, difficulty="medium", question_type="mcq", label=None):
+    """Stream one batch, yielding ("title", str) and ("question", dict) events as they complete."""
+    prompt = create_quiz_prompt(transcript, num_questions, difficulty, question_type, label)
+
+    stream = chat_completion(
+        messages=[
+            {"role": "system", "content": "You are an expert educator creating high-quality assessment questions. Always respond with valid JSON."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.7,
+        max_tokens=min(MAX_COMPLETION_TOKENS, 200 + TOKENS_PER_QUESTION * num_questions),
+        stream=True
+    )
+
+    parser = QuizStreamParser()
+    title_sent = False
+    for chunk in stream:
+        if not chunk.choices or not chunk.choices[0].delta.content:
+            continue
+        questions = parser.feed(chunk.choices[0].delta.content)
+        if parser.title is not None and not title_sent:
+            title_sent = True
+            yield "title", parser.title
+        for question in questions:
+            yield "question", question
+
+def stream_quiz(transcript, num_questions=5, difficulty="medium", question_type="mcq", segments=None,
+                force_refresh=False):
+    """Generate a quiz as a stream of events, emitting each question as soon as it is parsed.
+
+    Yields {"type": "title"}, {"type": "question"} and a final {"type": "done"}
+    event carrying the full quiz. Long transcripts stream their chunk batches
+    concurrently; questions are deduplicated and numbered as they are emitted.
+    Shares generate_quiz's cache.
+    """
+    cache = get_llm_cache()
+    num_questions = int(num_questions)
+    key = _generate_quiz.cache_key(transcript, num_questions, difficulty, question_type, segments)
+    if not force_refresh:
+        cached = cache.get(key)
+        if cached is not None:
+            yield {"type": "title", "quiz_title": cached.get("quiz_title", "Quiz")}
+            for question in cached.get("questions", []):
+                yield {"type": "question", "question": question}
+            yield {"type": "done", "quiz": cached}
+            return
+
+    chunks = chunk_transcript(transcript, segments, QUIZ_CHUNK_MAX_TOKENS)
+    if len(chunks) <= 1:
+        jobs = [(transcript, num_questions, None)]
+    else:
+        counts = allocate_questions(chunks, num_questions)
+        # One spare question per batch so deduplication does not leave gaps
+        jobs = [(chunk["text"], count + 1, chunk_label(chunk, len(chunks)))
+                for chunk, count in zip(chunks, counts) if count > 0]
+        quotas = [count for count in counts if count > 0]
+
+    events = queue.Queue()
+    semaphore = threading.BoundedSemaphore(Config.LLM_MAX_WORKERS)
+
+    def run(batch_idx, job):
+        with semaphore:
+            try:
+                for kind, payload in stream_quiz_batch(job[0], job[1], difficulty, question_type, job[2]):
+                    events.put((kind, batch_idx, payload))
+            except Exception as e:
+                events.put(("error", batch_idx, e))
+            finally:
+                events.put(("finished", batch_idx, None))
+
+    for batch_idx, job in enumerate(jobs):
+        threading.Thread(target=run, args=(batch_idx, job), daemon=True).start()
+
+    quiz = {"quiz_title": None, "questions": []}
+    taken = [0] * len(jobs)
+    spares = []
+    remaining = len(jobs)
+
+    def emit(question):
+        question["question_number"] = len(quiz["questions"]) + 1
+        quiz["questions"].append(question)
+        return {"type": "question", "question": question}
+
+    while remaining:
+        kind, batch_idx, payload = events.get()
+        if kind == "finished":
+            remaining -= 1
+        elif kind == "error":
+            raise Exception(f"Error generating quiz: {str(payload)}")
+        elif kind == "title" and quiz["quiz_title"] is None:
+            quiz["quiz_title"] = payload
+            yield {"type": "title", "quiz_title": payload}
+        elif kind == "question":
+            if len(quiz["questions"]) >= num_questions:
+                continue
+            if any(is_duplicate_question(payload, existing) for existing in quiz["questions"]):
+                continue
+            quota = num_questions if len(jobs) == 1 else quotas[batch_idx]
+            if taken[batch_idx] < quota:
+                taken[batch_idx] += 1
+                yield emit(payload)
+            else:
+                spares.append(payload)
+
+    for question in spares:
+        if len(quiz["questions"]) >= num_questions:
+            break
+        if not any(is_duplicate_question(question, existing) for existing in quiz["questions"]):
+            yield emit(question)
+
+    quiz["quiz_title"] = quiz["quiz_title"] or "Quiz"
+    cache.set(key, quiz)
+    yield {"type": "done", "quiz": quiz}
 
 if __name__ == "__main__":
     # Test quiz generation
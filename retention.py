@@ -0,0 +1,404 @@
+import os
+import json
+import time
+import fcntl
+import fnmatch
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from config import Config
+from uploads import expire_partial_uploads
+import metrics
+
+class RetentionPolicy:
+    """Limits for one directory: total bytes (0 = no quota) and maximum age in seconds (0 = keep forever).
+
+    Files matching a protect pattern (e.g. SQLite databases) are never evicted
+    and do not count towards the quota.
+    """
+
+    def __init__(self, directory, max_bytes=0, max_age=0, protect=()):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.protect = tuple(protect)
+
+    def manages(self, path):
+        name = os.path.basename(path)
+        return (os.path.dirname(path) == self.directory and not name.startswith(".")
+                and not any(fnmatch.fnmatch(name, pattern) for pattern in self.protect))
+
+class DirectoryIndex:
+    """Files of one directory in least-recently-used order, with their total size.
+
+    Built by one scan; after that, files are added and touched as the app
+    creates and uses them, so eviction pops from the LRU end and costs time
+    proportional to the files removed, not to the size of the directory.
+    """
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.files = OrderedDict()  # path -> (size, last used)
+        self.total = 0
+
+    def scan(self):
+        """Rebuild from disk, keeping the newer of each file's mtime and any in-memory use time."""
+        known = self.files
+        found = []
+        os.makedirs(self.policy.directory, exist_ok=True)
+        with os.scandir(self.policy.directory) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False) and self.policy.manages(entry.path):
+                    stat = entry.stat(follow_symlinks=False)
+                    used = max(stat.st_mtime, known.get(entry.path, (0, 0))[1])
+                    found.append((used, entry.path, stat.st_size))
+        found.sort()
+        self.files = OrderedDict((path, (size, used)) for used, path, size in found)
+        self.total = sum(size for _, _, size in found)
+
+    def add(self, path, used=None):
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        self.discard(path)
+        self.files[path] = (size, used or time.time())
+        self.total += size
+
+    def touch(self, path, used=None):
+        if path in self.files:
+            size, _ = self.files.pop(path)
+            self.files[path] = (size, used or time.time())
+
+    def discard(self, path):
+        entry = self.files.pop(path, None)
+        if entry:
+            self.total -= entry[0]
+
+    def evict(self, now, pinned, min_age):
+        """Remove files past max_age, then least recently used files until under max_bytes.
+
+        Pinned files are skipped where they stand. Every other candidate is
+        re-stat'ed before removal: a newer mtime means another worker process
+        has used it since this index last saw it, so its use time is refreshed
+        and it is kept unless it still qualifies. Files used within min_age
+        stop the run, since everything after them is newer still.
+        Returns [(path, size, reason)].
+        """
+        policy = self.policy
+        total = self.total
+        victims = []
+        refreshed = []
+        for path, (size, used) in self.files.items():
+            if now - used < min_age or not ((policy.max_age and now - used > policy.max_age)
+                                            or (policy.max_bytes and total > policy.max_bytes)):
+                break
+            if path in pinned:
+                continue
+            try:
+                mtime = os.stat(path).st_mtime
+            except FileNotFoundError:
+                victims.append((path, size, None))  # already removed by another worker
+                total -= size
+                continue
+            except OSError:
+                continue
+            used = max(used, mtime)
+            expired = policy.max_age and now - used > policy.max_age
+            over_quota = policy.max_bytes and total > policy.max_bytes
+            if now - used < min_age or not (expired or over_quota):
+                refreshed.append((path, used))
+                continue
+            victims.append((path, size, "age" if expired else "quota"))
+            total -= size
+
+        for path, used in refreshed:
+            self.touch(path, used)
+        removed = []
+        for path, size, reason in victims:
+            if reason is not None:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    reason = None
+                except OSError as e:
+                    print(f"Could not evict {path}: {str(e)}")
+                    continue
+            self.discard(path)
+            if reason is not None:
+                removed.append((path, size, reason))
+        return removed
+
+def active_job_files(jobs_folder=None):
+    """Video and job file paths of the queued or running jobs of every worker process.
+
+    Only those jobs have a lock file in jobs/active/ (see jobs.active_folder),
+    so this reads the active jobs, not every job ever run.
+    """
+    jobs_folder = os.path.abspath(jobs_folder or Config.JOBS_FOLDER)
+    paths = set()
+    try:
+        names = os.listdir(os.path.join(jobs_folder, "active"))
+    except OSError:
+        return paths
+    for name in names:
+        if not name.endswith(".lock"):
+            continue
+        job_path = os.path.join(jobs_folder, f"{name[:-5]}.json")
+        paths.add(job_path)
+        try:
+            with open(job_path, "r", encoding="utf-8") as f:
+                job = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if job.get("status") in ("queued", "running") and job.get("filepath"):
+            paths.add(os.path.abspath(job["filepath"]))
+    return paths
+
+def _pin_marker(path):
+    digest = hashlib.sha1(path.encode("utf-8")).hexdigest()
+    return os.path.join(Config.JOBS_FOLDER, "pins", f"{os.getpid()}-{digest}")
+
+def active_pin_files(jobs_folder=None):
+    """Paths pinned by every live server process, read from their pin markers.
+
+    A pinning process holds an flock on its marker until it unpins, and the
+    kernel drops it if the process dies; a marker whose lock can be taken is
+    left over from a dead process and is removed.
+    """
+    folder = os.path.join(jobs_folder or Config.JOBS_FOLDER, "pins")
+    paths = set()
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return paths
+    for name in names:
+        if name.startswith("."):
+            continue  # still being written
+        marker = os.path.join(folder, name)
+        try:
+            fd = os.open(marker, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            except BlockingIOError:
+                paths.add(os.read(fd, 65536).decode("utf-8"))
+                continue
+            if os.fstat(fd).st_ino == os.stat(marker).st_ino:
+                os.remove(marker)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+    return paths
+
+class RetentionManager:
+    """Keeps uploads/ and jobs/ within their quotas and age limits.
+
+    Files in use are pinned (reference counted) and never evicted. Pins are
+    also written as marker files, so that together with the queued and
+    running job files, each sweep sees what every server process is using.
+    Files used within RETENTION_MIN_AGE are left alone in case another
+    process has just started on them. A background sweeper evicts every
+    RETENTION_SWEEP_INTERVAL seconds, or immediately when a new file pushes a
+    directory over its quota; only one server process runs it. Each sweep
+    also removes resumable uploads idle for PARTIAL_UPLOAD_MAX_AGE.
+    """
+
+    def __init__(self, policies):
+        self.indexes = [DirectoryIndex(policy) for policy in policies]
+        self._pins = {}
+        self._markers = {}  # pinned path -> open, flocked marker file descriptor
+        self._external_pins = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._last_rescan = 0.0
+        self.rescan()
+
+    def _index_for(self, path):
+        for index in self.indexes:
+            if index.policy.manages(path):
+                return index
+        return None
+
+    def rescan(self):
+        """Full scan of every directory. Runs at startup and every RETENTION_RESCAN_INTERVAL.
+
+        Picks up files written by other server processes, which register only in their own index.
+        """
+        with self._lock:
+            for index in self.indexes:
+                index.scan()
+                metrics.RETENTION_BYTES.set(index.total, directory=index.policy.directory)
+            self._last_rescan = time.time()
+
+    def register(self, path):
+        """Record a newly written file. Wakes the sweeper if its directory is now over quota."""
+        path = os.path.abspath(path)
+        with self._lock:
+            index = self._index_for(path)
+            if index is None:
+                return
+            index.add(path)
+            metrics.RETENTION_BYTES.set(index.total, directory=index.policy.directory)
+            if index.policy.max_bytes and index.total > index.policy.max_bytes:
+                self._wake.set()
+
+    def touch(self, path):
+        """Mark a file as just used. Also updates its mtime so other workers see the use after a rescan."""
+        path = os.path.abspath(path)
+        now = time.time()
+        with self._lock:
+            index = self._index_for(path)
+            if index is None:
+                return
+            index.touch(path, now)
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+
+    def pin(self, path):
+        path = os.path.abspath(path)
+        self.touch(path)
+        with self._lock:
+            self._pins[path] = self._pins.get(path, 0) + 1
+            if self._pins[path] == 1:
+                self._write_marker(path)
+
+    def unpin(self, path):
+        path = os.path.abspath(path)
+        with self._lock:
+            count = self._pins.get(path, 0) - 1
+            if count > 0:
+                self._pins[path] = count
+            elif self._pins.pop(path, None) is not None:
+                fd = self._markers.pop(path, None)
+                try:
+                    os.remove(_pin_marker(path))
+                except OSError:
+                    pass
+                if fd is not None:
+                    os.close(fd)
+        self.touch(path)
+
+    def _write_marker(self, path):
+        """Write and lock the pin marker under a hidden name, then move it into place."""
+        marker = _pin_marker(path)
+        tmp_path = os.path.join(os.path.dirname(marker), f".{os.path.basename(marker)}")
+        try:
+            os.makedirs(os.path.dirname(marker), exist_ok=True)
+            fd = os.open(tmp_path, os.O_CREAT | os.O_TRUNC | os.O_WRONLY, 0o644)
+        except OSError as e:
+            print(f"Could not write pin marker for {path}: {str(e)}")
+            return
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            os.write(fd, path.encode("utf-8"))
+            os.replace(tmp_path, marker)
+        except OSError as e:
+            print(f"Could not write pin marker for {path}: {str(e)}")
+            os.close(fd)
+            return
+        self._markers[path] = fd
+
+    @contextmanager
+    def pinned(self, path):
+        """Protect a file from eviction for the duration of a with-block."""
+        self.pin(path)
+        try:
+            yield path
+        finally:
+            self.unpin(path)
+
+    def sweep(self):
+        """Evict expired and over-quota files now. Returns {directory: {"files", "bytes"}}."""
+        started = time.perf_counter()
+        external = active_job_files() | active_pin_files()
+        now = time.time()
+        report = {}
+        with self._lock:
+            self._external_pins = external
+            pinned = set(self._pins) | external
+            for index in self.indexes:
+                removed = index.evict(now, pinned, Config.RETENTION_MIN_AGE)
+                directory = index.policy.directory
+                for path, size, reason in removed:
+                    metrics.RETENTION_EVICTED_FILES.inc(directory=directory, reason=reason)
+                    metrics.RETENTION_RECLAIMED_BYTES.inc(size, directory=directory, reason=reason)
+                metrics.RETENTION_BYTES.set(index.total, directory=directory)
+                if removed:
+                    report[directory] = {"files": len(removed), "bytes": sum(size for _, size, _ in removed)}
+        if Config.PARTIAL_UPLOAD_MAX_AGE:
+            directory = os.path.abspath(os.path.join(Config.UPLOAD_FOLDER, ".partial"))
+            removed = expire_partial_uploads(Config.UPLOAD_FOLDER, Config.PARTIAL_UPLOAD_MAX_AGE, now)
+            for upload_id, size in removed:
+                metrics.RETENTION_EVICTED_FILES.inc(directory=directory, reason="age")
+                metrics.RETENTION_RECLAIMED_BYTES.inc(size, directory=directory, reason="age")
+            if removed:
+                report[directory] = {"files": len(removed), "bytes": sum(size for _, size in removed)}
+        metrics.RETENTION_SWEEP_SECONDS.observe(time.perf_counter() - started)
+        for directory, reclaimed in report.items():
+            print(f"Retention: evicted {reclaimed['files']} files ({reclaimed['bytes'] / 1024 ** 2:.1f} MB) "
+                  f"from {directory}")
+        return report
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(Config.RETENTION_SWEEP_INTERVAL)
+            self._wake.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                if time.time() - self._last_rescan > Config.RETENTION_RESCAN_INTERVAL:
+                    self.rescan()
+                self.sweep()
+            except Exception as e:
+                metrics.ERRORS.inc(component="retention")
+                print(f"Retention sweep failed: {str(e)}")
+
+    def start(self):
+        """Start the background sweeper (once per process)."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped.clear()
+                self._thread = threading.Thread(target=self._run, name="retention-sweeper", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "directories": [{
+                    "directory": index.policy.directory,
+                    "files": len(index.files),
+                    "bytes": index.total,
+                    "max_bytes": index.policy.max_bytes,
+                    "max_age": index.policy.max_age
+                } for index in self.indexes],
+                "pinned": len(self._pins),
+                "pinned_by_other_workers": len(self._external_pins - set(self._pins))
+            }
+
+_manager = None
+_manager_lock = threading.Lock()
+
+def get_retention_manager():
+    """Return the process-wide retention manager, scanning on first use. The sweeper is started separately."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = RetentionManager([
+                RetentionPolicy(Config.UPLOAD_FOLDER, Config.UPLOAD_QUOTA_BYTES, Config.UPLOAD_MAX_AGE),
+                # Finished jobs expire by age; active ones are pinned through their lock files
+                RetentionPolicy(Config.JOBS_FOLDER, 0, Config.JOB_MAX_AGE, protect=("leader.lock", "*.tmp"))
+            ])
+        return _manager
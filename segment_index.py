@@ -0,0 +1,335 @@
+import re
+import sys
+import time
+import bisect
+import threading
+from array import array
+from collections import OrderedDict
+from config import Config
+from context_packer import STOPWORDS
+from artifact_store import ThreadConnections, get_artifact_store
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    video_hash TEXT NOT NULL UNIQUE,
+    segment_count INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    starts BLOB NOT NULL,
+    ends BLOB NOT NULL,
+    offsets BLOB NOT NULL,
+    text TEXT NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    video_id INTEGER NOT NULL,
+    segments BLOB NOT NULL,
+    PRIMARY KEY (term, video_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_postings_video ON postings (video_id);
+"""
+
+def tokenize(text):
+    """Lowercased search terms of a text, without stopwords."""
+    return [w for w in re.findall(r"[a-z0-9]+", (text or "").lower()) if w not in STOPWORDS]
+
+class SegmentLayout:
+    """One transcript as parallel arrays: segment i spans starts[i]..ends[i] (seconds)
+    and text[offsets[i]:offsets[i + 1]]."""
+
+    def __init__(self, video_hash, starts, ends, offsets, text):
+        self.video_hash = video_hash
+        self.starts = starts
+        self.ends = ends
+        self.offsets = offsets
+        self.text = text
+
+    @classmethod
+    def from_segments(cls, video_hash, segments):
+        starts, ends, offsets = array("d"), array("d"), array("I", [0])
+        parts = []
+        length = 0
+        for segment in sorted(segments, key=lambda s: s.get("start") or 0.0):
+            text = (segment.get("text") or "").strip()
+            starts.append(float(segment.get("start") or 0.0))
+            ends.append(float(segment.get("end") or segment.get("start") or 0.0))
+            parts.append(text + " ")
+            length += len(text) + 1
+            offsets.append(length)
+        return cls(video_hash, starts, ends, offsets, "".join(parts))
+
+    @classmethod
+    def from_row(cls, row):
+        starts, ends, offsets = array("d"), array("d"), array("I")
+        starts.frombytes(row["starts"])
+        ends.frombytes(row["ends"])
+        offsets.frombytes(row["offsets"])
+        return cls(row["video_hash"], starts, ends, offsets, row["text"])
+
+    def __len__(self):
+        return len(self.starts)
+
+    def segment(self, i):
+        return {
+            "index": i,
+            "start": self.starts[i],
+            "end": self.ends[i],
+            "text": self.text[self.offsets[i]:self.offsets[i + 1]].strip()
+        }
+
+    def columns(self, first=0, last=None):
+        """Segments first..last as parallel arrays: start/end seconds (ms precision) and
+        offsets into text, where text[offsets[i]:offsets[i + 1]] is segment first + i."""
+        last = len(self) if last is None else last
+        base = self.offsets[first]
+        return {
+            "start": [round(t, 3) for t in self.starts[first:last]],
+            "end": [round(t, 3) for t in self.ends[first:last]],
+            "offsets": [offset - base for offset in self.offsets[first:last + 1]],
+            "text": self.text[base:self.offsets[last]]
+        }
+
+    def between(self, start, end):
+        """Index range [first, last) of segments overlapping start..end seconds.
+
+        Segments are sorted by start and do not overlap, so ends are sorted too
+        and both bounds are binary searches.
+        """
+        first = bisect.bisect_right(self.ends, start)
+        last = bisect.bisect_left(self.starts, end)
+        return first, max(first, last)
+
+class SegmentIndex:
+    """Persistent search and timestamp index over every processed transcript.
+
+    Each video's segments are stored as packed start/end/offset arrays next
+    to the concatenated text, so a time-range query is two binary searches
+    and one slice. An inverted index maps each term to, per video, the packed
+    list of segment numbers containing it; keyword search reads only the
+    postings of the query terms. Decoded layouts are kept in a small LRU so
+    repeated queries against the same lectures never touch SQLite.
+    """
+
+    def __init__(self, path=None, cache_size=256):
+        self.path = path or Config.SEGMENT_INDEX_DB
+        self._connections = ThreadConnections(self.path)
+        self._connect().executescript(SCHEMA)
+        self._layouts = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        return self._connections.get()
+
+    def has(self, video_hash):
+        row = self._connect().execute("SELECT 1 FROM videos WHERE video_hash = ?", (video_hash,)).fetchone()
+        return row is not None
+
+    def ensure(self, video_hash):
+        """Index a video from its stored segments if it is not indexed yet. Returns whether it is indexed."""
+        if self.has(video_hash):
+            return True
+        segments = get_artifact_store().find_results(video_hash, {}).get("segments")
+        if segments is None:
+            return False
+        self.add(video_hash, segments)
+        return True
+
+    def add(self, video_hash, segments):
+        """Index (or re-index) one video's segments."""
+        layout = SegmentLayout.from_segments(video_hash, segments)
+        postings = {}
+        for i in range(len(layout)):
+            for term in set(tokenize(layout.text[layout.offsets[i]:layout.offsets[i + 1]])):
+                postings.setdefault(term, array("I")).append(i)
+
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT id FROM videos WHERE video_hash = ?", (video_hash,)).fetchone()
+            if row:
+                conn.execute("DELETE FROM postings WHERE video_id = ?", (row["id"],))
+                conn.execute("DELETE FROM videos WHERE id = ?", (row["id"],))
+            video_id = conn.execute(
+                """INSERT INTO videos (video_hash, segment_count, duration, starts, ends, offsets, text, indexed_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (video_hash, len(layout), max(layout.ends, default=0.0), layout.starts.tobytes(),
+                 layout.ends.tobytes(), layout.offsets.tobytes(), layout.text, time.time())
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO postings (term, video_id, segments) VALUES (?, ?, ?)",
+                [(term, video_id, segment_ids.tobytes()) for term, segment_ids in postings.items()]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        with self._lock:
+            self._layouts.pop(video_hash, None)
+        return len(layout)
+
+    def _layout(self, video_hash=None, video_id=None):
+        """Decoded layout of a video by hash or row id, or None."""
+        with self._lock:
+            if video_hash in self._layouts:
+                self._layouts.move_to_end(video_hash)
+                return self._layouts[video_hash]
+
+        if video_hash is not None:
+            row = self._connect().execute("SELECT * FROM videos WHERE video_hash = ?", (video_hash,)).fetchone()
+        else:
+            row = self._connect().execute("SELECT * FROM videos WHERE id = ?", (video_id,)).fetchone()
+        if row is None:
+            return None
+
+        layout = SegmentLayout.from_row(row)
+        with self._lock:
+            self._layouts[layout.video_hash] = layout
+            while len(self._layouts) > self._cache_size:
+                self._layouts.popitem(last=False)
+        return layout
+
+    def text_range(self, video_hash, start, end):
+        """Transcript segments and text between start and end seconds, or None for an unknown video."""
+        layout = self._layout(video_hash)
+        if layout is None:
+            return None
+        first, last = layout.between(start, end)
+        segments = [layout.segment(i) for i in range(first, last)]
+        return {
+            "video_hash": video_hash,
+            "start": start,
+            "end": end,
+            "segments": segments,
+            "text": " ".join(segment["text"] for segment in segments)
+        }
+
+    def _page(self, video_hash, cursor, limit, start, end):
+        """Layout of a video plus (window_first, window_last, page_first, page_last), or None."""
+        layout = self._layout(video_hash)
+        if layout is None:
+            return None
+        first, last = layout.between(start if start is not None else float("-inf"),
+                                     end if end is not None else float("inf"))
+        page_first = min(max(first, cursor), last)
+        page_last = last if limit is None else min(last, page_first + limit)
+        return layout, first, last, page_first, page_last
+
+    def segments_page(self, video_hash, cursor=0, limit=200, start=None, end=None):
+        """One page of a video's segments in columnar form, or None for an unknown video.
+
+        start/end (seconds) restrict the window to the segments overlapping it;
+        cursor is the index of the first segment to return and next_cursor the
+        one to pass for the following page (None on the last page).
+        """
+        page = self._page(video_hash, cursor, limit, start, end)
+        if page is None:
+            return None
+        layout, first, last, page_first, page_last = page
+        return {
+            "video_hash": video_hash,
+            "total": len(layout),
+            "window": [first, last],
+            "cursor": page_first,
+            "next_cursor": page_last if page_last < last else None,
+            "count": page_last - page_first,
+            "segments": layout.columns(page_first, page_last)
+        }
+
+    def iter_segments(self, video_hash, cursor=0, limit=None, start=None, end=None):
+        """Segment dicts of a window one by one, for streaming; None for an unknown video."""
+        page = self._page(video_hash, cursor, limit, start, end)
+        if page is None:
+            return None
+        layout, _, _, page_first, page_last = page
+        return (layout.segment(i) for i in range(page_first, page_last))
+
+    def search(self, query, limit=20, hits_per_video=5):
+        """Videos whose segments contain every query term, with the matching timestamps.
+
+        Returns a list of {"video_hash", "matches", "hits"} ordered by number
+        of matching segments; hits carry start/end seconds and segment text.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        conn = self._connect()
+        postings = []
+        for term in terms:
+            rows = conn.execute("SELECT video_id, segments FROM postings WHERE term = ?", (term,)).fetchall()
+            if not rows:
+                return []
+            postings.append({row["video_id"]: row["segments"] for row in rows})
+        # Rarest term first so intersections shrink as fast as possible
+        postings.sort(key=len)
+
+        candidates = set(postings[0])
+        for term_postings in postings[1:]:
+            candidates &= set(term_postings)
+
+        results = []
+        for video_id in candidates:
+            matched = None
+            for term_postings in postings:
+                segment_ids = array("I")
+                segment_ids.frombytes(term_postings[video_id])
+                matched = set(segment_ids) if matched is None else matched & set(segment_ids)
+                if not matched:
+                    break
+            if matched:
+                results.append((len(matched), video_id, sorted(matched)))
+
+        results.sort(key=lambda result: (-result[0], result[1]))
+        response = []
+        for count, video_id, segment_ids in results[:limit]:
+            layout = self._layout(video_id=video_id)
+            response.append({
+                "video_hash": layout.video_hash,
+                "matches": count,
+                "hits": [layout.segment(i) for i in segment_ids[:hits_per_video]]
+            })
+        return response
+
+    def stats(self):
+        conn = self._connect()
+        return {
+            "videos": conn.execute("SELECT COUNT(*) FROM videos").fetchone()[0],
+            "segments": conn.execute("SELECT COALESCE(SUM(segment_count), 0) FROM videos").fetchone()[0],
+            "terms": conn.execute("SELECT COUNT(DISTINCT term) FROM postings").fetchone()[0]
+        }
+
+    def rebuild_from_artifacts(self):
+        """Index every video whose segments are in the artifact store. Returns the number indexed."""
+        store = get_artifact_store()
+        indexed = 0
+        before = None
+        while True:
+            page = store.list(kind="segments", limit=200, before_id=before)
+            if not page:
+                return indexed
+            for meta in page:
+                artifact = store.get(meta["id"])
+                if artifact and artifact["content"]:
+                    self.add(artifact["video_hash"], artifact["content"])
+                    indexed += 1
+            before = page[-1]["id"]
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_segment_index():
+    """Return the process-wide segment index, opened on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SegmentIndex()
+        return _index
+
+if __name__ == "__main__":
+    index = get_segment_index()
+    if "--rebuild" in sys.argv:
+        print(f"Indexed {index.rebuild_from_artifacts()} videos from the artifact store")
+    print(index.stats())
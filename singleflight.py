@@ -0,0 +1,100 @@
+import copy
+import threading
+import contextvars
+import metrics
+
+class _Call:
+    """One in-flight computation and the callers waiting on it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+# Names of the flights joined by the current request; see track()
+_joined = contextvars.ContextVar("singleflight_joined", default=None)
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one execution.
+
+    The first caller for a key runs the function; callers arriving with the
+    same key while it runs block until it finishes and receive a copy of its
+    result, or the same exception. Nothing is remembered afterwards: caching
+    finished results is left to the caches around it.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.executions = 0
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry[name] = self
+
+    def do(self, key, func):
+        """Return func(), sharing one execution among concurrent callers with this key."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+
+        if not leader:
+            metrics.COALESCED_CALLS.inc(name=self.name)
+            joined = _joined.get()
+            if joined is not None:
+                joined.add(self.name)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            result = func()
+        except Exception as e:
+            call.error = e
+            raise
+        else:
+            # The leader's caller may mutate its result, so waiters copy from a private snapshot
+            call.result = result
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]  # no more waiters can join after this
+            if call.waiters and call.error is None:
+                call.result = copy.deepcopy(call.result)
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls),
+                "waiting": sum(call.waiters for call in self._calls.values())
+            }
+
+def track():
+    """Start recording which flights the current context joins as a waiter. Returns the set of their names.
+
+    Threads started on its behalf report into the same set when they run in a
+    copy of the context (contextvars.copy_context().run).
+    """
+    joined = set()
+    _joined.set(joined)
+    return joined
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+def stats():
+    """Execution and coalesced-caller counts of every single-flight group in this process."""
+    with _registry_lock:
+        flights = list(_registry.values())
+    return {flight.name: flight.stats() for flight in flights}
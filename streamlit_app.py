@@ -2,11 +2,15 @@ import streamlit as st
 import requests
 import json
 import os
+import time
+import hashlib
 from pathlib import Path
 
 # Configuration
 API_URL = "http://localhost:5000"
 TEMP_VIDEO_PATH = "temp_video.mp4"
+POLL_INTERVAL = 2  # seconds between job status checks
+STAGE_ICONS = {"pending": "⏳", "running": "🔄", "completed": "✅", "failed": "❌", "skipped": "⏭️"}
 
 # Page configuration
 st.set_page_config(
@@ -62,35 +66,199 @@ def init_session_state():
     if 'quiz_submitted' not in st.session_state:
         st.session_state.quiz_submitted = False
 
+class ResultsNotReady(Exception):
+    """Raised by fetch_results so that missing or partial results are never cached."""
+
+def hash_upload(data):
+    """SHA-256 of the uploaded bytes, the same content hash the server keys results by."""
+    return hashlib.sha256(data).hexdigest()
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def fetch_results(video_hash, num_questions, difficulty, summary_length):
+    """Complete stored results for a video and settings. Cached per (video hash, settings)."""
+    response = requests.get(
+        f"{API_URL}/results/{video_hash}",
+        params={
+            'num_questions': num_questions,
+            'difficulty': difficulty,
+            'summary_length': summary_length
+        },
+        timeout=30
+    )
+    if response.status_code != 200 or not response.json().get('complete'):
+        raise ResultsNotReady(video_hash)
+    return response.json()
+
+def upload_video_chunks(uploaded_file, data, params):
+    """Send the video through the resumable upload API and queue it as an async job. Returns the job."""
+    response = requests.post(
+        f"{API_URL}/uploads",
+        json={'filename': uploaded_file.name, 'size': len(data)},
+        timeout=30
+    )
+    if response.status_code != 201:
+        raise Exception(response.json().get('error', 'Could not start upload'))
+    session = response.json()
+    upload_id, chunk_size, offset = session['upload_id'], session['chunk_size'], session['offset']
+
+    progress = st.progress(0.0, text="Uploading video...")
+    while offset < len(data):
+        response = requests.patch(
+            f"{API_URL}/uploads/{upload_id}",
+            data=data[offset:offset + chunk_size],
+            headers={'Upload-Offset': str(offset), 'Content-Type': 'application/offset+octet-stream'},
+            timeout=120
+        )
+        body = response.json()
+        if response.status_code == 409 and body.get('offset') is not None:
+            offset = body['offset']  # Server has a different offset; resume from there
+            continue
+        if response.status_code != 200:
+            raise Exception(body.get('error', 'Upload failed'))
+        offset = body['offset']
+        progress.progress(offset / len(data), text="Uploading video...")
+    progress.empty()
+
+    response = requests.post(
+        f"{API_URL}/uploads/{upload_id}/finalize",
+        json={'async': True, **params},
+        timeout=60
+    )
+    if response.status_code != 202:
+        raise Exception(response.json().get('error', 'Could not queue processing'))
+    return response.json()['job']
+
+def poll_job(job_id):
+    """Poll a job until it finishes, rendering each stage's output as soon as it completes."""
+    stage_placeholder = st.empty()
+    progress = st.progress(0.0, text="Processing video...")
+    transcript_placeholder = st.empty()
+    summary_placeholder = st.empty()
+    quiz_placeholder = st.empty()
+    shown = set()
+
+    while True:
+        response = requests.get(f"{API_URL}/jobs/{job_id}/result", timeout=30)
+        body = response.json()
+        if response.status_code == 200:
+            progress.empty()
+            stage_placeholder.empty()
+            return body
+        if response.status_code != 202:
+            raise Exception(body.get('error', 'Job failed'))
+
+        stages = body.get('stages', {})
+        stage_placeholder.markdown(" | ".join(
+            f"{STAGE_ICONS.get(status, '⏳')} {stage.replace('_', ' ')}" for stage, status in stages.items()
+        ))
+        progress.progress(body.get('progress', 0.0), text="Processing video...")
+
+        partial = body.get('partial', {})
+        if 'transcript' in partial and 'transcript' not in shown:
+            shown.add('transcript')
+            with transcript_placeholder.expander("📄 Transcript ready", expanded=False):
+                st.write(partial['transcript'])
+        if 'summary' in partial and 'summary' not in shown:
+            shown.add('summary')
+            with summary_placeholder.container():
+                st.markdown("**📝 Summary**")
+                st.write(partial['summary'])
+        if 'quiz' in partial and 'quiz' not in shown:
+            shown.add('quiz')
+            quiz_placeholder.success(f"🎯 Quiz ready: {len(partial['quiz'].get('questions', []))} questions")
+
+        time.sleep(POLL_INTERVAL)
+
 def process_video_complete(video_file, num_questions, difficulty, summary_length):
-    """Send video to API for complete processing."""
+    """Get results for a video: from the cache or server store if they exist, else by processing it."""
     try:
-        files = {'video': video_file}
-        data = {
+        data = video_file.getvalue()
+        video_hash = hash_upload(data)
+
+        try:
+            with st.spinner('Checking for existing results...'):
+                return fetch_results(video_hash, num_questions, difficulty, summary_length)
+        except ResultsNotReady:
+            pass
+
+        params = {
             'num_questions': num_questions,
             'difficulty': difficulty,
             'summary_length': summary_length
         }
+        job = upload_video_chunks(video_file, data, params)
+        result = poll_job(job['job_id'])
 
-        with st.spinner('Processing video... This may take a few minutes.'):
-            response = requests.post(
-                f"{API_URL}/process-all",
-                files=files,
-                data=data,
-                timeout=300
-            )
+        # Populate the client cache now that the server has stored everything
+        try:
+            return fetch_results(video_hash, num_questions, difficulty, summary_length)
+        except ResultsNotReady:
+            return result
 
-        if response.status_code == 200:
-            return response.json()
-        else:
+    except requests.exceptions.ConnectionError:
+        st.error("Could not connect to API. Make sure Flask server is running on port 5000.")
+        return None
+    except Exception as e:
+        st.error(f"Error processing video: {str(e)}")
+        return None
+
+def iter_sse(response):
+    """Yield (event, data) pairs from a server-sent event stream."""
+    event = "message"
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            continue
+        if line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            yield event, json.loads(line[5:].strip())
+            event = "message"
+
+def stream_quiz_generation(transcript, num_questions, difficulty):
+    """Generate a quiz via the streaming endpoint, rendering questions as they arrive."""
+    try:
+        response = requests.post(
+            f"{API_URL}/generate-quiz/stream",
+            json={
+                'transcript': transcript,
+                'num_questions': num_questions,
+                'difficulty': difficulty,
+                'force_refresh': True
+            },
+            stream=True,
+            timeout=300
+        )
+        if response.status_code != 200:
             st.error(f"Error: {response.json().get('error', 'Unknown error')}")
             return None
 
+        title_placeholder = st.empty()
+        progress = st.progress(0.0)
+        questions_container = st.container()
+        received = 0
+
+        for event, data in iter_sse(response):
+            if event == "title":
+                title_placeholder.write(f"**{data['quiz_title']}**")
+            elif event == "question":
+                received += 1
+                progress.progress(min(received / num_questions, 1.0))
+                with questions_container:
+                    st.markdown(f"**Question {data.get('question_number', received)}.** {data.get('question_text', '')}")
+            elif event == "done":
+                progress.empty()
+                return data['quiz']
+            elif event == "error":
+                st.error(f"Error generating quiz: {data['error']}")
+                return None
+
+        return None
+
     except requests.exceptions.ConnectionError:
         st.error("Could not connect to API. Make sure Flask server is running on port 5000.")
         return None
     except Exception as e:
-        st.error(f"Error processing video: {str(e)}")
+        st.error(f"Error generating quiz: {str(e)}")
         return None
 
 def display_quiz(quiz_data):
@@ -231,6 +399,7 @@ def main():
                 st.session_state.transcript = result.get('transcript')
                 st.session_state.summary = result.get('summary')
                 st.session_state.quiz = result.get('quiz')
+                st.session_state.key_concepts = result.get('key_concepts')
                 st.success("✅ Video processed successfully!")
                 st.balloons()
 
@@ -299,6 +468,17 @@ def main():
                             st.session_state.quiz_submitted = False
                             st.rerun()
 
+                with col3:
+                    regenerate = st.button("✨ New Questions")
+
+                if regenerate:
+                    quiz = stream_quiz_generation(st.session_state.transcript, num_questions, difficulty)
+                    if quiz:
+                        st.session_state.quiz = quiz
+                        st.session_state.user_answers = {}
+                        st.session_state.quiz_submitted = False
+                        st.rerun()
+
                 # Display score
                 if st.session_state.quiz_submitted:
                     correct, total = calculate_score(st.session_state.quiz)
@@ -1,20 +1,38 @@
-import os
-from openai import OpenAI
-from langchain.prompts import PromptTemplate
-
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from concurrent.futures import ThreadPoolExecutor
+from cache import memoize_llm, get_llm_cache
+from chunking import chunk_transcript, chunk_label
+from context_packer import count_tokens, pack_context
+from config import Config
+from openai_client import chat_completion
+import metrics
+
+# Bump when a prompt template changes so cached responses are regenerated
+SUMMARY_PROMPT_VERSION = 3
+CHUNK_SUMMARY_PROMPT_VERSION = 2
+KEY_CONCEPTS_PROMPT_VERSION = 4
+
+# Token budgets for transcript text inside a single prompt (GPT-4 8k context)
+# Transcripts longer than this are summarized map-reduce style instead of in one call
+SINGLE_PASS_MAX_TOKENS = 2750
+CHUNK_MAX_TOKENS = 2000
+# Partial summaries longer than this are reduced in groups before the final pass
+REDUCE_MAX_TOKENS = 2500
+KEY_CONCEPTS_MAX_TOKENS = 2000
+
+LENGTH_INSTRUCTIONS = {
+    "short": "3-5 concise bullet points",
+    "medium": "a comprehensive paragraph of 150-200 words",
+    "long": "a detailed summary with multiple paragraphs (300-400 words)"
+}
 
 def create_summary_prompt(transcript, length="medium"):
-    """Create a prompt for summarization based on desired length."""
-    length_instructions = {
-        "short": "3-5 concise bullet points",
-        "medium": "a comprehensive paragraph of 150-200 words",
-        "long": "a detailed summary with multiple paragraphs (300-400 words)"
-    }
+    """Create a prompt for summarization based on desired length.
 
-    prompt = f"""You are an expert at summarizing educational video content. 
+    Only used for transcripts within SINGLE_PASS_MAX_TOKENS; longer ones go through map-reduce.
+    """
+    prompt = f"""You are an expert at summarizing educational video content.
 
-Your task is to analyze the following video transcript and create {length_instructions.get(length, length_instructions['medium'])}.
+Your task is to analyze the following video transcript and create {LENGTH_INSTRUCTIONS.get(length, LENGTH_INSTRUCTIONS['medium'])}.
 
 Focus on:
 - Main topics and key concepts
@@ -23,60 +41,204 @@ Focus on:
 - Any actionable information
 
 Transcript:
-"""{transcript}"""
+\"\"\"{transcript}\"\"\"
 
 Provide a clear, well-structured summary that captures the essence of the video content."""
 
     return prompt
 
-def summarize_transcript(transcript, length="medium"):
-    """Summarize transcript using GPT-4."""
+def create_chunk_summary_prompt(chunk_text, label):
+    """Create a prompt that condenses one part of a long transcript."""
+    return f"""You are summarizing one part of a longer educational video transcript ({label}).
+
+Write a dense summary of this part in 100-150 words. Keep every key concept, definition,
+example and conclusion, in the order they appear. Do not add an introduction or closing remarks.
+
+Transcript part:
+\"\"\"{chunk_text}\"\"\""""
+
+def create_reduce_prompt(partial_summaries, length="medium"):
+    """Create a prompt that merges ordered partial summaries into the final summary."""
+    sections = "\n\n".join(partial_summaries)
+    return f"""You are an expert at summarizing educational video content.
+
+Below are summaries of consecutive parts of one video, in order. Combine them into
+{LENGTH_INSTRUCTIONS.get(length, LENGTH_INSTRUCTIONS['medium'])} covering the whole video.
+
+Focus on:
+- Main topics and key concepts
+- Important explanations or definitions
+- Critical insights or conclusions
+- Any actionable information
+
+Part summaries:
+\"\"\"{sections}\"\"\"
+
+Provide a clear, well-structured summary that captures the essence of the entire video, not just its beginning."""
+
+def _complete(prompt, system=None, temperature=0.3, max_tokens=800):
+    """Run a single GPT-4 chat completion and return the message text."""
+    messages = [{"role": "system", "content": system}] if system else []
+    messages.append({"role": "user", "content": prompt})
+    response = chat_completion(
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens
+    )
+    return response.choices[0].message.content
+
+def _complete_stream(prompt, system=None, temperature=0.3, max_tokens=800):
+    """Run a streaming GPT-4 chat completion, yielding text deltas as they arrive."""
+    messages = [{"role": "system", "content": system}] if system else []
+    messages.append({"role": "user", "content": prompt})
+    stream = chat_completion(
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        stream=True
+    )
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+@memoize_llm("summary_chunk", CHUNK_SUMMARY_PROMPT_VERSION)
+def summarize_chunk(chunk_text, label=""):
+    """Summarize one transcript chunk. Cached independently of the final summary length."""
+    return _complete(
+        create_chunk_summary_prompt(chunk_text, label),
+        system="You are an expert educational content summarizer.",
+        temperature=0.2,
+        max_tokens=300
+    )
+
+def summarize_chunks(transcript, segments=None, force_refresh=False):
+    """Map step: summarize segment-aligned chunks of a long transcript in parallel."""
+    chunks = chunk_transcript(transcript, segments, CHUNK_MAX_TOKENS)
+    print(f"Summarizing {len(chunks)} transcript chunks...")
+
+    def summarize(chunk):
+        label = chunk_label(chunk, len(chunks))
+        return f"{label}:\n{summarize_chunk(chunk['text'], label, force_refresh=force_refresh)}"
+
+    with ThreadPoolExecutor(max_workers=Config.LLM_MAX_WORKERS) as executor:
+        return list(executor.map(summarize, chunks))
+
+def _collapse_summaries(partial_summaries, force_refresh=False):
+    """Merge partial summaries in groups until they fit a single reduce prompt."""
+    while count_tokens("\n\n".join(partial_summaries)) > REDUCE_MAX_TOKENS and len(partial_summaries) > 1:
+        groups = []
+        current = []
+        current_tokens = 0
+        for partial in partial_summaries:
+            partial_tokens = count_tokens(partial)
+            if current and current_tokens + partial_tokens > REDUCE_MAX_TOKENS:
+                groups.append(current)
+                current = []
+                current_tokens = 0
+            current.append(partial)
+            current_tokens += partial_tokens
+        groups.append(current)
+
+        partial_summaries = [
+            summarize_chunk("\n\n".join(group), "combined part summaries", force_refresh=force_refresh)
+            for group in groups
+        ]
+
+    return partial_summaries
+
+def reduce_summaries(partial_summaries, length="medium", force_refresh=False):
+    """Reduce step: merge partial summaries, collapsing them in groups first if they are too long."""
+    return _complete(
+        create_reduce_prompt(_collapse_summaries(partial_summaries, force_refresh), length),
+        system="You are an expert educational content summarizer.",
+        temperature=0.3,
+        max_tokens=800
+    )
+
+@memoize_llm("summary", SUMMARY_PROMPT_VERSION)
+def summarize_transcript(transcript, length="medium", segments=None, force_refresh=False):
+    """Summarize transcript using GPT-4.
+
+    Long transcripts are summarized hierarchically: segment-aligned chunks are
+    summarized in parallel (and cached), then reduced into the final summary.
+    """
     try:
-        prompt = create_summary_prompt(transcript, length)
-
-        # Truncate if transcript is too long (GPT-4 context limit)
-        max_chars = 12000
-        if len(prompt) > max_chars:
-            transcript_truncated = transcript[:max_chars-1000]
-            prompt = create_summary_prompt(transcript_truncated, length)
-            print(f"Warning: Transcript truncated to {max_chars} characters")
-
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are an expert educational content summarizer."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=800
-        )
-
-        summary = response.choices[0].message.content
-        return summary
+        if count_tokens(transcript) <= SINGLE_PASS_MAX_TOKENS:
+            return _complete(
+                create_summary_prompt(transcript, length),
+                system="You are an expert educational content summarizer.",
+                temperature=0.3,
+                max_tokens=800
+            )
+
+        partial_summaries = summarize_chunks(transcript, segments, force_refresh)
+        return reduce_summaries(partial_summaries, length, force_refresh)
 
     except Exception as e:
+        metrics.ERRORS.inc(component="summary")
         raise Exception(f"Error generating summary: {str(e)}")
 
-def extract_key_concepts(transcript, num_concepts=5):
-    """Extract key concepts from the transcript."""
+def stream_summary(transcript, length="medium", segments=None, force_refresh=False):
+    """Stream a summary as text deltas.
+
+    Shares summarize_transcript's cache: a cached summary is yielded in one
+    piece, and a freshly streamed one is stored when it completes. For long
+    transcripts the (cached, parallel) map step runs first and only the
+    reduce call is streamed.
+    """
+    cache = get_llm_cache()
+    key = summarize_transcript.cache_key(transcript, length, segments)
+    if not force_refresh:
+        cached = cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
     try:
-        prompt = f"""Extract the {num_concepts} most important concepts or topics from this transcript. 
+        if count_tokens(transcript) <= SINGLE_PASS_MAX_TOKENS:
+            prompt = create_summary_prompt(transcript, length)
+        else:
+            partial_summaries = summarize_chunks(transcript, segments, force_refresh)
+            prompt = create_reduce_prompt(_collapse_summaries(partial_summaries, force_refresh), length)
+
+        parts = []
+        for delta in _complete_stream(prompt, system="You are an expert educational content summarizer."):
+            parts.append(delta)
+            yield delta
+    except Exception as e:
+        raise Exception(f"Error generating summary: {str(e)}")
+
+    cache.set(key, "".join(parts))
+
+@memoize_llm("key_concepts", KEY_CONCEPTS_PROMPT_VERSION)
+def extract_key_concepts(transcript, num_concepts=5, segments=None, force_refresh=False):
+    """Extract key concepts from the transcript.
+
+    Long transcripts are condensed via the (cached) chunk summaries so concepts
+    from the whole video are considered, not just its opening. For very long
+    videos, whose chunk summaries alone exceed KEY_CONCEPTS_MAX_TOKENS, the
+    summaries are packed down to their most salient sentences.
+    """
+    try:
+        if count_tokens(transcript) > SINGLE_PASS_MAX_TOKENS:
+            source = "\n\n".join(summarize_chunks(transcript, segments, force_refresh))
+            source = pack_context(source, token_budget=KEY_CONCEPTS_MAX_TOKENS)
+            source_name = "Summaries of consecutive parts of the video"
+        else:
+            source = transcript
+            source_name = "Transcript"
+
+        prompt = f"""Extract the {num_concepts} most important concepts or topics from this transcript.
         List them as a numbered list.
 
-        Transcript: {transcript[:8000]}
+        {source_name}: {source}
 
         Key Concepts:"""
 
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.2,
-            max_tokens=300
-        )
-
-        return response.choices[0].message.content
+        return _complete(prompt, temperature=0.2, max_tokens=300)
 
     except Exception as e:
+        metrics.ERRORS.inc(component="key_concepts")
         raise Exception(f"Error extracting key concepts: {str(e)}")
 
 if __name__ == "__main__":
@@ -1,57 +1,385 @@
 import os
-from openai import OpenAI
-from moviepy.editor import VideoFileClip
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import time
+from config import Config
+from cache import DiskCache, hash_key
+from singleflight import SingleFlight
+import metrics
+from openai_client import create_transcription
+from segment_index import get_segment_index
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+_transcript_cache = None
+_transcript_cache_lock = threading.Lock()
 
-def extract_audio(video_path, audio_path="temp_audio.mp3"):
-    """Extract audio from video file."""
+def get_transcript_cache():
+    """Return the persistent transcript cache (keyed by video content hash), indexing it on first use."""
+    global _transcript_cache
+    with _transcript_cache_lock:
+        if _transcript_cache is None:
+            _transcript_cache = DiskCache(
+                os.path.join(Config.CACHE_FOLDER, "transcripts"),
+                Config.TRANSCRIPT_CACHE_MAX_BYTES
+            )
+        return _transcript_cache
+
+# Identical videos transcribing at the same time share one extraction and Whisper upload
+_transcription_flight = SingleFlight("transcription")
+
+def get_ffmpeg_binary():
+    """Locate an ffmpeg executable (env override, system install or moviepy's bundled copy)."""
+    binary = os.getenv("FFMPEG_BINARY") or shutil.which("ffmpeg")
+    if binary:
+        return binary
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        raise Exception("FFmpeg not found. Install FFmpeg or set FFMPEG_BINARY.")
+
+# Bounds concurrent local ffmpeg work across all requests, jobs and batches
+_extraction_slots = threading.BoundedSemaphore(Config.EXTRACTION_CONCURRENCY)
+
+def new_audio_path(suffix=".mp3"):
+    """Reserve a unique temporary audio file so concurrent jobs never share a path."""
+    os.makedirs(Config.TEMP_FOLDER, exist_ok=True)
+    fd, audio_path = tempfile.mkstemp(prefix="audio_", suffix=suffix, dir=Config.TEMP_FOLDER)
+    os.close(fd)
+    return audio_path
+
+def _parse_media_duration(ffmpeg_output):
+    """Read the input duration (seconds) from ffmpeg's stderr banner."""
+    match = re.search(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)", ffmpeg_output)
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+def _ffmpeg_audio_args():
+    """Encoder settings for compact speech audio: mono, 16kHz, low-bitrate MP3."""
+    return ["-vn", "-ac", "1", "-ar", str(Config.AUDIO_SAMPLE_RATE),
+            "-c:a", "libmp3lame", "-b:a", Config.AUDIO_BITRATE]
+
+def _extract_audio_ffmpeg(video_path, audio_path):
+    """Demux and re-encode the audio stream with ffmpeg, skipping video decode entirely."""
+    result = subprocess.run(
+        [get_ffmpeg_binary(), "-hide_banner", "-nostats", "-y", "-i", video_path]
+        + _ffmpeg_audio_args() + [audio_path],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise Exception(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "ffmpeg failed")
+    return _parse_media_duration(result.stderr)
+
+def _extract_audio_moviepy(video_path, audio_path):
+    """Legacy extraction path through moviepy's VideoFileClip."""
+    from moviepy.editor import VideoFileClip  # slow to import (numpy, imageio, ffmpeg probe)
+
+    video = VideoFileClip(video_path)
     try:
-        video = VideoFileClip(video_path)
-        audio = video.audio
-        audio.write_audiofile(audio_path, verbose=False, logger=None)
+        video.audio.write_audiofile(
+            audio_path,
+            fps=Config.AUDIO_SAMPLE_RATE,
+            bitrate=Config.AUDIO_BITRATE,
+            ffmpeg_params=["-ac", "1"],
+            verbose=False,
+            logger=None
+        )
+        return video.duration
+    finally:
         video.close()
-        return audio_path
+
+def extract_audio_with_stats(video_path, audio_path=None, engine=None):
+    """Extract speech audio from a video and report extraction throughput.
+
+    Returns a dict with the audio path, engine, media duration, wall time,
+    realtime factor and output size.
+    """
+    engine = engine or Config.AUDIO_EXTRACTION_ENGINE
+    audio_path = audio_path or new_audio_path()
+
+    start_time = None
+    try:
+        with _extraction_slots:
+            start_time = time.time()
+            if engine == "moviepy":
+                media_seconds = _extract_audio_moviepy(video_path, audio_path)
+            else:
+                media_seconds = _extract_audio_ffmpeg(video_path, audio_path)
+            elapsed = time.time() - start_time
     except Exception as e:
+        if start_time is not None:
+            metrics.EXTRACTION_SECONDS.observe(time.time() - start_time, engine=engine, status="error")
+        metrics.ERRORS.inc(component="extraction")
+        if os.path.exists(audio_path):
+            os.remove(audio_path)
         raise Exception(f"Error extracting audio: {str(e)}")
 
+    audio_bytes = os.path.getsize(audio_path)
+    metrics.EXTRACTION_SECONDS.observe(elapsed, engine=engine, status="ok")
+    metrics.AUDIO_BYTES.observe(audio_bytes)
+    if media_seconds:
+        metrics.AUDIO_DURATION_SECONDS.observe(media_seconds)
+    stats = {
+        "engine": engine,
+        "audio_path": audio_path,
+        "media_seconds": media_seconds,
+        "elapsed_seconds": elapsed,
+        "realtime_factor": (media_seconds / elapsed) if media_seconds and elapsed else None,
+        "audio_bytes": audio_bytes,
+        "video_bytes": os.path.getsize(video_path)
+    }
+    if stats["realtime_factor"]:
+        print(f"Extracted {media_seconds:.0f}s of audio with {engine} in {elapsed:.2f}s "
+              f"({stats['realtime_factor']:.0f}x realtime, {audio_bytes / 1024:.0f} KB)")
+    return stats
+
+def extract_audio(video_path, audio_path=None, engine=None):
+    """Extract audio from video file."""
+    return extract_audio_with_stats(video_path, audio_path, engine)["audio_path"]
+
+def get_audio_duration(audio_path):
+    """Return the duration of an audio file in seconds."""
+    result = subprocess.run(
+        [get_ffmpeg_binary(), "-hide_banner", "-i", audio_path],
+        capture_output=True, text=True
+    )
+    duration = _parse_media_duration(result.stderr)
+    if duration is None:
+        raise Exception(f"Could not read duration of {audio_path}")
+    return duration
+
+def detect_silences(audio_path, noise_db=None, min_duration=None):
+    """Find silent regions with ffmpeg's silencedetect filter. Returns [(start, end), ...]."""
+    noise_db = Config.SILENCE_THRESHOLD_DB if noise_db is None else noise_db
+    min_duration = Config.SILENCE_MIN_DURATION if min_duration is None else min_duration
+
+    result = subprocess.run(
+        [get_ffmpeg_binary(), "-hide_banner", "-nostats", "-i", audio_path,
+         "-af", f"silencedetect=noise={noise_db}dB:d={min_duration}",
+         "-f", "null", "-"],
+        capture_output=True, text=True
+    )
+
+    silences = []
+    start = None
+    for line in result.stderr.splitlines():
+        start_match = re.search(r"silence_start:\s*(-?\d+(?:\.\d+)?)", line)
+        if start_match:
+            start = max(0.0, float(start_match.group(1)))
+            continue
+        end_match = re.search(r"silence_end:\s*(\d+(?:\.\d+)?)", line)
+        if end_match and start is not None:
+            silences.append((start, float(end_match.group(1))))
+            start = None
+    return silences
+
+def plan_chunks(duration, silences, max_seconds):
+    """Split [0, duration] into chunks of at most max_seconds, cutting inside silences when possible."""
+    cut_points = sorted((start + end) / 2 for start, end in silences)
+    chunks = []
+    cursor = 0.0
+
+    while duration - cursor > max_seconds:
+        limit = cursor + max_seconds
+        # Prefer the last silence in the back half of the window so chunks stay large
+        candidates = [p for p in cut_points if cursor + max_seconds / 2 <= p <= limit]
+        cut = candidates[-1] if candidates else limit
+        chunks.append((cursor, cut))
+        cursor = cut
+
+    chunks.append((cursor, duration))
+    return chunks
+
+def split_audio(audio_path, chunks, output_dir):
+    """Cut audio into chunk files without re-encoding. Returns a list of chunk paths."""
+    extension = os.path.splitext(audio_path)[1] or ".mp3"
+    chunk_paths = []
+    for idx, (start, end) in enumerate(chunks):
+        chunk_path = os.path.join(output_dir, f"chunk_{idx:04d}{extension}")
+        subprocess.run(
+            [get_ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-y",
+             "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}",
+             "-i", audio_path, "-c", "copy", chunk_path],
+            check=True, capture_output=True
+        )
+        chunk_paths.append(chunk_path)
+    return chunk_paths
+
 def transcribe_audio(audio_path, language=None):
     """Transcribe audio using OpenAI Whisper API."""
     try:
+        # Check file size (Whisper has 25MB limit)
+        file_size = os.path.getsize(audio_path)
+        if file_size > Config.WHISPER_MAX_FILE_SIZE:
+            raise Exception("Audio file too large. Use transcribe_audio_chunked for files over 25MB.")
+
+        params = {
+            "response_format": "verbose_json",
+            "timestamp_granularities": ["segment"]
+        }
+        if language:
+            params["language"] = language
+
+        metrics.WHISPER_UPLOAD_BYTES.inc(file_size)
         with open(audio_path, "rb") as audio_file:
-            # Check file size (Whisper has 25MB limit)
-            file_size = os.path.getsize(audio_path)
-            if file_size > 25 * 1024 * 1024:  # 25MB
-                raise Exception("Audio file too large. Please use video < 25MB or implement chunking.")
-
-            transcript = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                response_format="verbose_json",
-                timestamp_granularities=["segment"]
-            )
+            transcript = create_transcription(file=audio_file, **params)
         return transcript
     except Exception as e:
+        metrics.ERRORS.inc(component="transcription")
         raise Exception(f"Error transcribing audio: {str(e)}")
 
-def process_video_transcription(video_path):
-    """Complete pipeline: video -> audio -> transcript."""
-    print(f"Processing video: {video_path}")
+def segment_to_dict(segment):
+    """Convert a Whisper segment (dict or response object) into a plain dict."""
+    if isinstance(segment, dict):
+        return dict(segment)
+    if hasattr(segment, "model_dump"):
+        return segment.model_dump()
+    return dict(vars(segment))
 
+def get_transcript_segments(transcript):
+    """Return the segments of a Whisper response as plain dicts."""
+    segments = getattr(transcript, "segments", None) or []
+    return [segment_to_dict(segment) for segment in segments]
+
+def transcribe_audio_chunked(audio_path, language=None, max_workers=None):
+    """Transcribe audio of any length by splitting at silences and transcribing chunks concurrently.
+
+    Returns (text, segments) with segment timestamps relative to the start of the full audio.
+    """
+    max_workers = max_workers or Config.TRANSCRIPTION_MAX_WORKERS
+    work_dir = tempfile.mkdtemp(prefix="transcribe_")
+
+    try:
+        duration = get_audio_duration(audio_path)
+        file_size = os.path.getsize(audio_path)
+
+        # Size chunks so each stays comfortably under the Whisper upload limit
+        bytes_per_second = file_size / duration if duration else file_size
+        max_seconds = min(
+            Config.TRANSCRIPTION_CHUNK_SECONDS,
+            0.9 * Config.WHISPER_MAX_FILE_SIZE / max(bytes_per_second, 1)
+        )
+
+        chunks = plan_chunks(duration, detect_silences(audio_path), max_seconds)
+        chunk_paths = split_audio(audio_path, chunks, work_dir)
+        print(f"Transcribing {len(chunk_paths)} chunks with {max_workers} workers...")
+
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(lambda path: transcribe_audio(path, language), chunk_paths))
+        print(f"Chunked transcription finished in {time.time() - start_time:.1f}s")
+
+        texts = []
+        segments = []
+        for (chunk_start, _), result in zip(chunks, results):
+            texts.append(result.text.strip())
+            for segment in get_transcript_segments(result):
+                segment["start"] = segment.get("start", 0.0) + chunk_start
+                segment["end"] = segment.get("end", 0.0) + chunk_start
+                segment["id"] = len(segments)
+                segments.append(segment)
+
+        return " ".join(text for text in texts if text), segments
+    except Exception as e:
+        raise Exception(f"Error in chunked transcription: {str(e)}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def trim_audio_silence(audio_path):
+    """Compress long silences in extracted audio before upload.
+
+    Returns (audio_path_to_transcribe, offset_map); the offset map is None
+    when nothing was trimmed. Trimming problems fall back to the full audio.
+    """
+    if not Config.VAD_ENABLED:
+        return audio_path, None
+
+    from vad import trim_silence  # pulls in numpy, so loaded on first use
+
+    trimmed_path = new_audio_path()
+    try:
+        report = trim_silence(audio_path, trimmed_path)
+    except Exception as e:
+        print(f"Silence trimming failed, using full audio: {str(e)}")
+        report = None
+    if report is None:
+        os.remove(trimmed_path)
+        return audio_path, None
+
+    print(f"Trimmed {report['saved_seconds']:.0f}s of silence in {report['removed_regions']} regions "
+          f"({report['original_seconds']:.0f}s -> {report['trimmed_seconds']:.0f}s, "
+          f"{report['saved_bytes'] / 1024:.0f} KB saved)")
+    os.remove(audio_path)
+    return trimmed_path, report["offset_map"]
+
+def index_segments(video_hash, segments):
+    """Add a transcript to the search index if it is not there yet. Never fails the caller."""
+    try:
+        index = get_segment_index()
+        if segments and not index.has(video_hash):
+            index.add(video_hash, segments)
+    except Exception as e:
+        print(f"Could not index segments for {video_hash[:12]}: {str(e)}")
+
+def _transcribe_video(video_path, language=None, video_hash=None, cache_key=None):
+    """Extract, trim and transcribe a video, storing the result under cache_key if given."""
     # Extract audio
     audio_path = extract_audio(video_path)
     print(f"Audio extracted to: {audio_path}")
 
-    # Transcribe
-    transcript = transcribe_audio(audio_path)
-    print("Transcription completed!")
+    try:
+        audio_path, offset_map = trim_audio_silence(audio_path)
+
+        # Transcribe, chunking audio that exceeds the Whisper upload limit
+        if os.path.getsize(audio_path) > Config.WHISPER_MAX_FILE_SIZE:
+            text, segments = transcribe_audio_chunked(audio_path, language)
+        else:
+            transcript = transcribe_audio(audio_path, language)
+            text, segments = transcript.text, get_transcript_segments(transcript)
+
+        # Timestamps back on the original video timeline
+        if offset_map:
+            offset_map.remap_segments(segments)
+        print("Transcription completed!")
+    finally:
+        # Clean up temporary audio file
+        if os.path.exists(audio_path):
+            os.remove(audio_path)
+
+    if cache_key:
+        get_transcript_cache().set(cache_key, {"text": text, "segments": segments})
+        index_segments(video_hash, segments)
+
+    return text, segments
+
+def process_video_transcription(video_path, language=None, video_hash=None):
+    """Complete pipeline: video -> audio -> transcript.
+
+    When video_hash (the SHA-256 of the video file) is given, the transcript
+    cache is consulted first and a hit skips extraction and Whisper entirely.
+    Concurrent misses for the same video share one transcription.
+    """
+    print(f"Processing video: {video_path}")
+
+    if not video_hash:
+        return _transcribe_video(video_path, language)
 
-    # Clean up temporary audio file
-    if os.path.exists(audio_path):
-        os.remove(audio_path)
+    cache_key = hash_key(video_hash, language or "auto", Config.WHISPER_MODEL)
+    cached = get_transcript_cache().get(cache_key)
+    metrics.CACHE_REQUESTS.inc(cache="transcripts", result="miss" if cached is None else "hit")
+    if cached is not None:
+        print(f"Transcript cache hit for {video_hash[:12]}")
+        index_segments(video_hash, cached["segments"])
+        return cached["text"], cached["segments"]
 
-    return transcript.text, transcript.segments if hasattr(transcript, 'segments') else []
+    return _transcription_flight.do(
+        cache_key, lambda: _transcribe_video(video_path, language, video_hash, cache_key)
+    )
 
 if __name__ == "__main__":
     # Test the transcription module
@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import uuid
+import fcntl
+import hashlib
+import threading
+from werkzeug.utils import secure_filename
+from config import Config
+
+WRITE_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+class UploadError(Exception):
+    """Upload protocol violation; status is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+def parse_byte_count(value, name):
+    """A non-negative integer from a JSON number or header string; anything else is a 400."""
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    if isinstance(value, int) and not isinstance(value, bool) and value >= 0:
+        return value
+    raise UploadError(f"{name} must be a non-negative integer")
+
+class UploadManager:
+    """Resumable chunked uploads: init -> append chunks by offset -> finalize.
+
+    Partial data lives next to the final upload folder so finalize is a rename,
+    not a copy. The on-disk size of the partial file is the source of truth
+    for the offset, so clients can resume against any worker after a dropped
+    connection. The SHA-256 is updated as chunks are written; a worker that
+    did not see earlier chunks catches up by hashing only the bytes it missed.
+    """
+
+    def __init__(self, upload_folder=None):
+        self.upload_folder = upload_folder or Config.UPLOAD_FOLDER
+        self.partial_folder = os.path.join(self.upload_folder, ".partial")
+        self._hashers = {}  # upload_id -> (sha256 object, bytes hashed)
+        self._lock = threading.Lock()
+        os.makedirs(self.partial_folder, exist_ok=True)
+
+    def _meta_path(self, upload_id):
+        return os.path.join(self.partial_folder, f"{upload_id}.json")
+
+    def _data_path(self, upload_id):
+        return os.path.join(self.partial_folder, f"{upload_id}.part")
+
+    def _load(self, upload_id):
+        if not upload_id or not all(c.isalnum() for c in upload_id):
+            raise UploadError("Upload not found", 404)
+        try:
+            with open(self._meta_path(upload_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            raise UploadError("Upload not found", 404)
+
+    def init(self, filename, total_size):
+        """Start an upload session. Returns its state."""
+        total_size = parse_byte_count(total_size, "size")
+        filename = secure_filename(filename or "")
+        if not filename:
+            raise UploadError("No file name provided")
+        if total_size <= 0 or total_size > Config.MAX_UPLOAD_SIZE:
+            raise UploadError(f"Upload size must be between 1 and {Config.MAX_UPLOAD_SIZE} bytes", 413)
+
+        session = {
+            "upload_id": uuid.uuid4().hex,
+            "filename": filename,
+            "size": total_size,
+            "created_at": time.time()
+        }
+        open(self._data_path(session["upload_id"]), "wb").close()
+        with open(self._meta_path(session["upload_id"]), "w", encoding="utf-8") as f:
+            json.dump(session, f)
+        return self.status(session["upload_id"])
+
+    def status(self, upload_id):
+        """Current state of an upload, including the offset to resume from."""
+        session = self._load(upload_id)
+        session["offset"] = os.path.getsize(self._data_path(upload_id))
+        return session
+
+    def _catch_up_hash(self, upload_id, f, offset):
+        """Bring the running hash up to offset, reading only bytes not hashed yet."""
+        with self._lock:
+            hasher, hashed = self._hashers.get(upload_id, (None, 0))
+        if hasher is None or hashed > offset:
+            hasher, hashed = hashlib.sha256(), 0
+        else:
+            # Work on a copy so a failed append cannot leave the stored state ahead of the file
+            hasher = hasher.copy()
+
+        f.seek(hashed)
+        while hashed < offset:
+            chunk = f.read(min(WRITE_CHUNK_SIZE, offset - hashed))
+            if not chunk:
+                break
+            hasher.update(chunk)
+            hashed += len(chunk)
+        return hasher, hashed
+
+    def append(self, upload_id, offset, stream):
+        """Write a chunk at offset, streaming it straight to disk. Returns the new offset."""
+        offset = parse_byte_count(offset, "Upload-Offset")
+        session = self._load(upload_id)
+        data_path = self._data_path(upload_id)
+
+        with open(data_path, "r+b") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)  # one writer per upload across workers
+            try:
+                current = os.fstat(f.fileno()).st_size
+                if offset != current:
+                    raise UploadError("Offset mismatch", 409, offset=current)
+
+                hasher, hashed = self._catch_up_hash(upload_id, f, current)
+                f.seek(current)
+                written = current
+                for chunk in iter(lambda: stream.read(WRITE_CHUNK_SIZE), b""):
+                    if written + len(chunk) > session["size"]:
+                        f.truncate(current)
+                        raise UploadError("Chunk exceeds declared upload size", 413, offset=current)
+                    f.write(chunk)
+                    hasher.update(chunk)
+                    written += len(chunk)
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+        with self._lock:
+            self._hashers[upload_id] = (hasher, written)
+        return written
+
+    def finalize(self, upload_id):
+        """Move a complete upload into the upload folder. Returns (filepath, video_hash)."""
+        session = self._load(upload_id)
+        data_path = self._data_path(upload_id)
+
+        with open(data_path, "rb") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                size = os.fstat(f.fileno()).st_size
+                if size != session["size"]:
+                    raise UploadError("Upload incomplete", 409, offset=size)
+                hasher, _ = self._catch_up_hash(upload_id, f, size)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+        filename = f"{int(time.time())}_{uuid.uuid4().hex[:8]}_{session['filename']}"
+        filepath = os.path.join(self.upload_folder, filename)
+        os.replace(data_path, filepath)  # same filesystem: a rename, no copy
+        _remove(self._meta_path(upload_id))
+        with self._lock:
+            self._hashers.pop(upload_id, None)
+        return filepath, hasher.hexdigest()
+
+    def abort(self, upload_id):
+        """Discard an upload session and its partial data."""
+        self._load(upload_id)
+        for path in (self._data_path(upload_id), self._meta_path(upload_id)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with self._lock:
+            self._hashers.pop(upload_id, None)
+
+def expire_partial_uploads(upload_folder, max_age, now=None):
+    """Remove resumable uploads that no chunk has been written to for max_age seconds.
+
+    Run by the retention sweeper. An upload with an append or finalize in
+    progress holds the lock on its data file and is skipped.
+    Returns [(upload_id, bytes)].
+    """
+    partial_folder = os.path.join(upload_folder, ".partial")
+    now = now or time.time()
+    try:
+        names = os.listdir(partial_folder)
+    except OSError:
+        return []
+    removed = []
+    for upload_id in {name.rsplit(".", 1)[0] for name in names if name.endswith((".json", ".part"))}:
+        meta_path = os.path.join(partial_folder, f"{upload_id}.json")
+        data_path = os.path.join(partial_folder, f"{upload_id}.part")
+        used = 0
+        for path in (meta_path, data_path):
+            try:
+                used = max(used, os.stat(path).st_mtime)
+            except OSError:
+                pass
+        if not used or now - used <= max_age:
+            continue
+        size = 0
+        try:
+            with open(data_path, "rb") as f:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                size = os.fstat(f.fileno()).st_size
+                _remove(meta_path)  # first, so the upload is gone for clients before its data is
+                _remove(data_path)
+        except BlockingIOError:
+            continue
+        except FileNotFoundError:
+            _remove(meta_path)  # left by a finalize that did not get to remove it
+        removed.append((upload_id, size))
+    return removed
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
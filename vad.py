@@ -0,0 +1,187 @@
+import os
+import bisect
+import subprocess
+import numpy as np
+from config import Config
+import metrics
+
+READ_BLOCK_SECONDS = 30  # PCM decoded and scanned per read, keeps memory flat for long lectures
+
+class OffsetMap:
+    """Maps timestamps in trimmed audio back to the original timeline.
+
+    kept is the ordered list of (original_start, original_end) intervals, in
+    seconds, that were concatenated to build the trimmed audio.
+    """
+
+    def __init__(self, kept):
+        self.kept = [(float(start), float(end)) for start, end in kept]
+        self.trimmed_starts = []
+        position = 0.0
+        for start, end in self.kept:
+            self.trimmed_starts.append(position)
+            position += end - start
+        self.trimmed_duration = position
+
+    def to_original(self, t):
+        if not self.kept:
+            return t
+        i = max(0, bisect.bisect_right(self.trimmed_starts, t) - 1)
+        start, end = self.kept[i]
+        original = start + (t - self.trimmed_starts[i])
+        # Whisper may put the last end slightly past the audio; only clamp inside the timeline
+        return original if i == len(self.kept) - 1 else min(original, end)
+
+    def remap_segments(self, segments):
+        """Rewrite segment start/end (in place) from trimmed to original time. Returns segments."""
+        for segment in segments:
+            if segment.get("start") is not None:
+                segment["start"] = self.to_original(segment["start"])
+            if segment.get("end") is not None:
+                segment["end"] = self.to_original(segment["end"])
+        return segments
+
+def _ffmpeg():
+    # Imported here: transcription imports this module
+    from transcription import get_ffmpeg_binary
+    return get_ffmpeg_binary()
+
+def _decoder(audio_path):
+    """ffmpeg process decoding audio to mono 16-bit PCM on stdout."""
+    return subprocess.Popen(
+        [_ffmpeg(), "-hide_banner", "-loglevel", "error", "-i", audio_path,
+         "-f", "s16le", "-ac", "1", "-ar", str(Config.AUDIO_SAMPLE_RATE), "pipe:1"],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+
+def _pcm_blocks(process):
+    """Yield int16 sample arrays read from a decoder's stdout."""
+    block_bytes = Config.AUDIO_SAMPLE_RATE * READ_BLOCK_SECONDS * 2
+    leftover = b""
+    while True:
+        data = process.stdout.read(block_bytes)
+        if not data:
+            break
+        data = leftover + data
+        usable = len(data) - len(data) % 2
+        leftover = data[usable:]
+        yield np.frombuffer(data[:usable], dtype=np.int16)
+    process.stdout.close()
+    if process.wait() != 0:
+        raise Exception("ffmpeg could not decode the audio")
+
+def frame_energies(audio_path, frame_seconds=None):
+    """Per-frame energy in dBFS, computed block by block so the whole PCM is never held in memory."""
+    frame_len = int(Config.AUDIO_SAMPLE_RATE * (frame_seconds or Config.VAD_FRAME_SECONDS))
+    energies = []
+    carry = np.zeros(0, dtype=np.int16)
+    for block in _pcm_blocks(_decoder(audio_path)):
+        samples = np.concatenate([carry, block]) if carry.size else block
+        frames = samples.size // frame_len
+        carry = samples[frames * frame_len:]
+        if frames:
+            x = samples[:frames * frame_len].astype(np.float32).reshape(frames, frame_len)
+            power = np.mean(x * x, axis=1) / (32768.0 ** 2)
+            energies.append(10.0 * np.log10(power + 1e-12))
+    if carry.size:
+        x = carry.astype(np.float32)
+        energies.append(np.array([10.0 * np.log10(np.mean(x * x) / (32768.0 ** 2) + 1e-12)]))
+    return np.concatenate(energies) if energies else np.zeros(0), frame_len
+
+def find_kept_intervals(energies, frame_seconds, threshold_db=None, min_silence=None, keep_silence=None):
+    """Intervals (seconds) to keep: everything except the middle of long quiet runs.
+
+    Quiet runs of at least min_silence seconds are shortened to keep_silence
+    seconds (half at each edge), so word onsets/tails and a natural pause survive.
+    """
+    threshold_db = Config.VAD_THRESHOLD_DB if threshold_db is None else threshold_db
+    min_silence = Config.VAD_MIN_SILENCE if min_silence is None else min_silence
+    keep_silence = Config.VAD_KEEP_SILENCE if keep_silence is None else keep_silence
+    total = len(energies) * frame_seconds
+    if not len(energies):
+        return []
+
+    # Run boundaries of the quiet mask, vectorized: +1 where a run starts, -1 where it ends
+    quiet = np.concatenate([[0], (energies < threshold_db).astype(np.int8), [0]])
+    edges = np.diff(quiet)
+    run_starts = np.flatnonzero(edges == 1)
+    run_ends = np.flatnonzero(edges == -1)
+    long_runs = (run_ends - run_starts) * frame_seconds >= min_silence
+
+    kept = []
+    position = 0.0
+    for start, end in zip((run_starts[long_runs] * frame_seconds).tolist(),
+                          (run_ends[long_runs] * frame_seconds).tolist()):
+        cut_start = start + keep_silence / 2
+        cut_end = end - keep_silence / 2
+        if cut_start > position:
+            kept.append((position, cut_start))
+        position = cut_end
+    if position < total:
+        kept.append((position, total))
+    return kept
+
+def write_trimmed_audio(audio_path, kept, output_path):
+    """Re-encode only the kept intervals of audio_path into output_path, streaming."""
+    rate = Config.AUDIO_SAMPLE_RATE
+    sample_intervals = [(int(round(start * rate)), int(round(end * rate))) for start, end in kept]
+
+    with open(os.devnull, "wb") as devnull:
+        encoder = subprocess.Popen(
+            [_ffmpeg(), "-hide_banner", "-loglevel", "error", "-y",
+             "-f", "s16le", "-ac", "1", "-ar", str(rate), "-i", "pipe:0",
+             "-c:a", "libmp3lame", "-b:a", Config.AUDIO_BITRATE, output_path],
+            stdin=subprocess.PIPE, stdout=devnull, stderr=subprocess.PIPE
+        )
+        try:
+            position = 0
+            interval = 0
+            for block in _pcm_blocks(_decoder(audio_path)):
+                block_end = position + block.size
+                while interval < len(sample_intervals) and sample_intervals[interval][0] < block_end:
+                    start, end = sample_intervals[interval]
+                    lo, hi = max(start, position), min(end, block_end)
+                    if hi > lo:
+                        encoder.stdin.write(block[lo - position:hi - position].tobytes())
+                    if end > block_end:
+                        break
+                    interval += 1
+                position = block_end
+            encoder.stdin.close()
+        except Exception:
+            encoder.kill()
+            raise
+        if encoder.wait() != 0:
+            raise Exception(encoder.stderr.read().decode("utf-8", "replace").strip() or "ffmpeg encode failed")
+
+def trim_silence(audio_path, output_path):
+    """Write a copy of audio_path with long silences compressed.
+
+    Returns a report dict with the OffsetMap and seconds/bytes saved, or None
+    when too little silence was found to be worth re-encoding.
+    """
+    energies, frame_len = frame_energies(audio_path)
+    frame_seconds = frame_len / Config.AUDIO_SAMPLE_RATE
+    original_seconds = len(energies) * frame_seconds
+    kept = find_kept_intervals(energies, frame_seconds)
+    offset_map = OffsetMap(kept)
+
+    saved_seconds = original_seconds - offset_map.trimmed_duration
+    if saved_seconds < Config.VAD_MIN_SAVING:
+        return None
+
+    write_trimmed_audio(audio_path, kept, output_path)
+    original_bytes = os.path.getsize(audio_path)
+    trimmed_bytes = os.path.getsize(output_path)
+    metrics.VAD_SECONDS_SAVED.inc(saved_seconds)
+    metrics.VAD_BYTES_SAVED.inc(max(0, original_bytes - trimmed_bytes))
+    return {
+        "offset_map": offset_map,
+        "original_seconds": original_seconds,
+        "trimmed_seconds": offset_map.trimmed_duration,
+        "saved_seconds": saved_seconds,
+        "original_bytes": original_bytes,
+        "trimmed_bytes": trimmed_bytes,
+        "saved_bytes": original_bytes - trimmed_bytes,
+        "removed_regions": max(0, len(kept) - 1)
+    }